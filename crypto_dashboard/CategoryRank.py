@@ -8,6 +8,7 @@ import traceback
 import logging
 import logging.handlers
 from psycopg2.extras import execute_values
+from changefeed import ChangeListener, publish_change, DAILY_TOKEN_RANKS, CATEGORY_RANKS
 
 # Load environment variables
 load_dotenv()
@@ -29,6 +30,9 @@ formatter = logging.Formatter(
 handler.setFormatter(formatter)
 logger.addHandler(handler)
 
+# Seconds between status checks when no notification arrives
+FALLBACK_POLL_INTERVAL = 60
+
 def get_db_connection():
     """Create and return a connection to the PostgreSQL database"""
     print("Attempting database connection...")
@@ -178,6 +182,7 @@ def process_categories():
             page_size=1000
         )
         
+        publish_change(cur, CATEGORY_RANKS, current_date)
         conn.commit()
         print(f"Successfully inserted {len(all_values)} entries")
         logger.info(f"Successfully inserted {len(all_values)} entries")
@@ -199,6 +204,9 @@ def main():
     print("=== Category Rank Monitor Started ===")
     logger.info("=== Category Rank Monitor Started ===")
     
+    # Woken by calculations.py as soon as today's token ranks are committed
+    listener = ChangeListener(get_db_connection, [DAILY_TOKEN_RANKS])
+    
     while True:
         try:
             current_time = datetime.now(SGT)
@@ -232,8 +240,8 @@ def main():
                 logger.info(f"Waiting until next day ({wait_seconds/3600:.1f} hours)")
                 time.sleep(wait_seconds)
             else:
-                # Check again in 1 second
-                time.sleep(1)
+                # Wait for the token ranks notification, re-checking at least every minute
+                listener.wait(FALLBACK_POLL_INTERVAL)
             
         except Exception as e:
             print(f"Error in main loop: {e}")
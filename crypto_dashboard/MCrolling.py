@@ -10,6 +10,7 @@ from psycopg2.extras import execute_values
 from tqdm import tqdm
 import logging
 import logging.handlers
+from changefeed import publish_change, TOKEN_FILTER
 
 # Load environment variables
 load_dotenv()
@@ -117,19 +118,21 @@ def insert_token_data(cur, conn, token_data, timestamp):
         
         print(f"Inserted {len(values)} tokens into rows {start_row} to {end_row}")
         logger.info(f"Inserted {len(values)} tokens into rows {start_row} to {end_row}")
+        publish_change(cur, TOKEN_FILTER, timestamp)
         conn.commit()
         
     except Exception as e:
         print(f"Error inserting token data: {e}")
         conn.rollback()
 
-def fetch_top_tokens():
+def fetch_top_tokens(timestamp=None):
     try:
         conn = get_db_connection()
         cur = conn.cursor()
         
-        now = datetime.now(SGT)
-        timestamp = round_to_10min(now) - timedelta(minutes=10)
+        if timestamp is None:
+            now = datetime.now(SGT)
+            timestamp = round_to_10min(now) - timedelta(minutes=10)
         print(f"\nLast processed timestamp stored as: {timestamp}")
         logger.info(f"\nLast processed timestamp stored as: {timestamp}")
         
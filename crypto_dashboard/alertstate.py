@@ -0,0 +1,99 @@
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+
+ALERT_STATE_FILE = os.getenv('ALERT_STATE_FILE', 'alert_state.json')
+COOLDOWN_MINUTES = 120        # No repeat alert for a token within this window...
+ESCALATION_RANKS = 50         # ...unless it has climbed this many more ranks
+ESCALATION_MCAP_CHANGE = 25   # ...or its market cap is up this many percent since the last alert
+RETENTION_DAYS = 7            # Entries older than this are dropped on save
+
+
+class AlertStateStore:
+    """Per-token record of the last alert, used to suppress repeats
+
+    A token that keeps climbing matches the rules on several consecutive snapshots.
+    Within the cooldown only a clear escalation (more ranks or a further market cap
+    rise since the last alert) is let through. State is written atomically to a
+    JSON file so it survives restarts; with path=None it is kept in memory only.
+
+    Args:
+        path (str): JSON file to persist to, or None
+        cooldown_minutes (int): Minimum time between alerts for the same token
+    """
+    def __init__(self, path=ALERT_STATE_FILE, cooldown_minutes=COOLDOWN_MINUTES,
+                 escalation_ranks=ESCALATION_RANKS, escalation_mcap_change=ESCALATION_MCAP_CHANGE):
+        self.path = path
+        self.cooldown = timedelta(minutes=cooldown_minutes)
+        self.escalation_ranks = escalation_ranks
+        self.escalation_mcap_change = escalation_mcap_change
+        self.lock = threading.Lock()
+        self.state = self._load()
+        self.suppressed = 0
+
+    def _load(self):
+        if not self.path:
+            return {}
+        try:
+            with open(self.path, 'r') as f:
+                state = json.load(f)
+            print(f"Loaded alert state for {len(state)} tokens")
+            return state
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            print(f"Could not read alert state {self.path}: {e}")
+            return {}
+
+    def _save(self, now):
+        cutoff = now - timedelta(days=RETENTION_DAYS)
+        self.state = {cmc_id: entry for cmc_id, entry in self.state.items()
+                      if datetime.fromisoformat(entry['last_alert']) >= cutoff}
+        if not self.path:
+            return
+        temp_path = f"{self.path}.tmp"
+        try:
+            with open(temp_path, 'w') as f:
+                json.dump(self.state, f)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            print(f"Could not write alert state {self.path}: {e}")
+
+    def check_and_record(self, cmc_id, rank, market_cap, timestamp):
+        """Decide whether to alert on a token and record the alert if so
+
+        Args:
+            cmc_id (int): Token id
+            rank (int): Current market cap rank
+            market_cap (float): Current market cap
+            timestamp (datetime): Snapshot time of the finding
+
+        Returns:
+            tuple: (should_alert, reason)
+        """
+        key = str(cmc_id)
+        market_cap = float(market_cap) if market_cap is not None else None
+        with self.lock:
+            entry = self.state.get(key)
+            if entry is None:
+                reason = 'first alert'
+            elif timestamp - datetime.fromisoformat(entry['last_alert']) >= self.cooldown:
+                reason = 'cooldown expired'
+            elif entry['rank'] - rank >= self.escalation_ranks:
+                reason = f"escalated {entry['rank'] - rank} more ranks"
+            elif (market_cap and entry['market_cap'] and
+                  (market_cap - entry['market_cap']) / entry['market_cap'] * 100 >= self.escalation_mcap_change):
+                reason = 'escalated market cap'
+            else:
+                self.suppressed += 1
+                return False, 'in cooldown'
+
+            self.state[key] = {
+                'last_alert': timestamp.isoformat(),
+                'rank': rank,
+                'market_cap': market_cap,
+                'count': (entry['count'] + 1) if entry else 1
+            }
+            self._save(timestamp)
+            return True, reason
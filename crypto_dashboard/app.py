@@ -11,6 +11,7 @@ import os
 from dotenv import load_dotenv
 import logging
 import logging.handlers
+from changefeed import publish_change, PRICES
 
 # Load environment variables
 load_dotenv()
@@ -215,6 +216,7 @@ def fetch_crypto_prices(cycle_timestamp):
     print(f"[PRICES] Executing database update with {len(columns)} columns...")
     logger.info(f"[PRICES] Executing database update with {len(columns)} columns...")
     cur.execute(query, values)
+    publish_change(cur, PRICES, cycle_timestamp)
     conn.commit()
     print(f"[PRICES] Successfully committed price data for timestamp: {cycle_timestamp}")
     logger.info(f"[PRICES] Successfully committed price data for timestamp: {cycle_timestamp}")
@@ -9,6 +9,7 @@ import traceback
 from psycopg2.extras import execute_values
 import logging
 import logging.handlers
+from changefeed import publish_change, DAILY_TOKEN_RANKS
 
 # Load environment variables from .env file
 load_dotenv()
@@ -267,6 +268,7 @@ def update_daily_ranks():
                 'INSERT INTO public."currenttokenrankstatus" (date) VALUES (%s)',
                 (current_date,)
             )
+            publish_change(cur, DAILY_TOKEN_RANKS, current_date)
             conn.commit()
             # --- End New Code ---
 
@@ -0,0 +1,177 @@
+import hashlib
+import json
+import multiprocessing
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+
+RENDER_WORKERS = 2        # Chart rendering processes
+RENDER_CACHE_SIZE = 64    # Rendered PNGs kept in memory
+RENDER_TIMEOUT = 60       # Seconds an alert thread waits for one chart
+
+# Per-window chart settings: (history key in fetch_historical_data output, title, x label, x format)
+CHART_WINDOWS = {
+    '5m': ('five_min_data', 'Last 6 Hours (5m Intervals)', 'Time', '%H:%M'),
+    '4h': ('four_hour_data', 'Historical Chart', 'Date', '%Y-%m-%d'),
+}
+
+CHART_STYLE = {
+    'font.family': 'Segoe UI',
+    'font.size': 14,
+    'axes.titlesize': 20,
+    'axes.labelsize': 18,
+    'xtick.labelsize': 14,
+    'ytick.labelsize': 14,
+    'axes.linewidth': 2,
+    'axes.grid': True,
+    'grid.alpha': 0.2
+}
+
+
+def init_renderer():
+    """Process pool initializer: select the Agg backend and apply the chart style once"""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    plt.style.use('dark_background')
+    plt.rcParams.update(CHART_STYLE)
+
+
+def extract_series(historical_data, window):
+    """Get [(timestamp, price)] for a chart window from fetch_historical_data output"""
+    key = CHART_WINDOWS[window][0]
+    response = historical_data.get(key) or {}
+    quotes = (response.get('data') or {}).get('quotes') or []
+    return [(quote['timestamp'], quote['quote']['USD']['price']) for quote in quotes]
+
+
+def series_hash(series):
+    """Stable hash of a price series, used in the render cache key"""
+    return hashlib.sha1(json.dumps(series, default=str).encode()).hexdigest()
+
+
+def render_chart(series, symbol, window):
+    """Render one price chart to PNG bytes (runs inside a pool process)"""
+    import matplotlib.pyplot as plt
+    import matplotlib.dates as mdates
+    import pandas as pd
+
+    _, title, x_label, x_format = CHART_WINDOWS[window]
+    timestamps = pd.to_datetime([ts for ts, _ in series])
+    prices = [price for _, price in series]
+
+    fig, ax = plt.subplots(figsize=(12, 7))
+    try:
+        ax.plot(timestamps, prices, color='#00a8ff', linewidth=3)
+        ax.grid(True, alpha=0.2, linewidth=1.2)
+        ax.set_facecolor('#1a1a1a')
+        fig.patch.set_facecolor('#1a1a1a')
+        ax.xaxis.set_major_locator(plt.LinearLocator(8))
+        ax.xaxis.set_major_formatter(mdates.DateFormatter(x_format))
+        ax.set_title(f'{symbol} Price\n{title}', pad=20)
+        ax.set_xlabel(x_label, labelpad=15)
+        ax.set_ylabel('Price (USD)', labelpad=15)
+        plt.setp(ax.get_xticklabels(), rotation=45, ha='right')
+        fig.tight_layout(pad=2.0)
+
+        output = BytesIO()
+        fig.savefig(output, format='png', bbox_inches='tight')
+        return output.getvalue()
+    finally:
+        plt.close(fig)
+
+
+class ChartRenderer:
+    """Renders price charts in a worker process pool and caches the PNGs
+
+    PNGs are cached by (cmc_id, window, hash of the price series), so a repeat
+    alert on unchanged history is served without rendering. Workers are spawned
+    rather than forked, since the pool is created from an alert thread while other
+    threads may hold locks, and a pool broken by a crashed worker is replaced on
+    the next render.
+    """
+    def __init__(self, workers=RENDER_WORKERS, cache_size=RENDER_CACHE_SIZE):
+        self.workers = workers
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.pool = None
+        self.hits = 0
+        self.misses = 0
+
+    def _get_pool(self):
+        with self.lock:
+            if self.pool is None:
+                self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=init_renderer,
+                                                mp_context=multiprocessing.get_context('spawn'))
+            return self.pool
+
+    def _discard_pool(self, pool):
+        """Drop a broken pool so the next render starts a new one"""
+        with self.lock:
+            if self.pool is pool:
+                self.pool = None
+        pool.shutdown(wait=False)
+
+    def _cache_get(self, key):
+        with self.lock:
+            png = self.cache.get(key)
+            if png is not None:
+                self.cache.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+            return png
+
+    def _cache_put(self, key, png):
+        with self.lock:
+            self.cache[key] = png
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+    def render_price_charts(self, cmc_id, symbol, historical_data):
+        """Render the 5m and 4h charts in parallel
+
+        Returns:
+            dict: window -> PNG bytes, for every window that had data and rendered
+        """
+        pending = {}
+        charts = {}
+        for window in CHART_WINDOWS:
+            series = extract_series(historical_data, window)
+            if not series:
+                continue
+            key = (cmc_id, window, series_hash(series))
+            png = self._cache_get(key)
+            if png is not None:
+                charts[window] = png
+                continue
+            pool = self._get_pool()
+            try:
+                pending[window] = (key, pool, pool.submit(render_chart, series, symbol, window))
+            except BrokenProcessPool as e:
+                print(f"Chart render pool broken, restarting it: {e}")
+                self._discard_pool(pool)
+
+        for window, (key, pool, future) in pending.items():
+            try:
+                charts[window] = future.result(timeout=RENDER_TIMEOUT)
+                self._cache_put(key, charts[window])
+            except TimeoutError:
+                print(f"Timed out rendering {window} chart for {symbol}")
+            except BrokenProcessPool as e:
+                print(f"Chart render pool broken, restarting it: {e}")
+                self._discard_pool(pool)
+            except Exception as e:
+                print(f"Error rendering {window} chart for {symbol}: {e}")
+
+        return charts
+
+    def shutdown(self):
+        with self.lock:
+            if self.pool is not None:
+                self.pool.shutdown(wait=False)
+                self.pool = None
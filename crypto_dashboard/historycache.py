@@ -0,0 +1,164 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+HISTORY_CACHE_DIR = os.getenv('HISTORY_CACHE_DIR', 'history_cache')
+HISTORY_CACHE_SIZE = 256   # (cmc_id, interval) series kept in memory
+LATEST_QUOTE_TTL = 60      # Seconds a quotes/latest response is reused
+
+# Candle length per CMC interval; a cached window stays valid until the next candle closes
+INTERVAL_SECONDS = {
+    '5m': 5 * 60,
+    '4h': 4 * 60 * 60,
+}
+
+
+def parse_timestamp(value):
+    """Parse a CMC ISO timestamp ('2024-01-01T00:05:00.000Z') into an aware datetime"""
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+def window_end(interval, now=None):
+    """End of the last closed candle for an interval, as epoch seconds"""
+    step = INTERVAL_SECONDS[interval]
+    now = time.time() if now is None else now
+    return int(now // step) * step
+
+
+def quotes_end(interval, quotes):
+    """Window end the newest quote covers (its timestamp rounded to the nearest
+    candle boundary), or None for an empty series"""
+    if not quotes:
+        return None
+    last_ts = parse_timestamp(quotes[-1]['timestamp']).timestamp()
+    return window_end(interval, last_ts + INTERVAL_SECONDS[interval] / 2)
+
+
+class HistoryCache:
+    """Memory + disk cache of CMC quotes/historical series
+
+    Each (cmc_id, interval) series is stored with the window end its newest quote
+    covers. A lookup is a hit only once that quote reaches the current window end,
+    so a candle CMC publishes late is fetched on a later call rather than missing
+    until the next one closes. On a miss only the candles after the newest cached
+    one are requested from CMC, unless the cached series is too old to extend.
+
+    Args:
+        fetch (callable): fetch(url, params) -> parsed CMC JSON response, raising on failure
+        cache_dir (str): Directory for the on-disk copy, shared across restarts
+    """
+    HISTORICAL_URL = 'https://pro-api.coinmarketcap.com/v2/cryptocurrency/quotes/historical'
+    LATEST_URL = 'https://pro-api.coinmarketcap.com/v2/cryptocurrency/quotes/latest'
+
+    def __init__(self, fetch, cache_dir=HISTORY_CACHE_DIR, size=HISTORY_CACHE_SIZE):
+        self.fetch = fetch
+        self.cache_dir = cache_dir
+        self.size = size
+        self.series = OrderedDict()   # (cmc_id, interval) -> {'window_end', 'quotes'}
+        self.latest = {}              # cmc_id -> (fetched_at, response)
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'incremental': 0, 'full': 0, 'latest_hits': 0, 'latest_misses': 0}
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+    def _path(self, cmc_id, interval):
+        return os.path.join(self.cache_dir, f"{cmc_id}_{interval}.json")
+
+    def _load(self, cmc_id, interval):
+        """Get a cached series from memory, falling back to disk"""
+        key = (cmc_id, interval)
+        with self.lock:
+            entry = self.series.get(key)
+            if entry is not None:
+                self.series.move_to_end(key)
+                return entry
+        try:
+            with open(self._path(cmc_id, interval), 'r') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        self._remember(key, entry)
+        return entry
+
+    def _remember(self, key, entry):
+        with self.lock:
+            self.series[key] = entry
+            self.series.move_to_end(key)
+            while len(self.series) > self.size:
+                self.series.popitem(last=False)
+
+    def _store(self, cmc_id, interval, entry):
+        """Save a series to memory and atomically to disk"""
+        self._remember((cmc_id, interval), entry)
+        path = self._path(cmc_id, interval)
+        temp_path = f"{path}.tmp"
+        try:
+            with open(temp_path, 'w') as f:
+                json.dump(entry, f)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"Could not write history cache {path}: {e}")
+
+    def get_history(self, cmc_id, interval, count):
+        """Get the last `count` candles for a token, fetching only what is missing
+
+        Returns:
+            dict: CMC-shaped response {'data': {'quotes': [...]}}; the quotes list is a copy
+        """
+        current_end = window_end(interval)
+        step = INTERVAL_SECONDS[interval]
+        entry = self._load(cmc_id, interval)
+
+        quotes = entry['quotes'] if entry is not None else []
+        cached_end = quotes_end(interval, quotes)
+
+        if cached_end is not None and cached_end >= current_end and len(quotes) >= count:
+            self._count('hits')
+            print(f"History cache hit: {cmc_id} {interval}")
+            return {'data': {'quotes': list(quotes[-count:])}}
+
+        missing = max(int((current_end - cached_end) // step), 1) if cached_end is not None else count
+
+        params = {'id': cmc_id, 'interval': interval, 'convert': 'USD'}
+        if quotes and missing < count and len(quotes) + missing >= count:
+            # Extend the cached series from its newest candle (CMC includes time_start)
+            self._count('incremental')
+            print(f"History cache refresh: {cmc_id} {interval}, {missing} new candles")
+            params['time_start'] = quotes[-1]['timestamp']
+            params['count'] = missing + 2
+        else:
+            self._count('full')
+            print(f"History cache miss: {cmc_id} {interval}, fetching {count} candles")
+            quotes = []
+            params['count'] = count
+
+        response = self.fetch(self.HISTORICAL_URL, params)
+        new_quotes = (response.get('data') or {}).get('quotes') or []
+
+        merged = {q['timestamp']: q for q in quotes}
+        merged.update((q['timestamp'], q) for q in new_quotes)
+        quotes = sorted(merged.values(), key=lambda q: parse_timestamp(q['timestamp']))[-count:]
+
+        self._store(cmc_id, interval, {'window_end': quotes_end(interval, quotes), 'quotes': quotes})
+        return {'data': {'quotes': list(quotes)}}
+
+    def get_latest(self, cmc_id):
+        """Get a quotes/latest response, reused for LATEST_QUOTE_TTL seconds"""
+        now = time.time()
+        with self.lock:
+            cached = self.latest.get(cmc_id)
+        if cached is not None and now - cached[0] < LATEST_QUOTE_TTL:
+            self._count('latest_hits')
+            return cached[1]
+
+        self._count('latest_misses')
+        response = self.fetch(self.LATEST_URL, {'id': cmc_id, 'convert': 'USD'})
+        with self.lock:
+            self.latest[cmc_id] = (now, response)
+        return response
@@ -0,0 +1,345 @@
+from dotenv import load_dotenv
+from datetime import datetime, timedelta
+import pytz
+import time
+import threading
+import signal
+import traceback
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import logging
+import logging.handlers
+
+import app
+import calculations
+import CategoryRank
+import MCrolling
+import strength
+import tokenstrength
+
+# Load environment variables
+load_dotenv()
+
+# Set Singapore timezone
+SGT = pytz.timezone('Asia/Singapore')
+
+# Set up Papertrail logging
+logger = logging.getLogger("pipeline")
+logger.setLevel(logging.INFO)
+
+handler = logging.handlers.SysLogHandler(
+    address=('logs6.papertrailapp.com', 48110)
+)
+formatter = logging.Formatter(
+    '%(asctime)s pipeline.py: %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+handler.setFormatter(formatter)
+logger.addHandler(handler)
+
+CYCLE_MINUTES = 10          # Prices are stamped on every 10-minute mark
+STARTUP_CATCHUP_MINUTES = 5 # On start, still run the current cycle if we are this close to its mark
+RETRY_DELAY = 20            # Seconds before the first retry of a failed stage (doubles each attempt)
+
+# Set by signal handlers to stop the scheduler loop
+shutdown_event = threading.Event()
+
+# Aggregated per-stage statistics across all runs
+stage_stats = {}
+stats_lock = threading.Lock()
+
+
+def count_rows(query, params):
+    """Run a COUNT(*) query and return the result"""
+    conn = app.get_db_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute(query, params)
+        count = cur.fetchone()[0]
+        cur.close()
+        return count
+    finally:
+        conn.close()
+
+
+class Stage:
+    """A single pipeline step
+
+    Args:
+        name (str): Stage name used in logs and stats
+        run (callable): Does the work. Many of the wrapped functions swallow their
+            own errors, so success is decided by `committed`, not by the return value
+        committed (callable): Returns True once the stage's output is in the database
+        depends_on (list): Names of stages whose output this stage reads
+        max_attempts (int): How many times to run before giving up
+    """
+    def __init__(self, name, run, committed, depends_on=None, max_attempts=3):
+        self.name = name
+        self.run = run
+        self.committed = committed
+        self.depends_on = depends_on or []
+        self.max_attempts = max_attempts
+
+
+class StageResult:
+    """Outcome and timings of one stage in one pipeline run"""
+    def __init__(self, name):
+        self.name = name
+        self.status = 'pending'   # pending, running, done, skipped, failed, blocked
+        self.attempts = 0
+        self.started_at = None
+        self.finished_at = None
+        self.error = None
+
+    @property
+    def duration(self):
+        if self.started_at is None or self.finished_at is None:
+            return None
+        return self.finished_at - self.started_at
+
+
+def execute_stage(stage):
+    """Run a stage with retries until its output is committed"""
+    result = StageResult(stage.name)
+    result.started_at = time.time()
+    result.status = 'running'
+
+    try:
+        if stage.committed():
+            print(f"[{stage.name}] Output already committed - skipping")
+            logger.info(f"[{stage.name}] Output already committed - skipping")
+            result.status = 'skipped'
+            return result
+    except Exception as e:
+        print(f"[{stage.name}] Could not check existing output: {e}")
+        logger.error(f"[{stage.name}] Could not check existing output: {e}")
+
+    delay = RETRY_DELAY
+    for attempt in range(1, stage.max_attempts + 1):
+        result.attempts = attempt
+        print(f"[{stage.name}] Attempt {attempt}/{stage.max_attempts}")
+        logger.info(f"[{stage.name}] Attempt {attempt}/{stage.max_attempts}")
+        try:
+            stage.run()
+            if stage.committed():
+                result.status = 'done'
+                result.error = None
+                break
+            result.error = "Stage finished but its output was not committed"
+        except Exception as e:
+            result.error = str(e)
+            traceback.print_exc()
+
+        print(f"[{stage.name}] Attempt {attempt} failed: {result.error}")
+        logger.error(f"[{stage.name}] Attempt {attempt} failed: {result.error}")
+        if attempt < stage.max_attempts:
+            if shutdown_event.wait(delay):
+                break
+            delay *= 2
+    else:
+        result.status = 'failed'
+
+    if result.status == 'running':
+        result.status = 'failed'
+    result.finished_at = time.time()
+    return result
+
+
+def run_dag(stages):
+    """Run stages as a DAG: each stage starts as soon as all of its dependencies are done
+
+    Returns:
+        dict: Stage name -> StageResult
+    """
+    results = {stage.name: StageResult(stage.name) for stage in stages}
+    by_name = {stage.name: stage for stage in stages}
+
+    for stage in stages:
+        for dep in stage.depends_on:
+            if dep not in by_name:
+                raise ValueError(f"Stage {stage.name} depends on unknown stage {dep}")
+
+    running = {}
+    with ThreadPoolExecutor(max_workers=len(stages)) as executor:
+        while True:
+            # Block any stage whose dependency failed
+            for stage in stages:
+                if results[stage.name].status != 'pending':
+                    continue
+                if any(results[dep].status in ('failed', 'blocked') for dep in stage.depends_on):
+                    results[stage.name].status = 'blocked'
+                    print(f"[{stage.name}] Blocked by failed dependency")
+                    logger.warning(f"[{stage.name}] Blocked by failed dependency")
+
+            # Start every stage whose inputs are committed
+            for stage in stages:
+                if results[stage.name].status != 'pending':
+                    continue
+                if all(results[dep].status in ('done', 'skipped') for dep in stage.depends_on):
+                    results[stage.name].status = 'running'
+                    running[executor.submit(execute_stage, stage)] = stage.name
+
+            if not running:
+                break
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                try:
+                    results[name] = future.result()
+                except Exception as e:
+                    results[name].status = 'failed'
+                    results[name].error = str(e)
+
+    return results
+
+
+def record_stats(results):
+    """Fold one run's results into stage_stats and log a summary"""
+    with stats_lock:
+        for name, result in results.items():
+            stats = stage_stats.setdefault(name, {
+                'runs': 0, 'failures': 0, 'retries': 0,
+                'last_duration': None, 'total_duration': 0.0
+            })
+            stats['runs'] += 1
+            if result.status in ('failed', 'blocked'):
+                stats['failures'] += 1
+            stats['retries'] += max(result.attempts - 1, 0)
+            if result.duration is not None:
+                stats['last_duration'] = result.duration
+                stats['total_duration'] += result.duration
+
+    print("\n=== Pipeline Run Summary ===")
+    logger.info("=== Pipeline Run Summary ===")
+    for name, result in results.items():
+        duration = f"{result.duration:.1f}s" if result.duration is not None else "-"
+        line = f"{name}: {result.status} in {duration} ({result.attempts} attempts)"
+        if result.error and result.status != 'done':
+            line += f" - {result.error}"
+        print(line)
+        logger.info(line)
+
+
+def build_cycle_stages(cycle_timestamp, include_daily=False):
+    """Build the stages for one 10-minute cycle
+
+    prices -> Token Filter, prices -> category/token strengths. When the cycle is the
+    first of a new day, daily token ranks -> category ranks are added as well, and
+    category strengths wait for today's category ranks.
+    """
+    cycle_date = cycle_timestamp.date()
+    stages = [
+        Stage(
+            'prices',
+            lambda: app.fetch_crypto_prices(cycle_timestamp),
+            lambda: count_rows('SELECT COUNT(*) FROM public.prices WHERE timestamp = %s', (cycle_timestamp,)) > 0,
+        ),
+        Stage(
+            'token_filter',
+            lambda: MCrolling.fetch_top_tokens(cycle_timestamp),
+            lambda: count_rows('SELECT COUNT(*) FROM public."Token Filter" WHERE timestamp = %s', (cycle_timestamp,)) > 0,
+            depends_on=['prices'],
+        ),
+        Stage(
+            'category_strength',
+            lambda: strength.process_category_calculations(cycle_timestamp),
+            lambda: count_rows('SELECT COUNT(*) FROM public."CategoryStrength" WHERE "TIMESTAMP" = %s', (cycle_timestamp,)) > 0,
+            depends_on=['prices', 'category_ranks'] if include_daily else ['prices'],
+        ),
+        Stage(
+            'token_strength',
+            lambda: tokenstrength.process_token_strength_calculations(cycle_timestamp),
+            lambda: count_rows('SELECT COUNT(*) FROM public.tokenstrength WHERE timestamp = %s', (cycle_timestamp,)) > 0,
+            depends_on=['prices'],
+        ),
+    ]
+    if include_daily:
+        stages.extend(build_daily_stages(cycle_date))
+    return stages
+
+
+def build_daily_stages(date):
+    """Build the daily ranking stages: DailyTokenRanks -> DailyCategoryRanks"""
+    return [
+        Stage(
+            'daily_ranks',
+            calculations.update_daily_ranks,
+            lambda: count_rows('SELECT COUNT(*) FROM public."DailyTokenRanks" WHERE date = %s', (date,)) > 0,
+            max_attempts=2,
+        ),
+        Stage(
+            'category_ranks',
+            CategoryRank.process_categories,
+            lambda: count_rows('SELECT COUNT(*) FROM public."DailyCategoryRanks" WHERE date = %s', (date,)) > 0,
+            depends_on=['daily_ranks'],
+        ),
+    ]
+
+
+def run_cycle(cycle_timestamp):
+    """Run the full pipeline for one 10-minute mark"""
+    include_daily = cycle_timestamp.hour == 0 and cycle_timestamp.minute == 0
+    print(f"\n=== Pipeline Cycle {cycle_timestamp} ===")
+    logger.info(f"=== Pipeline Cycle {cycle_timestamp} ===")
+
+    start = time.time()
+    results = run_dag(build_cycle_stages(cycle_timestamp, include_daily))
+    record_stats(results)
+    print(f"Cycle finished in {time.time() - start:.1f}s")
+    logger.info(f"Cycle finished in {time.time() - start:.1f}s")
+    return results
+
+
+def get_current_cycle_mark(dt):
+    """Get the current/previous 10-minute mark from given time"""
+    return dt.replace(minute=(dt.minute // CYCLE_MINUTES) * CYCLE_MINUTES, second=0, microsecond=0)
+
+
+def signal_handler(signum, frame):
+    """Stop the scheduler loop after the running cycle"""
+    print('\nReceived shutdown signal. Finishing current cycle...')
+    logger.info('Received shutdown signal. Finishing current cycle...')
+    shutdown_event.set()
+
+
+def main():
+    print("\n=== Starting Data Pipeline ===")
+    logger.info("=== Starting Data Pipeline ===")
+
+    signal.signal(signal.SIGINT, signal_handler)
+    signal.signal(signal.SIGTERM, signal_handler)
+
+    # Catch up on today's daily ranks if they are missing (replaces the startup run
+    # of calculations.py and CategoryRank.py)
+    today = datetime.now(SGT).date()
+    record_stats(run_dag(build_daily_stages(today)))
+
+    # Catch up on the current cycle if we started shortly after its mark
+    now = datetime.now(SGT)
+    current_mark = get_current_cycle_mark(now)
+    if (now - current_mark).total_seconds() < STARTUP_CATCHUP_MINUTES * 60:
+        run_cycle(current_mark)
+
+    while not shutdown_event.is_set():
+        now = datetime.now(SGT)
+        next_mark = get_current_cycle_mark(now) + timedelta(minutes=CYCLE_MINUTES)
+        wait_seconds = (next_mark - now).total_seconds()
+        print(f"\nNext cycle at {next_mark.strftime('%H:%M:%S')} (waiting {wait_seconds:.1f}s)")
+        logger.info(f"Next cycle at {next_mark.strftime('%H:%M:%S')} (waiting {wait_seconds:.1f}s)")
+
+        if shutdown_event.wait(wait_seconds):
+            break
+
+        try:
+            run_cycle(next_mark)
+        except Exception as e:
+            print(f"Error in pipeline cycle: {e}")
+            logger.error(f"Error in pipeline cycle: {e}")
+            traceback.print_exc()
+
+    print("=== Data Pipeline Stopped ===")
+    logger.info("=== Data Pipeline Stopped ===")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+import numpy as np
+
+# (intervals back, required rank improvement) - one interval is 10 minutes
+RANK_JUMP_RULES = [
+    (1, 50),   # 1 interval (10 mins): 50 rank improvement
+    (3, 100),  # 3 intervals (30 mins): 100 rank improvement
+    (6, 150)   # 6 intervals (60 mins): 150 rank improvement
+]
+MIN_MARKET_CAP_CHANGE = 10  # Market cap must also rise by at least this many percent
+MAX_TRACKED_RANK = 1000     # Only tokens currently ranked this high or better are checked
+INTERVAL_MINUTES = 10
+
+
+def calculate_percentage_change(old_value, new_value):
+    """Calculate percentage change between two values"""
+    return ((new_value - old_value) / old_value) * 100
+
+
+def snapshot_columns(snapshot):
+    """Convert a {cmc_id: token} snapshot into cmc_id-sorted id, rank and market cap arrays"""
+    count = len(snapshot)
+    ids = np.fromiter(snapshot.keys(), dtype=np.int64, count=count)
+    ranks = np.fromiter((t['rank'] for t in snapshot.values()), dtype=np.float64, count=count)
+    mcaps = np.fromiter(
+        (float(t['market_cap']) if t['market_cap'] is not None else np.nan for t in snapshot.values()),
+        dtype=np.float64, count=count
+    )
+    order = np.argsort(ids, kind='stable')
+    return ids[order], ranks[order], mcaps[order]
+
+
+def align_snapshots(snapshots, cmc_ids):
+    """Align N snapshots on the given cmc_ids
+
+    Returns:
+        tuple: (ranks, market_caps) arrays of shape (len(snapshots), len(cmc_ids)),
+               NaN where a token is missing from a snapshot
+    """
+    ranks = np.full((len(snapshots), len(cmc_ids)), np.nan)
+    mcaps = np.full((len(snapshots), len(cmc_ids)), np.nan)
+
+    for k, snapshot in enumerate(snapshots):
+        ids, snap_ranks, snap_mcaps = snapshot_columns(snapshot)
+        if len(ids) == 0 or len(cmc_ids) == 0:
+            continue
+        pos = np.minimum(np.searchsorted(ids, cmc_ids), len(ids) - 1)
+        found = ids[pos] == cmc_ids
+        ranks[k, found] = snap_ranks[pos[found]]
+        mcaps[k, found] = snap_mcaps[pos[found]]
+
+    return ranks, mcaps
+
+
+def detect_rank_jumps(ranks, mcaps, rules=RANK_JUMP_RULES, min_market_cap_change=MIN_MARKET_CAP_CHANGE):
+    """Evaluate every interval/threshold rule at once on aligned snapshot arrays
+
+    Row 0 is the snapshot being checked, row k is k intervals earlier.
+
+    Returns:
+        tuple: (hit_rule, met_rank) - hit_rule is the index into `rules` of the first
+               (shortest) rule each token met on both rank and market cap, or -1;
+               met_rank is True where any rank rule was met
+    """
+    usable = [(i, k, required) for i, (k, required) in enumerate(rules) if k < ranks.shape[0]]
+    hit_rule = np.full(ranks.shape[1], -1)
+    if not usable:
+        return hit_rule, np.zeros(ranks.shape[1], dtype=bool)
+
+    rule_index = np.array([i for i, _, _ in usable])
+    intervals = np.array([k for _, k, _ in usable])
+    required = np.array([r for _, _, r in usable], dtype=np.float64)[:, None]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rank_ok = (ranks[intervals] - ranks[0]) >= required
+        pct_change = (mcaps[0] - mcaps[intervals]) / mcaps[intervals] * 100
+        hit = rank_ok & (pct_change >= min_market_cap_change)
+
+    has_hit = hit.any(axis=0)
+    hit_rule[has_hit] = rule_index[hit.argmax(axis=0)[has_hit]]
+    return hit_rule, rank_ok.any(axis=0)
+
+
+def check_rank_increases(current_data, historical_data, timestamps, rules=RANK_JUMP_RULES,
+                         min_market_cap_change=MIN_MARKET_CAP_CHANGE, max_rank=MAX_TRACKED_RANK,
+                         verbose=True):
+    """Find tokens whose rank and market cap jumped within any rule's interval
+
+    historical_data[0] is the snapshot being checked and historical_data[k] the one
+    k intervals before it; timestamps are indexed the same way as in monitor_tokens.
+
+    Returns:
+        list: One finding per token, using the shortest interval that matched
+    """
+    current_timestamp = timestamps[0]
+    current_snapshot = historical_data[0]
+
+    if verbose:
+        print("\n=== Checking Rank Increases ===")
+        print(f"Current timestamp: {current_timestamp}")
+
+    cmc_ids = np.array(
+        [cmc_id for cmc_id, token in current_snapshot.items() if token['rank'] <= max_rank],
+        dtype=np.int64
+    )
+    ranks, mcaps = align_snapshots(historical_data, cmc_ids)
+    hit_rule, met_rank = detect_rank_jumps(ranks, mcaps, rules, min_market_cap_change)
+
+    findings = []
+    for idx in np.flatnonzero(hit_rule >= 0):
+        cmc_id = int(cmc_ids[idx])
+        num_intervals = rules[hit_rule[idx]][0]
+        current = current_snapshot[cmc_id]
+        historical = historical_data[num_intervals][cmc_id]
+
+        findings.append({
+            'symbol': current['symbol'],
+            'time_diff': num_intervals * INTERVAL_MINUTES,
+            'historical': historical,
+            'current': current,
+            'timestamp': timestamps[num_intervals],
+            'pct_change': calculate_percentage_change(historical['market_cap'], current['market_cap']),
+            'cmc_id': cmc_id,
+            'interval_start': timestamps[num_intervals],  # Store start of interval
+            'interval_end': current_timestamp  # Store end of interval
+        })
+        if verbose:
+            print(f"\nFound significant change: {current['symbol']}")
+            print(f"Current Rank: {current['rank']}")
+            print(f"Current Market Cap: ${current['market_cap']:,.2f}")
+
+    rank_only_changes = int(np.count_nonzero(met_rank & (hit_rule < 0)))
+
+    if verbose:
+        print(f"\nChecked {len(cmc_ids)} tokens.")
+        if findings or rank_only_changes > 0:
+            print("Results:")
+            print(f"- {rank_only_changes} tokens met rank criteria but not {min_market_cap_change}% market cap increase")
+            print(f"- {len(findings)} tokens met both criteria and will be alerted")
+        else:
+            print("No significant changes found.")
+
+    return findings
+
+
+SUDDEN_MAX_RANK = 700        # A new token must enter at this rank or better
+SUDDEN_PRIOR_RANK = 1000     # ...and not have been ranked this high in the lookback
+SUDDEN_LOOKBACK = 6          # Intervals to look back
+
+
+def detect_sudden_appearances(current_snapshot, previous_snapshots, max_rank=SUDDEN_MAX_RANK,
+                              prior_rank=SUDDEN_PRIOR_RANK, lookback=SUDDEN_LOOKBACK):
+    """Find tokens in the current top `max_rank` that were not in the top `prior_rank`
+    in any of the previous `lookback` snapshots
+
+    Returns:
+        list: cmc_ids, in current_snapshot order
+    """
+    seen = set()
+    for snapshot in previous_snapshots[:lookback]:
+        seen.update(cmc_id for cmc_id, token in snapshot.items() if token['rank'] <= prior_rank)
+    return [cmc_id for cmc_id, token in current_snapshot.items()
+            if token['rank'] <= max_rank and cmc_id not in seen]
@@ -0,0 +1,306 @@
+import argparse
+import csv
+import os
+import time
+from collections import defaultdict, deque
+from datetime import datetime
+from itertools import groupby
+import psycopg2
+from dotenv import load_dotenv
+
+from alertstate import AlertStateStore
+from rankdetect import (
+    check_rank_increases, detect_sudden_appearances,
+    RANK_JUMP_RULES, MIN_MARKET_CAP_CHANGE, MAX_TRACKED_RANK, INTERVAL_MINUTES,
+    SUDDEN_MAX_RANK, SUDDEN_PRIOR_RANK, SUDDEN_LOOKBACK
+)
+
+FETCH_BATCH_SIZE = 10000  # Rows per round trip when streaming Token Filter
+CSV_COLUMNS = ['timestamp', 'cmc_id', 'symbol', 'market_cap_rank', 'market_cap']
+
+load_dotenv()
+DATABASE_URL = os.getenv('DATABASE_URL')
+
+
+def get_db_connection():
+    if not DATABASE_URL:
+        raise Exception("DATABASE_URL environment variable is not set")
+    return psycopg2.connect(DATABASE_URL)
+
+
+def stream_db_rows(start=None, end=None):
+    """Stream Token Filter rows in timestamp order through a server-side cursor
+
+    MCrolling keeps only the latest 12 snapshots in Token Filter (about two hours),
+    so this can only replay what is still retained; longer backtests replay CSV
+    exports collected with --save.
+    """
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor(name='replay_token_filter')
+        cur.itersize = FETCH_BATCH_SIZE
+        cur.execute("""
+            SELECT timestamp, cmc_id, symbol, market_cap_rank, market_cap
+            FROM public."Token Filter"
+            WHERE (%s IS NULL OR timestamp >= %s)
+            AND (%s IS NULL OR timestamp <= %s)
+            ORDER BY timestamp, market_cap_rank
+        """, (start, start, end, end))
+        for row in cur:
+            yield row
+        cur.close()
+    finally:
+        conn.close()
+
+
+def stream_csv_rows(path):
+    """Stream rows from a CSV export (see --save), which must be sorted by timestamp"""
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            yield (
+                datetime.fromisoformat(row['timestamp']),
+                int(row['cmc_id']),
+                row['symbol'],
+                int(row['market_cap_rank']),
+                float(row['market_cap']) if row['market_cap'] else None
+            )
+
+
+def group_snapshots(rows):
+    """Group timestamp-ordered rows into (timestamp, {cmc_id: token}) snapshots,
+    in the same shape as tokenmonitor.get_token_data"""
+    for timestamp, group in groupby(rows, key=lambda row: row[0]):
+        yield timestamp, {row[1]: {
+            'rank': row[3],
+            'symbol': row[2],
+            'market_cap': row[4],
+            'cmc_id': row[1]
+        } for row in group}
+
+
+def save_rows(rows, path):
+    """Write rows to CSV and pass them through"""
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_COLUMNS)
+        for row in rows:
+            writer.writerow([row[0].isoformat(), row[1], row[2], row[3], row[4] if row[4] is not None else ''])
+            yield row
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * pct / 100), len(ordered) - 1)]
+
+
+def move_started_at(cmc_id, baseline_index, history, history_timestamps):
+    """Timestamp of the first snapshot after the baseline in which the token ranks
+    above its baseline rank; history is newest first, as passed to check_rank_increases"""
+    baseline_rank = history[baseline_index][cmc_id]['rank']
+    for i in range(baseline_index - 1, -1, -1):
+        token = history[i].get(cmc_id)
+        if token is not None and token['rank'] < baseline_rank:
+            return history_timestamps[i]
+    return history_timestamps[0]
+
+
+def replay(snapshots, rules=RANK_JUMP_RULES, min_market_cap_change=MIN_MARKET_CAP_CHANGE,
+           max_rank=MAX_TRACKED_RANK, sudden_max_rank=SUDDEN_MAX_RANK,
+           sudden_prior_rank=SUDDEN_PRIOR_RANK, sudden_lookback=SUDDEN_LOOKBACK,
+           match_live=False, cooldown_minutes=None):
+    """Run the detectors over a stream of snapshots at full speed
+
+    The window holds the same latest-N snapshots tokenmonitor keeps, newest first.
+    With match_live, rank jumps are checked on the window minus its newest snapshot,
+    exactly as monitor_tokens currently calls check_rank_increases. With
+    cooldown_minutes, rank jumps go through an in-memory AlertStateStore as they do live.
+
+    Each rank jump records its detection latency (from the first snapshot in which
+    the token ranked above its baseline to the snapshot whose arrival fired the
+    alert) and the rule window it matched.
+
+    Returns:
+        dict: Alerts and timing statistics
+    """
+    window_size = max(max(k for k, _ in rules), sudden_lookback) + 1 + (1 if match_live else 0)
+    window = deque(maxlen=window_size)
+    alert_state = AlertStateStore(None, cooldown_minutes) if cooldown_minutes is not None else None
+    alerts = []
+    suppressed = 0
+    check_times = []
+    snapshot_count = 0
+    token_rows = 0
+    started = time.perf_counter()
+
+    for timestamp, snapshot in snapshots:
+        window.appendleft((timestamp, snapshot))
+        snapshot_count += 1
+        token_rows += len(snapshot)
+        if len(window) < window_size:
+            continue
+
+        timestamps = [ts for ts, _ in window]
+        data = [snap for _, snap in window]
+
+        history = data[1:] if match_live else data
+        history_timestamps = timestamps[1:] if match_live else timestamps
+
+        check_start = time.perf_counter()
+        findings = check_rank_increases(data[0], history, timestamps, rules,
+                                        min_market_cap_change, max_rank, verbose=False)
+        sudden = detect_sudden_appearances(data[0], data[1:], sudden_max_rank,
+                                           sudden_prior_rank, sudden_lookback)
+        check_times.append(time.perf_counter() - check_start)
+
+        for finding in findings:
+            if alert_state is not None:
+                should_alert, _ = alert_state.check_and_record(
+                    finding['cmc_id'], finding['current']['rank'],
+                    finding['current']['market_cap'], timestamp
+                )
+                if not should_alert:
+                    suppressed += 1
+                    continue
+            alerts.append({
+                'type': 'rank_jump',
+                'timestamp': timestamp,
+                'cmc_id': finding['cmc_id'],
+                'symbol': finding['symbol'],
+                'rank': finding['current']['rank'],
+                'latency_minutes': (timestamp - move_started_at(
+                    finding['cmc_id'], finding['time_diff'] // INTERVAL_MINUTES,
+                    history, history_timestamps
+                )).total_seconds() / 60,
+                'rule_window_minutes': finding['time_diff'],
+                'pct_change': finding['pct_change'],
+            })
+        for cmc_id in sudden:
+            alerts.append({
+                'type': 'sudden_appearance',
+                'timestamp': timestamp,
+                'cmc_id': cmc_id,
+                'symbol': snapshot[cmc_id]['symbol'],
+                'rank': snapshot[cmc_id]['rank'],
+                'latency_minutes': None,
+                'rule_window_minutes': None,
+                'pct_change': None,
+            })
+
+    return {
+        'alerts': alerts,
+        'suppressed': suppressed,
+        'snapshots': snapshot_count,
+        'checked': len(check_times),
+        'token_rows': token_rows,
+        'check_times': check_times,
+        'elapsed': time.perf_counter() - started,
+    }
+
+
+def print_report(result):
+    alerts = result['alerts']
+    per_day = defaultdict(lambda: defaultdict(int))
+    for alert in alerts:
+        per_day[alert['timestamp'].date()][alert['type']] += 1
+
+    print("\n=== Alerts per Day ===")
+    print(f"{'Date':<12} {'Rank jumps':>10} {'Sudden':>8} {'Tokens':>8}")
+    for day in sorted(per_day):
+        tokens = len({a['cmc_id'] for a in alerts if a['timestamp'].date() == day})
+        print(f"{day.isoformat():<12} {per_day[day]['rank_jump']:>10} {per_day[day]['sudden_appearance']:>8} {tokens:>8}")
+    if per_day:
+        total = len(alerts)
+        print(f"Average: {total / len(per_day):.1f} alerts/day over {len(per_day)} days")
+    if result['suppressed']:
+        print(f"Suppressed by cooldown: {result['suppressed']}")
+
+    latencies = [a['latency_minutes'] for a in alerts if a['latency_minutes'] is not None]
+    windows = [a['rule_window_minutes'] for a in alerts if a['rule_window_minutes'] is not None]
+    print("\n=== Detection Latency ===")
+    if latencies:
+        print("(from the first snapshot showing the move to the snapshot that fired the alert)")
+        for minutes in sorted(set(latencies)):
+            print(f"Detected after {minutes:g} min: {latencies.count(minutes)}")
+        print(f"Mean: {sum(latencies) / len(latencies):.1f} min, "
+              f"p95: {percentile(latencies, 95):g} min")
+        print("\n=== Rule Window ===")
+        for minutes in sorted(set(windows)):
+            print(f"Matched over {minutes} min: {windows.count(minutes)}")
+    else:
+        print("No rank jump alerts")
+
+    check_ms = [t * 1000 for t in result['check_times']]
+    elapsed = result['elapsed']
+    print("\n=== Throughput ===")
+    print(f"Snapshots: {result['snapshots']} ({result['checked']} checked), token rows: {result['token_rows']}")
+    print(f"Elapsed: {elapsed:.2f}s - {result['snapshots'] / elapsed if elapsed else 0:.1f} snapshots/s, "
+          f"{result['token_rows'] / elapsed if elapsed else 0:,.0f} rows/s")
+    print(f"Per-snapshot check: p50 {percentile(check_ms, 50):.2f}ms, "
+          f"p95 {percentile(check_ms, 95):.2f}ms, max {max(check_ms, default=0):.2f}ms")
+
+
+def write_alerts(alerts, path):
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=['type', 'timestamp', 'cmc_id', 'symbol', 'rank',
+                                               'latency_minutes', 'rule_window_minutes', 'pct_change'])
+        writer.writeheader()
+        writer.writerows(alerts)
+    print(f"\nWrote {len(alerts)} alerts to {path}")
+
+
+def parse_rules(value):
+    """Parse '1:50,3:100,6:150' into [(1, 50), (3, 100), (6, 150)]"""
+    rules = []
+    for part in value.split(','):
+        intervals, ranks = part.split(':')
+        rules.append((int(intervals), int(ranks)))
+    return sorted(rules)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Replay Token Filter snapshots through the alert rules",
+        epilog="Database mode only sees what MCrolling retains in Token Filter: the latest "
+               "12 snapshots, about two hours. For longer backtests, collect rows with --save "
+               "on repeated runs and replay the combined, timestamp-sorted CSV with --input."
+    )
+    parser.add_argument('--input', help="CSV file to replay instead of the database")
+    parser.add_argument('--start', type=datetime.fromisoformat,
+                        help="First timestamp to load from the database (within its ~2h retention)")
+    parser.add_argument('--end', type=datetime.fromisoformat, help="Last timestamp to load from the database")
+    parser.add_argument('--save', help="Also write the loaded rows to this CSV for later offline runs")
+    parser.add_argument('--rules', type=parse_rules, default=RANK_JUMP_RULES,
+                        help="Rank jump rules as intervals:ranks pairs, e.g. 1:50,3:100,6:150")
+    parser.add_argument('--min-mcap-change', type=float, default=MIN_MARKET_CAP_CHANGE)
+    parser.add_argument('--max-rank', type=int, default=MAX_TRACKED_RANK)
+    parser.add_argument('--sudden-max-rank', type=int, default=SUDDEN_MAX_RANK)
+    parser.add_argument('--sudden-prior-rank', type=int, default=SUDDEN_PRIOR_RANK)
+    parser.add_argument('--sudden-lookback', type=int, default=SUDDEN_LOOKBACK)
+    parser.add_argument('--match-live', action='store_true',
+                        help="Check rank jumps on the same shifted window monitor_tokens uses")
+    parser.add_argument('--cooldown', type=int, metavar='MINUTES',
+                        help="Apply the per-token alert cooldown with this window")
+    parser.add_argument('--alerts', help="Write every alert to this CSV")
+    args = parser.parse_args()
+    if not args.input and not DATABASE_URL:
+        parser.error("set DATABASE_URL (environment or .env) to replay from the database, or pass --input")
+
+    rows = stream_csv_rows(args.input) if args.input else stream_db_rows(args.start, args.end)
+    if args.save:
+        rows = save_rows(rows, args.save)
+
+    print(f"Rules: {args.rules}, min market cap change: {args.min_mcap_change}%")
+    result = replay(
+        group_snapshots(rows), args.rules, args.min_mcap_change, args.max_rank,
+        args.sudden_max_rank, args.sudden_prior_rank, args.sudden_lookback, args.match_live,
+        args.cooldown
+    )
+    print_report(result)
+    if args.alerts:
+        write_alerts(result['alerts'], args.alerts)
+
+
+if __name__ == "__main__":
+    main()
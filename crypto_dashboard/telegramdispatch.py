@@ -0,0 +1,175 @@
+import asyncio
+import queue
+import threading
+import time
+from io import BytesIO
+from telegram import Bot, InputMediaPhoto
+from telegram.error import RetryAfter, TimedOut, NetworkError, TelegramError
+
+QUEUE_SIZE = 200          # Pending sends before new ones are dropped
+MIN_SEND_INTERVAL = 1.0   # Seconds between requests to the same chat (Telegram allows ~1/s)
+MAX_RETRIES = 5
+RETRY_BASE_DELAY = 1.0    # Back-off doubles from here on network errors
+MAX_ALBUM_SIZE = 10       # Telegram's limit for sendMediaGroup
+BATCH_SIZE = 20           # Queued items drained per batch
+
+_STOP = object()
+
+
+class TelegramDispatcher:
+    """Long-lived Telegram sender with one reused Bot session
+
+    Producers call send_message / send_photos and return as soon as the item is
+    queued. A background thread runs an asyncio loop that drains the queue,
+    sends each send_photos call as its own album(s), keeps to the per-chat
+    rate limit and retries with back-off.
+
+    Args:
+        token (str): Bot token
+        chat_id (int): Default chat to send to
+        base_url (str, optional): Bot API base URL, e.g. a local fake server for testing
+    """
+    def __init__(self, token, chat_id, base_url=None, queue_size=QUEUE_SIZE,
+                 min_interval=MIN_SEND_INTERVAL, max_retries=MAX_RETRIES):
+        self.token = token
+        self.chat_id = chat_id
+        self.base_url = base_url
+        self.min_interval = min_interval
+        self.max_retries = max_retries
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.thread = None
+        self.start_lock = threading.Lock()
+        self.last_sent = {}  # chat_id -> monotonic time of last request
+        self.stats = {'sent': 0, 'failed': 0, 'dropped': 0, 'retries': 0}
+        self.stats_lock = threading.Lock()  # Producers and the sender thread both count
+
+    def start(self):
+        """Start the dispatcher thread if it is not running yet"""
+        with self.start_lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=lambda: asyncio.run(self._run()), daemon=True)
+                self.thread.start()
+
+    def stop(self, timeout=30):
+        """Send what is already queued, then stop"""
+        if self.thread is None:
+            return
+        self.queue.put(_STOP)
+        self.thread.join(timeout)
+
+    def _count(self, key):
+        with self.stats_lock:
+            self.stats[key] += 1
+
+    def _enqueue(self, item):
+        self.start()
+        try:
+            self.queue.put_nowait(item)
+            return True
+        except queue.Full:
+            self._count('dropped')
+            print(f"Telegram queue full - dropping {item[0]}")
+            return False
+
+    def send_message(self, text, chat_id=None, parse_mode='HTML'):
+        """Queue a text message. Returns False if the queue is full"""
+        return self._enqueue(('message', chat_id or self.chat_id, text, parse_mode))
+
+    def send_photos(self, images, chat_id=None):
+        """Queue images (bytes or BytesIO) to be sent together as one album
+
+        The images are queued as a single item, so they are either all queued or
+        all dropped, and are never mixed into an album with another call's images.
+        Returns False if the queue is full.
+        """
+        photos = [image.getvalue() if isinstance(image, BytesIO) else image
+                  for image in images if image is not None]
+        if not photos:
+            return True
+        return self._enqueue(('album', chat_id or self.chat_id, photos, None))
+
+    async def _run(self):
+        bot = self._create_bot()
+        async with bot:
+            while True:
+                item = await asyncio.to_thread(self.queue.get)
+                if item is _STOP:
+                    return
+                batch = [item]
+                stop = False
+                while len(batch) < BATCH_SIZE:
+                    try:
+                        extra = self.queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if extra is _STOP:
+                        stop = True
+                        break
+                    batch.append(extra)
+
+                for request in self._group(batch):
+                    await self._send_with_retry(bot, request)
+                if stop:
+                    return
+
+    def _create_bot(self):
+        if self.base_url:
+            return Bot(token=self.token, base_url=self.base_url)
+        return Bot(token=self.token)
+
+    def _group(self, batch):
+        """Split albums larger than Telegram allows, keeping the order
+
+        Items are never merged: each album holds the images of one send_photos call.
+        """
+        requests = []
+        for kind, chat_id, payload, parse_mode in batch:
+            if kind == 'album':
+                for i in range(0, len(payload), MAX_ALBUM_SIZE):
+                    requests.append(('album', chat_id, payload[i:i + MAX_ALBUM_SIZE], None))
+            else:
+                requests.append((kind, chat_id, payload, parse_mode))
+        return requests
+
+    async def _wait_for_rate_limit(self, chat_id):
+        last = self.last_sent.get(chat_id)
+        if last is not None:
+            delay = self.min_interval - (time.monotonic() - last)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        self.last_sent[chat_id] = time.monotonic()
+
+    async def _send(self, bot, request):
+        kind, chat_id, payload, parse_mode = request
+        if kind == 'message':
+            await bot.send_message(chat_id=chat_id, text=payload, parse_mode=parse_mode)
+        elif len(payload) == 1:
+            await bot.send_photo(chat_id=chat_id, photo=payload[0])
+        else:
+            await bot.send_media_group(chat_id=chat_id, media=[InputMediaPhoto(media=p) for p in payload])
+
+    async def _send_with_retry(self, bot, request):
+        delay = RETRY_BASE_DELAY
+        for attempt in range(1, self.max_retries + 1):
+            await self._wait_for_rate_limit(request[1])
+            try:
+                await self._send(bot, request)
+                self._count('sent')
+                print(f"Telegram {request[0]} sent successfully")
+                return
+            except RetryAfter as e:
+                wait = e.retry_after.total_seconds() if hasattr(e.retry_after, 'total_seconds') else e.retry_after
+                print(f"Telegram rate limit hit, retrying in {wait}s")
+                await asyncio.sleep(wait)
+            except (TimedOut, NetworkError) as e:
+                print(f"Telegram network error (attempt {attempt}/{self.max_retries}): {e}")
+                await asyncio.sleep(delay)
+                delay *= 2
+            except TelegramError as e:
+                print(f"Error sending Telegram {request[0]}: {e}")
+                break
+            except Exception as e:
+                print(f"Error sending Telegram {request[0]}: {e}")
+                break
+            self._count('retries')
+        self._count('failed')
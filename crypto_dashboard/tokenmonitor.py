@@ -1,17 +1,20 @@
 import os
 from dotenv import load_dotenv
-import asyncio
-from telegram import Bot
 import psycopg2
 import pytz
 from datetime import datetime, timedelta
 import time
 import requests
-import matplotlib.pyplot as plt
-import pandas as pd
 from io import BytesIO
-from matplotlib import patheffects as path_effects
 import traceback
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from changefeed import ChangeListener, TOKEN_FILTER
+from rankdetect import check_rank_increases, calculate_percentage_change, detect_sudden_appearances
+from chartrender import ChartRenderer
+from telegramdispatch import TelegramDispatcher
+from historycache import HistoryCache
+from alertstate import AlertStateStore
 
 # Debug environment loading
 print("Current working directory:", os.getcwd())
@@ -67,18 +70,30 @@ if not TELEGRAM_BOT_TOKEN:
 
 TELEGRAM_CHAT_ID = 7430984105
 
-async def send_telegram_message(message: str):
-    """Send message via Telegram bot"""
-    try:
-        bot = Bot(token=TELEGRAM_BOT_TOKEN)
-        await bot.send_message(chat_id=TELEGRAM_CHAT_ID, text=message, parse_mode='HTML')
-        print(f"Message sent to Telegram successfully")
-    except Exception as e:
-        print(f"Error sending Telegram message: {e}")
+# Seconds between Token Filter checks when no notification arrives
+FALLBACK_POLL_INTERVAL = 60
+
+# Snapshots kept for comparison: the current one plus 60 minutes of 10-minute history
+SNAPSHOT_WINDOW = 7
+
+# Alert jobs (message, history fetch, chart render, send) run off the monitor loop
+ALERT_WORKERS = 4
+alert_executor = ThreadPoolExecutor(max_workers=ALERT_WORKERS)
+chart_renderer = ChartRenderer()
+
+# Last alert per token, so a token that keeps climbing isn't re-alerted every cycle
+alert_state = AlertStateStore()
+
+# One long-lived bot session; alerts are queued and sent in the background.
+# TELEGRAM_API_BASE_URL can point at a local fake Bot API server for testing.
+telegram_dispatcher = TelegramDispatcher(
+    TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID,
+    base_url=os.getenv('TELEGRAM_API_BASE_URL')
+)
 
 def send_telegram_alert(message: str):
-    """Helper function to run telegram send in async"""
-    asyncio.run(send_telegram_message(message))
+    """Queue a message for the Telegram dispatcher"""
+    telegram_dispatcher.send_message(message)
 
 def get_db_connection():
     print("Attempting database connection...")
@@ -107,50 +122,95 @@ def get_token_data(cur, timestamp):
         'cmc_id': row[3]
     } for row in cur.fetchall()}
 
-def fetch_historical_data(cmc_id, symbol):
-    """Fetch historical price data from CMC with retry logic"""
-    print(f"\n=== Fetching historical data for {symbol} (ID: {cmc_id}) ===")
-    
+class SnapshotWindow:
+    """Rolling in-memory window of the latest Token Filter snapshots, newest first
+
+    Each refresh only loads the snapshot that is new since the last one. The
+    window is rebuilt from scratch at startup or when the stored timestamps no
+    longer line up with it (a missed cycle or a gap in the table).
+    """
+    def __init__(self, size=SNAPSHOT_WINDOW):
+        self.size = size
+        self.snapshots = deque(maxlen=size)  # (timestamp, {cmc_id: token data})
+
+    @property
+    def timestamps(self):
+        return [ts for ts, _ in self.snapshots]
+
+    @property
+    def data(self):
+        return [snapshot for _, snapshot in self.snapshots]
+
+    def is_full(self):
+        return len(self.snapshots) == self.size
+
+    def refresh(self, cur):
+        """Bring the window up to date with Token Filter
+
+        Returns:
+            bool: True if the window changed
+        """
+        cur.execute(
+            "SELECT DISTINCT timestamp FROM public.\"Token Filter\" ORDER BY timestamp DESC LIMIT %s",
+            (self.size,)
+        )
+        latest = [row[0] for row in cur.fetchall()]
+        current = self.timestamps
+        
+        if latest == current:
+            return False
+        
+        if current and latest[1:] == current[:len(latest) - 1]:
+            # Only the newest snapshot is missing - the oldest one drops off the end
+            print(f"Loading new snapshot: {latest[0]}")
+            self.snapshots.appendleft((latest[0], get_token_data(cur, latest[0])))
+        else:
+            print(f"Rebuilding snapshot window from {len(latest)} timestamps")
+            self.snapshots.clear()
+            for ts in latest:
+                self.snapshots.append((ts, get_token_data(cur, ts)))
+        return True
+
+def cmc_request_with_retry(url, params, max_retries=3, delay=5):
+    """Make a CMC API request with retry logic"""
     headers = {
         'X-CMC_PRO_API_KEY': CMC_API_KEY.strip(),
         'Accept': 'application/json'
     }
-    
-    def make_request_with_retry(url, params, max_retries=3, delay=5):
-        """Helper function to make requests with retry logic"""
-        for attempt in range(max_retries):
-            try:
-                print(f"Request attempt {attempt + 1}/{max_retries}")
-                response = requests.get(url, headers=headers, params=params)
-                
-                # Print response details for debugging
-                print(f"Response status code: {response.status_code}")
-                response_json = response.json()
-                if 'status' in response_json:
-                    print(f"API Status: {response_json['status']}")
-                
-                response.raise_for_status()
-                return response_json
-            except requests.exceptions.RequestException as e:
-                print(f"Attempt {attempt + 1} failed: {e}")
-                if attempt < max_retries - 1:
-                    print(f"Waiting {delay} seconds before retrying...")
-                    time.sleep(delay)
-                    delay *= 2  # Exponential backoff
-                else:
-                    print("Max retries reached. Request failed.")
-                    raise
+    for attempt in range(max_retries):
+        try:
+            print(f"Request attempt {attempt + 1}/{max_retries}")
+            response = requests.get(url, headers=headers, params=params)
+            
+            # Print response details for debugging
+            print(f"Response status code: {response.status_code}")
+            response_json = response.json()
+            if 'status' in response_json:
+                print(f"API Status: {response_json['status']}")
+            
+            response.raise_for_status()
+            return response_json
+        except requests.exceptions.RequestException as e:
+            print(f"Attempt {attempt + 1} failed: {e}")
+            if attempt < max_retries - 1:
+                print(f"Waiting {delay} seconds before retrying...")
+                time.sleep(delay)
+                delay *= 2  # Exponential backoff
+            else:
+                print("Max retries reached. Request failed.")
+                raise
+
+# Price history for charts, cached in memory and on disk between alerts
+history_cache = HistoryCache(cmc_request_with_retry)
+
+def fetch_historical_data(cmc_id, symbol):
+    """Fetch historical price data from CMC, reusing cached candles"""
+    print(f"\n=== Fetching historical data for {symbol} (ID: {cmc_id}) ===")
     
     try:
         # Fetch current price first
         print("\nFetching current price...")
-        current_price_url = 'https://pro-api.coinmarketcap.com/v2/cryptocurrency/quotes/latest'
-        current_price_params = {
-            'id': cmc_id,
-            'convert': 'USD'
-        }
-        
-        current_price_data = make_request_with_retry(current_price_url, current_price_params)
+        current_price_data = history_cache.get_latest(cmc_id)
         
         current_price = None
         current_timestamp = None
@@ -161,31 +221,11 @@ def fetch_historical_data(cmc_id, symbol):
         
         # Fetch 5-minute historical data
         print("\nFetching 5-minute data (last 72 intervals)...")
-        five_min_params = {
-            'id': cmc_id,
-            'interval': '5m',
-            'convert': 'USD',
-            'count': 72
-        }
-        
-        five_min_data = make_request_with_retry(
-            'https://pro-api.coinmarketcap.com/v2/cryptocurrency/quotes/historical',
-            five_min_params
-        )
+        five_min_data = history_cache.get_history(cmc_id, '5m', 72)
         
         # Fetch 4-hour historical data
         print("\nFetching 4-hour data (last 100 intervals)...")
-        four_hour_params = {
-            'id': cmc_id,
-            'interval': '4h',
-            'convert': 'USD',
-            'count': 100  # Changed to 100 intervals
-        }
-        
-        four_hour_data = make_request_with_retry(
-            'https://pro-api.coinmarketcap.com/v2/cryptocurrency/quotes/historical',
-            four_hour_params
-        )
+        four_hour_data = history_cache.get_history(cmc_id, '4h', 100)
         
         # Add current price to the response data
         if current_price and current_timestamp:
@@ -198,11 +238,8 @@ def fetch_historical_data(cmc_id, symbol):
                 }
             }
             
-            if 'data' in five_min_data and 'quotes' in five_min_data['data']:
-                five_min_data['data']['quotes'].append(current_quote)
-            
-            if 'data' in four_hour_data and 'quotes' in four_hour_data['data']:
-                four_hour_data['data']['quotes'].append(current_quote)
+            five_min_data['data']['quotes'].append(current_quote)
+            four_hour_data['data']['quotes'].append(current_quote)
         
         return {
             'five_min_data': five_min_data,
@@ -214,10 +251,6 @@ def fetch_historical_data(cmc_id, symbol):
         traceback.print_exc()
         return None
 
-def calculate_percentage_change(old_value, new_value):
-    """Calculate percentage change between two values"""
-    return ((new_value - old_value) / old_value) * 100
-
 def format_market_cap_message(symbol, old_mcap, new_mcap, start_time, end_time, cmc_id):
     """Format a consistent market cap change message"""
     pct_change = calculate_percentage_change(old_mcap, new_mcap)
@@ -239,98 +272,6 @@ def format_market_cap_message(symbol, old_mcap, new_mcap, start_time, end_time,
         f"Token Name: {symbol}"
     )
 
-def check_rank_increases(current_data, historical_data, timestamps):
-    findings = []
-    current_timestamp = timestamps[0]
-    token_changes = {}
-    rank_only_changes = 0
-    
-    print("\n=== Checking Rank Increases ===")
-    print(f"Current timestamp: {current_timestamp}")
-    
-    intervals_to_check = [
-        (1, 50),   # 1 interval (10 mins): 50 rank improvement
-        (3, 100),  # 3 intervals (30 mins): 100 rank improvement
-        (6, 150)   # 6 intervals (60 mins): 150 rank improvement
-    ]
-    
-    total_tokens = len([t for t in historical_data[0].values() if t['rank'] <= 1000])
-    tokens_checked = 0
-    
-    # Clear the line before starting
-    print(f"Checking {total_tokens} tokens...", end='\r', flush=True)
-    
-    for cmc_id, current in historical_data[0].items():
-        if current['rank'] <= 1000:
-            tokens_checked += 1
-            print(f"Checking token {tokens_checked}/{total_tokens}...", end='\r', flush=True)
-            
-            found_significant_change = False
-            met_rank_criteria = False
-            
-            if cmc_id not in token_changes:
-                token_changes[cmc_id] = []
-            
-            for num_intervals, required_rank_change in intervals_to_check:
-                if (len(historical_data) > num_intervals and 
-                    cmc_id in historical_data[num_intervals]):
-                    
-                    historical = historical_data[num_intervals][cmc_id]
-                    rank_change = historical['rank'] - current['rank']
-                    
-                    if rank_change >= required_rank_change:
-                        met_rank_criteria = True
-                        pct_change = calculate_percentage_change(
-                            historical['market_cap'],
-                            current['market_cap']
-                        )
-                        
-                        if pct_change >= 10:
-                            found_significant_change = True
-                            time_diff = num_intervals * 10
-                            
-                            token_changes[cmc_id].append({
-                                'symbol': current['symbol'],
-                                'time_diff': time_diff,
-                                'historical': historical,
-                                'current': current,
-                                'timestamp': timestamps[num_intervals],
-                                'pct_change': pct_change,
-                                'cmc_id': cmc_id,
-                                'interval_start': timestamps[num_intervals],  # Store start of interval
-                                'interval_end': current_timestamp  # Store end of interval
-                            })
-            
-            if met_rank_criteria and not found_significant_change:
-                rank_only_changes += 1
-            
-            if found_significant_change:
-                print(" " * 50, end='\r')  # Clear the line
-                print(f"\nFound significant change: {current['symbol']}")
-                print(f"Current Rank: {current['rank']}")
-                print(f"Current Market Cap: ${current['market_cap']:,.2f}")
-    
-    # Clean up token_changes to only keep tokens that actually had changes
-    token_changes = {cmc_id: changes for cmc_id, changes in token_changes.items() if changes}
-    
-    print(" " * 50, end='\r')  # Clear the line
-    print(f"\nChecked {total_tokens} tokens.")
-    
-    if token_changes or rank_only_changes > 0:
-        print("Results:")
-        print(f"- {rank_only_changes} tokens met rank criteria but not 10% market cap increase")
-        print(f"- {len(token_changes)} tokens met both criteria and will be alerted")
-    else:
-        print("No significant changes found.")
-    
-    # Only return tokens that actually had changes
-    findings = []
-    for cmc_id, changes in token_changes.items():
-        if changes:  # Only if we have actual changes
-            findings.append(changes[0])  # Use the first change, which is the shortest interval
-    
-    return findings
-
 def add_to_token_list(cur, conn, token_data):
     """Add a token to the Token List table and fetch charts if new"""
     try:
@@ -387,7 +328,7 @@ def add_to_token_list(cur, conn, token_data):
         # Fetch and send charts
         price_data = fetch_historical_data(token_data['cmc_id'], token_data['symbol'])
         if price_data:
-            five_min_img, four_hour_img = create_price_charts(price_data, token_data['symbol'])
+            five_min_img, four_hour_img = create_price_charts(price_data, token_data['symbol'], token_data['cmc_id'])
             if five_min_img or four_hour_img:
                 send_telegram_charts_sync(five_min_img, four_hour_img, token_data['symbol'])
         
@@ -397,174 +338,71 @@ def add_to_token_list(cur, conn, token_data):
 
 def check_sudden_appearance(current_data, historical_data, timestamps, conn):
     cur = conn.cursor()
-    current_top_700 = {cmc_id: data for cmc_id, data in current_data.items() 
-                      if data['rank'] <= 700}
     
-    for cmc_id, data in current_top_700.items():
-        sudden_appearance = True
-        for prev_data in historical_data[1:7]:
-            if cmc_id in prev_data and prev_data[cmc_id]['rank'] <= 1000:
-                sudden_appearance = False
-                break
-                
-        if sudden_appearance:
-            try:
-                # Temporarily disable adding tokens
-                # cur.execute("""
-                #     INSERT INTO public."Token List" (cmc_id, symbol)
-                #     VALUES (%s, %s)
-                #     ON CONFLICT DO NOTHING
-                # """, (cmc_id, data['symbol']))
-                # conn.commit()
-                
-                message = (
-                    f"🚀 <b>SUDDEN APPEARANCE DETECTED</b>\n\n"
-                    f"Token: {data['symbol']}\n"
-                    f"Current Rank: #{data['rank']}\n"
-                    f"Market Cap: ${data['market_cap']:,.2f}\n"
-                    f"Timeframe: {timestamps[6]} -> {timestamps[0]}"
-                )
-                send_telegram_alert(message)
-                print(f"\n{message}")
-                
-            except Exception as e:
-                print(f"Error adding sudden appearance token to Token List: {e}")
-            finally:
-                cur.close()
+    for cmc_id in detect_sudden_appearances(current_data, historical_data[1:7]):
+        data = current_data[cmc_id]
+        try:
+            # Temporarily disable adding tokens
+            # cur.execute("""
+            #     INSERT INTO public."Token List" (cmc_id, symbol)
+            #     VALUES (%s, %s)
+            #     ON CONFLICT DO NOTHING
+            # """, (cmc_id, data['symbol']))
+            # conn.commit()
+            
+            message = (
+                f"🚀 <b>SUDDEN APPEARANCE DETECTED</b>\n\n"
+                f"Token: {data['symbol']}\n"
+                f"Current Rank: #{data['rank']}\n"
+                f"Market Cap: ${data['market_cap']:,.2f}\n"
+                f"Timeframe: {timestamps[6]} -> {timestamps[0]}"
+            )
+            send_telegram_alert(message)
+            print(f"\n{message}")
+            
+        except Exception as e:
+            print(f"Error adding sudden appearance token to Token List: {e}")
+    cur.close()
 
-def create_price_charts(historical_data, symbol):
+def create_price_charts(historical_data, symbol, cmc_id=None):
+    """Render the 5m and 4h price charts in the chart process pool
+    
+    Returns:
+        tuple: (five_min_img, four_hour_img) as BytesIO, None where a chart is missing
+    """
     print("Creating charts...")
     try:
-        # Set style and font
-        plt.style.use('dark_background')
-        plt.rcParams.update({
-            'font.family': 'Segoe UI',
-            'font.size': 14,
-            'axes.titlesize': 20,
-            'axes.labelsize': 18,
-            'xtick.labelsize': 14,
-            'ytick.labelsize': 14,
-            'axes.linewidth': 2,
-            'axes.grid': True,
-            'grid.alpha': 0.2
-        })
-        
-        five_min_img = None
-        four_hour_img = None
-        
-        if 'five_min_data' in historical_data:
-            five_min_data = historical_data['five_min_data']
-            
-            if 'data' in five_min_data and 'quotes' in five_min_data['data']:
-                quotes = five_min_data['data']['quotes']
-                
-                if quotes:
-                    try:
-                        five_min_df = pd.DataFrame([{
-                            'timestamp': quote['timestamp'],
-                            'price': quote['quote']['USD']['price']
-                        } for quote in quotes])
-                        five_min_df['timestamp'] = pd.to_datetime(five_min_df['timestamp'])
-                        
-                        five_min_fig, ax1 = plt.subplots(figsize=(12, 7))
-                        ax1.plot(five_min_df['timestamp'], five_min_df['price'], 
-                                color='#00a8ff', linewidth=3)
-                        ax1.grid(True, alpha=0.2, linewidth=1.2)
-                        ax1.set_facecolor('#1a1a1a')
-                        five_min_fig.patch.set_facecolor('#1a1a1a')
-                        ax1.xaxis.set_major_locator(plt.LinearLocator(8))
-                        ax1.xaxis.set_major_formatter(plt.matplotlib.dates.DateFormatter('%H:%M'))
-                        ax1.set_title(f'{symbol} Price\nLast 6 Hours (5m Intervals)', pad=20)
-                        ax1.set_xlabel('Time', labelpad=15)
-                        ax1.set_ylabel('Price (USD)', labelpad=15)
-                        plt.xticks(rotation=45, ha='right')
-                        five_min_fig.tight_layout(pad=2.0)
-                        
-                        five_min_img = BytesIO()
-                        five_min_fig.savefig(five_min_img, format='png', bbox_inches='tight')
-                        five_min_img.seek(0)
-                        
-                    except Exception as e:
-                        print(f"Error in 5-minute chart creation: {e}")
-        
-        if 'four_hour_data' in historical_data:
-            four_hour_data = historical_data['four_hour_data']
-            
-            if 'data' in four_hour_data and 'quotes' in four_hour_data['data']:
-                quotes = four_hour_data['data']['quotes']
-                
-                if quotes:
-                    try:
-                        four_hour_df = pd.DataFrame([{
-                            'timestamp': quote['timestamp'],
-                            'price': quote['quote']['USD']['price']
-                        } for quote in quotes])
-                        four_hour_df['timestamp'] = pd.to_datetime(four_hour_df['timestamp'])
-                        
-                        four_hour_fig, ax2 = plt.subplots(figsize=(12, 7))
-                        ax2.plot(four_hour_df['timestamp'], four_hour_df['price'], 
-                                color='#00a8ff', linewidth=3)
-                        ax2.grid(True, alpha=0.2, linewidth=1.2)
-                        ax2.set_facecolor('#1a1a1a')
-                        four_hour_fig.patch.set_facecolor('#1a1a1a')
-                        ax2.xaxis.set_major_locator(plt.LinearLocator(8))
-                        ax2.xaxis.set_major_formatter(plt.matplotlib.dates.DateFormatter('%Y-%m-%d'))
-                        ax2.set_title(f'{symbol} Price\nHistorical Chart', pad=20)
-                        ax2.set_xlabel('Date', labelpad=15)
-                        ax2.set_ylabel('Price (USD)', labelpad=15)
-                        plt.xticks(rotation=45, ha='right')
-                        four_hour_fig.tight_layout(pad=2.0)
-                        
-                        four_hour_img = BytesIO()
-                        four_hour_fig.savefig(four_hour_img, format='png', bbox_inches='tight')
-                        four_hour_img.seek(0)
-                        
-                    except Exception as e:
-                        print(f"Error in 4-hour chart creation: {e}")
-        
+        charts = chart_renderer.render_price_charts(cmc_id, symbol, historical_data)
+        five_min_img = BytesIO(charts['5m']) if '5m' in charts else None
+        four_hour_img = BytesIO(charts['4h']) if '4h' in charts else None
         return five_min_img, four_hour_img
     except Exception as e:
         print("✕ Failed")
         return None, None
 
 def send_telegram_charts_sync(five_min_img, four_hour_img, symbol):
+    """Queue both charts; the dispatcher sends them as one album"""
     print("Sending charts...")
-    try:
-        asyncio.run(send_telegram_charts(five_min_img, four_hour_img, symbol))
-        print("✓ Done")
-    except Exception as e:
+    if telegram_dispatcher.send_photos([five_min_img, four_hour_img]):
+        print("✓ Queued")
+    else:
         print("✕ Failed")
 
-async def send_telegram_charts(five_min_img, four_hour_img, symbol):
+def send_token_charts(cmc_id, symbol):
+    """Fetch price history, render both charts and send them (runs on alert_executor)"""
     try:
-        bot = Bot(token=TELEGRAM_BOT_TOKEN)
-        if five_min_img:
-            await bot.send_photo(chat_id=TELEGRAM_CHAT_ID, photo=five_min_img)
-        if four_hour_img:
-            await bot.send_photo(chat_id=TELEGRAM_CHAT_ID, photo=four_hour_img)
+        price_data = fetch_historical_data(cmc_id, symbol)
+        if price_data:
+            five_min_img, four_hour_img = create_price_charts(price_data, symbol, cmc_id)
+            if five_min_img and four_hour_img:
+                send_telegram_charts_sync(five_min_img, four_hour_img, symbol)
     except Exception as e:
-        print("✕ Failed to send charts")
+        print("✕ Failed")
 
-def process_token_messages(token_data, cur, conn, timestamps, historical_data):
+def process_token_messages(token_data):
+    """Send the alert message and charts for one finding (runs on alert_executor)"""
     try:
         print(f"Processing {token_data['symbol']}")
-        # First check if token exists
-        # cur.execute("""
-        #     SELECT cmc_id FROM public."Token List"
-        #     WHERE cmc_id = %s
-        # """, (token_data['cmc_id'],))
-        
-        # token_exists = cur.fetchone() is not None
-        
-        # Prepare message
-        # if not token_exists:
-        #     # Add new token
-        #     cur.execute("""
-        #         INSERT INTO public."Token List" (cmc_id, symbol)
-        #         VALUES (%s, %s)
-        #     """, (token_data['cmc_id'], token_data['symbol']))
-        #     conn.commit()
-            
         message = (
             f"{token_data['symbol']} has been added to your database.\n\n"
             + format_market_cap_message(
@@ -581,16 +419,13 @@ def process_token_messages(token_data, cur, conn, timestamps, historical_data):
         send_telegram_alert(message)
         
         # 2. Immediately fetch and send charts
-        price_data = fetch_historical_data(token_data['cmc_id'], token_data['symbol'])
-        if price_data:
-            five_min_img, four_hour_img = create_price_charts(price_data, token_data['symbol'])
-            if five_min_img and four_hour_img:
-                send_telegram_charts_sync(five_min_img, four_hour_img, token_data['symbol'])
+        send_token_charts(token_data['cmc_id'], token_data['symbol'])
             
     except Exception as e:
         print("✕ Failed")
 
-def process_test_token(cur, conn):
+def process_test_token(cur):
+    """Queue a chart job for the test token"""
     try:
         print("Processing test token")
         cur.execute("""
@@ -600,55 +435,61 @@ def process_test_token(cur, conn):
             LIMIT 1
         """)
         token_symbol = cur.fetchone()[0]
-        
-        price_data = fetch_historical_data(35336, token_symbol)
-        if price_data:
-            five_min_img, four_hour_img = create_price_charts(price_data, token_symbol)
-            if five_min_img and four_hour_img:
-                send_telegram_charts_sync(five_min_img, four_hour_img, token_symbol)
+        alert_executor.submit(send_token_charts, 35336, token_symbol)
     except Exception as e:
         print("✕ Failed")
 
 def monitor_tokens():
     print("=== Monitor Started ===")
     
-    # Get initial latest timestamp
+    # Load the initial window and start from its latest timestamp
+    window = SnapshotWindow()
     conn = get_db_connection()
     cur = conn.cursor()
-    cur.execute("SELECT DISTINCT timestamp FROM public.\"Token Filter\" ORDER BY timestamp DESC LIMIT 1")
-    last_processed_timestamp = cur.fetchone()[0]
+    window.refresh(cur)
+    last_processed_timestamp = window.timestamps[0]
     print(f"Starting from timestamp: {last_processed_timestamp}")
     cur.close()
     conn.close()
     
+    # MCrolling.py notifies as soon as a new Token Filter snapshot is committed
+    listener = ChangeListener(get_db_connection, [TOKEN_FILTER])
+    
     while True:
         try:
             print(f"\n[{datetime.now(pytz.UTC).strftime('%H:%M:%S')}] Checking...")
             conn = get_db_connection()
             cur = conn.cursor()
             
-            # Get latest timestamp
-            cur.execute("SELECT DISTINCT timestamp FROM public.\"Token Filter\" ORDER BY timestamp DESC LIMIT 1")
-            current_timestamp = cur.fetchone()[0]
+            # Load only the snapshots we don't already hold
+            window.refresh(cur)
+            current_timestamp = window.timestamps[0]
             
             # Process only if we have a newer timestamp
             if current_timestamp > last_processed_timestamp:
                 print(f"New timestamp found: {current_timestamp}")
                 
-                # Get 7 timestamps for historical comparison
-                cur.execute("SELECT DISTINCT timestamp FROM public.\"Token Filter\" ORDER BY timestamp DESC LIMIT 7")
-                timestamps = [row[0] for row in cur.fetchall()]
-                
-                if len(timestamps) >= 7:
-                    historical_data = [get_token_data(cur, ts) for ts in timestamps]
+                if window.is_full():
+                    timestamps = window.timestamps
+                    historical_data = window.data
                     findings = check_rank_increases(historical_data[0], historical_data[1:], timestamps)
                     
+                    # Only enqueue the alert jobs so the next snapshot is never blocked on
+                    # history fetches or rendering; jobs in one cycle render in parallel
                     if findings:
                         print(f"Found {len(findings)} changes")
                         for token in findings:
-                            process_token_messages(token, cur, conn, timestamps, historical_data)
+                            should_alert, reason = alert_state.check_and_record(
+                                token['cmc_id'], token['current']['rank'],
+                                token['current']['market_cap'], token['interval_end']
+                            )
+                            if not should_alert:
+                                print(f"Skipping {token['symbol']}: {reason}")
+                                continue
+                            print(f"Alerting {token['symbol']}: {reason}")
+                            alert_executor.submit(process_token_messages, token)
                     
-                    process_test_token(cur, conn)
+                    process_test_token(cur)
                     
                     # Update last processed timestamp after successful processing
                     last_processed_timestamp = current_timestamp
@@ -656,7 +497,7 @@ def monitor_tokens():
             
             cur.close()
             conn.close()
-            time.sleep(10)  # Check every 10 seconds
+            listener.wait(FALLBACK_POLL_INTERVAL)  # Wake on the next snapshot
             
         except Exception as e:
             print(f"Error: {e}")
@@ -671,3 +512,5 @@ if __name__ == '__main__':
         print("Stopped")
     except Exception as e:
         print(f"Error: {e}")
+    finally:
+        telegram_dispatcher.stop()
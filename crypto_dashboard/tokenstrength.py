@@ -14,6 +14,7 @@ import sys
 import time
 import logging
 import logging.handlers
+from changefeed import publish_change, TOKEN_STRENGTH
 
 # Load environment variables
 load_dotenv()
@@ -63,19 +64,27 @@ def get_db_connection():
         logger.error(f"Database connection failed: {e}")
         raise
 
-def get_calculation_timestamp():
-    """Get the current calculation timestamp and the price timestamp (5 minutes earlier)"""
-    now = datetime.now(SGT)
+def get_calculation_timestamp(cycle_timestamp=None):
+    """Get the current calculation timestamp and the price timestamp (5 minutes earlier)
     
-    # Round down to the previous 10-minute mark for both storage and price data
-    storage_minutes = ((now.minute - 5) // 10) * 10  # Subtract 5 first to handle the offset
+    Args:
+        cycle_timestamp (datetime, optional): 10-minute mark whose prices have already
+            been committed (passed by pipeline.py). If None, derived from the :05 schedule.
+    """
+    now = datetime.now(SGT)
     
-    # Create storage timestamp at the 10-minute mark
-    storage_timestamp = now.replace(
-        minute=storage_minutes,
-        second=0,
-        microsecond=0
-    )
+    if cycle_timestamp is not None:
+        storage_timestamp = cycle_timestamp.astimezone(SGT).replace(second=0, microsecond=0)
+    else:
+        # Round down to the previous 10-minute mark for both storage and price data
+        storage_minutes = ((now.minute - 5) // 10) * 10  # Subtract 5 first to handle the offset
+        
+        # Create storage timestamp at the 10-minute mark
+        storage_timestamp = now.replace(
+            minute=storage_minutes,
+            second=0,
+            microsecond=0
+        )
     
     # Price timestamp is the same as storage timestamp
     price_timestamp = storage_timestamp
@@ -202,6 +211,7 @@ def store_token_strengths(conn, strength_data):
             values
         )
         
+        publish_change(cur, TOKEN_STRENGTH, strength_data[0]['timestamp'])
         conn.commit()
         print(f"Successfully stored {len(values)} token strength records")
         logger.info(f"Successfully stored {len(values)} token strength records")
@@ -215,7 +225,7 @@ def store_token_strengths(conn, strength_data):
     finally:
         cur.close()
 
-def process_token_strength_calculations():
+def process_token_strength_calculations(cycle_timestamp=None):
     """Main function to process all token strength calculations"""
     print("\n=== Starting Token Strength Calculations ===")
     logger.info("=== Starting Token Strength Calculations ===")
@@ -229,7 +239,7 @@ def process_token_strength_calculations():
         logger.info("Database connection successful!")
         
         # Get calculation timestamps
-        calc_timestamp, price_timestamp = get_calculation_timestamp()
+        calc_timestamp, price_timestamp = get_calculation_timestamp(cycle_timestamp)
         current_date = calc_timestamp.date()
         print(f"\nCalculation timestamp: {calc_timestamp}")
         logger.info(f"Calculation timestamp: {calc_timestamp}")
@@ -0,0 +1,61 @@
+import json
+import time
+import dbhandler
+from dbhandler import db_connection, HOUR_MARK_COLUMN, HOUR_MARK_FALLBACK
+
+RUNS = 5
+CALC_TYPES = ['top_5', 'top_10', 'top_15', 'top_20', 'top_100_mc', 'top_200_mc']
+
+QUERY = """
+    SELECT "TIMESTAMP", category, calculation_type, strength_ratio 
+    FROM public."CategoryStrength"
+    WHERE category = ANY(%s)
+    AND calculation_type = ANY(%s)
+    AND {predicate}
+    ORDER BY "TIMESTAMP" ASC
+"""
+
+def load_categories():
+    with open('static/data/categories.json') as f:
+        return json.load(f)['categories']
+
+def explain(cur, predicate, params):
+    cur.execute("EXPLAIN (ANALYZE, BUFFERS) " + QUERY.format(predicate=predicate), params)
+    return [row[0] for row in cur.fetchall()]
+
+def time_query(cur, predicate, params):
+    timings = []
+    for _ in range(RUNS):
+        start = time.time()
+        cur.execute(QUERY.format(predicate=predicate), params)
+        rows = len(cur.fetchall())
+        timings.append(time.time() - start)
+    return rows, timings
+
+def main():
+    """Compare the EXTRACT(MINUTE) scan with the is_hour_mark partial index"""
+    if not dbhandler.ensure_hour_mark_index():
+        print("Hourly index could not be created - nothing to compare")
+        return
+    
+    params = (load_categories(), CALC_TYPES)
+    with db_connection() as conn:
+        if not conn:
+            return
+        cur = conn.cursor()
+        cur.execute('ANALYZE public."CategoryStrength"')
+        
+        for label, predicate in (('EXTRACT(MINUTE) filter', HOUR_MARK_FALLBACK),
+                                 (f'{HOUR_MARK_COLUMN} partial index', HOUR_MARK_COLUMN)):
+            print(f"\n=== {label} ===")
+            for line in explain(cur, predicate, params):
+                print(line)
+            rows, timings = time_query(cur, predicate, params)
+            print(f"{rows} rows, best {min(timings) * 1000:.1f}ms, "
+                  f"mean {sum(timings) / len(timings) * 1000:.1f}ms over {RUNS} runs")
+        
+        conn.commit()
+        cur.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+import io
+import json
+import os
+import sqlite3
+import tarfile
+import threading
+import time
+
+try:
+    import redis
+except ImportError:  # Optional; only needed for redis:// backends
+    redis = None
+
+BUNDLE_KEY = 'chart_cache/bundle'
+VERSION_KEY = 'chart_cache/version'
+WORKER_STATUS_KEY = 'chart_cache/worker_status'
+# Cache subdirectories shipped in a bundle; manifest.json in each is the commit point
+BUNDLE_DIRS = ('segments', 'payloads')
+SKIPPED_SUFFIXES = ('.tmp', '.lock')
+
+
+class CacheBackend:
+    """Key/value store the worker publishes the chart cache to, shared by any number
+    of web processes and machines
+
+    Values are bytes. Implementations only need get and put; put must replace the
+    value atomically so readers see either the old or the new one.
+    """
+    def get(self, key):
+        raise NotImplementedError
+
+    def put(self, key, value):
+        raise NotImplementedError
+
+
+class MemoryBackend(CacheBackend):
+    """In-process stand-in for tests; backends opened with the same name share data"""
+    namespaces = {}
+
+    def __init__(self, name='default'):
+        self.data = MemoryBackend.namespaces.setdefault(name, {})
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def put(self, key, value):
+        self.data[key] = bytes(value)
+
+
+class LocalDirBackend(CacheBackend):
+    """One file per key under a directory, e.g. a volume mounted on several machines"""
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.root, key.replace('/', '__'))
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key, value):
+        temp_path = f"{self._path(key)}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(value)
+        os.replace(temp_path, self._path(key))
+
+
+class SQLiteBackend(CacheBackend):
+    """Embedded key/value table in a SQLite database file (WAL mode, one connection per thread)"""
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        with self._connection() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB)")
+
+    def _connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self.local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._connection().execute("SELECT value FROM cache WHERE key = ?", (key,)).fetchone()
+        return bytes(row[0]) if row else None
+
+    def put(self, key, value):
+        with self._connection() as conn:
+            conn.execute("INSERT OR REPLACE INTO cache (key, value) VALUES (?, ?)", (key, sqlite3.Binary(value)))
+
+
+class RedisBackend(CacheBackend):
+    """Network key/value store; any number of machines can share it"""
+    def __init__(self, url):
+        if redis is None:
+            raise ImportError("The redis package is required for redis:// cache backends")
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        return self.client.get(key)
+
+    def put(self, key, value):
+        self.client.set(key, value)
+
+
+def open_backend(url):
+    """Open a backend from a CACHE_BACKEND URL
+
+    memory://<name>, sqlite:///<path>, redis://<host>..., rediss://..., or
+    file:///<dir> (a bare path is also treated as a directory).
+    """
+    if url.startswith('memory://'):
+        return MemoryBackend(url[len('memory://'):] or 'default')
+    if url.startswith('sqlite:///'):
+        return SQLiteBackend(url[len('sqlite:///'):])
+    if url.startswith(('redis://', 'rediss://')):
+        return RedisBackend(url)
+    if url.startswith('file://'):
+        return LocalDirBackend(url[len('file://'):])
+    return LocalDirBackend(url)
+
+
+def _bundle_members(cache_dir):
+    """Relative paths to ship, every directory's manifest.json last"""
+    for subdir in BUNDLE_DIRS:
+        root = os.path.join(cache_dir, subdir)
+        if not os.path.isdir(root):
+            continue
+        names = sorted(name for name in os.listdir(root) if not name.endswith(SKIPPED_SUFFIXES))
+        names.sort(key=lambda name: name == 'manifest.json')
+        for name in names:
+            yield f"{subdir}/{name}"
+
+
+def publish_bundle(backend, cache_dir, version):
+    """Pack the segment store and chart payloads into one bundle and publish it
+
+    The bundle is written before the version key, so a reader that sees a new
+    version always finds its bundle.
+
+    Returns:
+        int: Bundle size in bytes
+    """
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w') as tar:
+        for member in _bundle_members(cache_dir):
+            tar.add(os.path.join(cache_dir, member), arcname=member)
+    data = buffer.getvalue()
+    backend.put(BUNDLE_KEY, data)
+    backend.put(VERSION_KEY, json.dumps({'version': version, 'published_at': time.time()}).encode('utf-8'))
+    return len(data)
+
+
+def read_version(backend):
+    """Version of the published bundle, or None if nothing has been published"""
+    raw = backend.get(VERSION_KEY)
+    return json.loads(raw)['version'] if raw else None
+
+
+def install_bundle(backend, cache_dir):
+    """Unpack the published bundle into a local cache directory
+
+    Files are replaced one by one with manifest.json last, so the local stores
+    switch to the new version in one step; files the new manifests no longer
+    reference are removed afterwards.
+
+    Returns:
+        bool: True if a bundle was installed
+    """
+    data = backend.get(BUNDLE_KEY)
+    if not data:
+        return False
+    installed = set()
+    with tarfile.open(fileobj=io.BytesIO(data), mode='r') as tar:
+        for member in tar.getmembers():
+            subdir, _, name = member.name.partition('/')
+            if subdir not in BUNDLE_DIRS or not name or '/' in name or not member.isfile():
+                continue
+            root = os.path.join(cache_dir, subdir)
+            os.makedirs(root, exist_ok=True)
+            path = os.path.join(root, name)
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            with open(temp_path, 'wb') as f:
+                f.write(tar.extractfile(member).read())
+            os.replace(temp_path, path)
+            installed.add(member.name)
+
+    for member in list(_bundle_members(cache_dir)):
+        if member not in installed:
+            try:
+                os.remove(os.path.join(cache_dir, member))
+            except OSError:
+                pass
+    return True
@@ -1,37 +1,223 @@
 import json
 import os
-from datetime import datetime
+from datetime import datetime, timedelta
 import pytz
 import threading
 import time
-from dbhandler import get_strength_data, get_latest_timestamp
+import psycopg2
+from dbhandler import get_strength_data, refresh_latest_timestamp, db_connection, DB_CONNECTION
+from changefeed import ChangeListener, publish_change, CATEGORY_STRENGTH, CHART_CACHE
+import numpy as np
+from segment_store import SegmentStore, array_to_points, format_timestamp, hour_marks, window_bounds
+from chart_payloads import PayloadStore, build_payloads
+import cache_backend
 
 CACHE_DIR = 'static/cache'
-CHART_DATA_FILE = os.path.join(CACHE_DIR, 'chart_data.json')
-LAST_UPDATE_FILE = os.path.join(CACHE_DIR, 'last_update.json')
-CHECK_INTERVAL = 1  # Check SQL every 1 second
+SEGMENTS_DIR = os.path.join(CACHE_DIR, 'segments')
+LEGACY_CHART_DATA_FILE = os.path.join(CACHE_DIR, 'chart_data.json')  # Pre-segment cache, imported once
+PAYLOADS_DIR = os.path.join(CACHE_DIR, 'payloads')
+WORKER_STATUS_FILE = os.path.join(CACHE_DIR, 'worker_status.json')
+REFRESH_CADENCE = 600        # strength.py writes a CategoryStrength batch every 10 minutes...
+REFRESH_DELAY = 60           # ...committed within about this long after the boundary
+WAIT_SLICE = 5               # Longest uninterrupted wait, so a stop request is noticed quickly
+HEARTBEAT_INTERVAL = 30      # Seconds between worker status file updates while idle
+# Retention per resolution: every 10-minute point for RETENTION_10MIN_HOURS, then hour marks
+# only up to RETENTION_1H_HOURS. The charts need 24h and 48h; longer ranges come from /api/history.
+RETENTION_10MIN_HOURS = max(int(os.environ.get('CACHE_RETENTION_10MIN_HOURS', 48)), 24)
+RETENTION_1H_HOURS = max(int(os.environ.get('CACHE_RETENTION_1H_HOURS', 168)), 48, RETENTION_10MIN_HOURS)
+COMPACT_INTERVAL = 3600      # Seconds between compactions in the worker
+REPLICA_SYNC_INTERVAL = 15   # Seconds between backend version checks without a notification
+MAX_CACHED_DELTAS = 16       # /api/check_updates deltas kept per snapshot
 
-# Global flag to control background thread
-should_continue = True
+# Set to stop the background thread
+stop_event = threading.Event()
 
-# Lock for cache access
+# Shared backend (CACHE_BACKEND URL, see cache_backend.open_backend) the worker publishes
+# the cache to; web processes then mirror it instead of reading the worker's directory
+backend = cache_backend.open_backend(os.environ['CACHE_BACKEND']) if os.environ.get('CACHE_BACKEND') else None
+replica = False  # True in processes that mirror the backend; they never write the cache
+# Set after each bundle a replica installs; the update broadcaster waits on it
+# instead of listening for the worker's notification itself
+replica_updated = threading.Event()
+
+# Serializes cache writes within this process (readers go through chart_cache)
 cache_lock = threading.Lock()
 
+# Chart data, one packed segment per (calc_type, category)
+store = SegmentStore(SEGMENTS_DIR)
+
+# Ready-to-send index page payloads, republished after every update
+payload_store = PayloadStore(PAYLOADS_DIR)
+
+def set_cache_dir(cache_dir):
+    """Point the cache at another directory (CACHE_DIR environment override)"""
+    global CACHE_DIR, SEGMENTS_DIR, LEGACY_CHART_DATA_FILE, PAYLOADS_DIR, WORKER_STATUS_FILE
+    global store, payload_store, chart_cache
+    CACHE_DIR = cache_dir
+    SEGMENTS_DIR = os.path.join(CACHE_DIR, 'segments')
+    LEGACY_CHART_DATA_FILE = os.path.join(CACHE_DIR, 'chart_data.json')
+    PAYLOADS_DIR = os.path.join(CACHE_DIR, 'payloads')
+    WORKER_STATUS_FILE = os.path.join(CACHE_DIR, 'worker_status.json')
+    store = SegmentStore(SEGMENTS_DIR)
+    payload_store = PayloadStore(PAYLOADS_DIR)
+    chart_cache = ResidentChartCache()
+
 def ensure_cache_dir():
-    """Ensure cache directory exists"""
-    if not os.path.exists(CACHE_DIR):
-        os.makedirs(CACHE_DIR)
+    """Ensure cache directory exists and import the old chart_data.json if there is one"""
+    if not os.path.exists(SEGMENTS_DIR):
+        os.makedirs(SEGMENTS_DIR)
+    migrate_legacy_cache()
+    # Caches written before payloads were published get them on the next start
+    if store.exists() and not os.path.exists(payload_store.manifest_path()):
+        publish_payloads()
 
-def get_cached_data():
-    """Get data from cache if it exists"""
+def migrate_legacy_cache():
+    """Convert a monolithic chart_data.json into segments, once"""
+    if store.exists() or not os.path.exists(LEGACY_CHART_DATA_FILE):
+        return
     try:
-        if os.path.exists(CHART_DATA_FILE):
-            with cache_lock:
-                with open(CHART_DATA_FILE) as f:
-                    return json.load(f)
+        print(f"Converting {LEGACY_CHART_DATA_FILE} to segmented cache...")
+        with open(LEGACY_CHART_DATA_FILE) as f:
+            data = json.load(f)
+        update_cache(data)
+        os.replace(LEGACY_CHART_DATA_FILE, f"{LEGACY_CHART_DATA_FILE}.migrated")
     except Exception as e:
-        print(f"Error reading cache: {e}")
-    return None
+        print(f"Error converting legacy cache: {e}")
+
+class ChartSnapshot:
+    """Chart data parsed from one version of the segment manifest; never modified once built
+
+    series maps (calc_type, category) to (record array, utc offset, hour mark
+    positions). Windows are cut with a binary search on the sorted epoch
+    timestamps, so a request costs O(log n + k) for k returned points. Callers
+    share the dicts it holds and must not mutate them.
+    """
+    def __init__(self, version, series, last_update):
+        self.version = version
+        self.series = series
+        self.last_update = last_update
+        self.cursor = to_epoch(last_update) if last_update else None  # Client update cursor
+        self.built_at = time.time()
+        self.deltas = {}                # since -> delta, shared by clients polling with the same cursor
+        self.data = self.window()       # Everything in the cache, as get_cached_data returns it
+        # (data_10min, data_1h) for the index page
+        self.charts = self.chart_views() if last_update else (None, None)
+
+    def window(self, start=None):
+        """Points from `start` (epoch seconds) on
+
+        Returns:
+            dict: {calc_type: {category: [points]}}, categories without points in the window omitted
+        """
+        data = {}
+        for (calc_type, category), (arr, utc_offset, marks) in self.series.items():
+            data.setdefault(calc_type, {})
+            data.setdefault(f"{calc_type}_1h", {})
+            lo, hi = window_bounds(arr['ts'], start)
+            if hi > lo:
+                data[calc_type][category] = array_to_points(arr[lo:hi], utc_offset)
+            # <calc_type>_1h is the base series' hour marks
+            first_mark = int(np.searchsorted(marks, lo))
+            if first_mark < len(marks):
+                data[f"{calc_type}_1h"][category] = array_to_points(arr[marks[first_mark:]], utc_offset)
+        return data
+
+    def delta(self, since):
+        """Points newer than `since` (epoch seconds), as window() returns them"""
+        delta = self.deltas.get(since)
+        if delta is None:
+            delta = self.window(start=since + 1)
+            if len(self.deltas) < MAX_CACHED_DELTAS:
+                self.deltas[since] = delta
+        return delta
+
+    def chart_views(self):
+        """The index page views: 24h of 10-minute points and 48h of hourly points
+
+        Returns:
+            tuple: (data_10min, data_1h)
+        """
+        cutoff_24h = to_epoch(self.last_update - timedelta(hours=24))
+        cutoff_48h = to_epoch(self.last_update - timedelta(hours=48))
+        
+        # The 1h view is derived from the base series' hour marks
+        data_10min = {}  # For 10-minute charts
+        data_1h = {}     # For 1-hour charts
+        for (calc_type, category), (arr, utc_offset, marks) in self.series.items():
+            data_10min.setdefault(calc_type, {})
+            data_1h.setdefault(calc_type, {})
+            
+            lo, hi = window_bounds(arr['ts'], cutoff_24h)
+            if hi > lo:
+                data_10min[calc_type][category] = array_to_points(arr[lo:hi], utc_offset)
+            
+            # Only include points at the start of each hour (local minute 0)
+            first_mark = int(np.searchsorted(marks, window_bounds(arr['ts'], cutoff_48h)[0]))
+            if first_mark < len(marks):
+                data_1h[calc_type][category] = array_to_points(arr[marks[first_mark:]], utc_offset)
+        return data_10min, data_1h
+
+class ResidentChartCache:
+    """Keeps the parsed chart cache in memory and reloads it when the worker commits a new version
+
+    The version is the manifest's (inode, mtime, size); every commit replaces the
+    manifest, so a single stat per request detects it. Readers take a reference to
+    the current snapshot without locking; one thread rebuilds while the others keep
+    serving the previous snapshot.
+    """
+    def __init__(self):
+        self.snapshot = None
+        self.build_lock = threading.Lock()
+        self.reloads = 0
+
+    def _manifest_version(self):
+        try:
+            st = os.stat(store.manifest_path())
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def get(self):
+        """Current snapshot, or None if there is no cache yet"""
+        version = self._manifest_version()
+        snapshot = self.snapshot
+        if version is None or (snapshot is not None and snapshot.version == version):
+            return snapshot
+
+        if not self.build_lock.acquire(blocking=snapshot is None):
+            return snapshot
+        try:
+            if self.snapshot is not None and self.snapshot.version == version:
+                return self.snapshot
+            start_time = time.time()
+            new_snapshot = build_chart_snapshot(version)
+            self.snapshot = new_snapshot
+            self.reloads += 1
+            print(f"Loaded chart cache up to {new_snapshot.last_update} in {time.time() - start_time:.2f}s")
+            return new_snapshot
+        except Exception as e:
+            print(f"Error loading chart cache: {e}")
+            return snapshot
+        finally:
+            self.build_lock.release()
+
+def build_chart_snapshot(version):
+    """Load every base series into memory with its hour marks"""
+    manifest = store.read_manifest()
+    series = {}
+    for calc_type, category in store.list_series(manifest):
+        if calc_type.endswith('_1h'):
+            continue  # Stored by older versions; derived from the base series now
+        arr, utc_offset = store.read_series(calc_type, category, manifest=manifest)
+        series[(calc_type, category)] = (arr, utc_offset, hour_marks(arr, utc_offset))
+    return ChartSnapshot(version, series, parse_last_update(manifest))
+
+chart_cache = ResidentChartCache()
+
+def get_cached_data():
+    """Get data from cache if it exists"""
+    snapshot = chart_cache.get()
+    return snapshot.data if snapshot else None
 
 def get_cached_data_with_window(hours=None):
     """Get data from cache with optional time window filter
@@ -45,103 +231,46 @@ def get_cached_data_with_window(hours=None):
     try:
         start_time = time.time()
         
-        # Get full data
-        read_start = time.time()
-        data = get_cached_data()
-        print(f"Reading cache took {time.time() - read_start:.2f}s")
-        
-        if not data or not hours:
-            return data
-            
-        # Get current time from last_update.json
-        time_start = time.time()
-        latest_time = get_last_update_time()
-        print(f"Getting last update time took {time.time() - time_start:.2f}s")
-        
-        if not latest_time:
-            return data
+        if not hours:
+            return get_cached_data()
             
-        # Calculate cutoff time
-        from datetime import timedelta
-        cutoff_time = latest_time - timedelta(hours=hours)
+        snapshot = chart_cache.get()
+        if not snapshot or not snapshot.last_update:
+            return get_cached_data()
         
-        # Filter data
-        filter_start = time.time()
-        filtered_data = {}
-        for calc_type, categories in data.items():
-            filtered_data[calc_type] = {}
-            for category, points in categories.items():
-                filtered_points = []
-                for point in points:
-                    point_time = datetime.fromisoformat(point['timestamp'].replace('Z', '+00:00'))
-                    if point_time >= cutoff_time:
-                        filtered_points.append(point)
-                if filtered_points:
-                    filtered_data[calc_type][category] = filtered_points
+        # Binary search for the cutoff in each resident series
+        cutoff = snapshot.last_update - timedelta(hours=hours)
+        filtered_data = snapshot.window(start=to_epoch(cutoff))
         
-        print(f"Filtering data took {time.time() - filter_start:.2f}s")
         print(f"Total cache operation took {time.time() - start_time:.2f}s")
-        print(f"Original data size: {len(str(data))} bytes")
-        print(f"Filtered data size: {len(str(filtered_data))} bytes")
-        
         return filtered_data
         
     except Exception as e:
         print(f"Error filtering cached data: {e}")
         return None
 
+def to_epoch(dt):
+    """Epoch seconds for a naive (UTC) datetime, matching the segment timestamps"""
+    return int(dt.replace(tzinfo=pytz.UTC).timestamp())
+
+def parse_last_update(manifest):
+    """Latest cached data point from a manifest, as a naive datetime"""
+    timestamp = manifest.get('last_data_point')
+    if not timestamp:
+        return None
+    return datetime.fromisoformat(timestamp.replace('+00:00', ''))
+
 def get_last_update_time(debug=False):
     """Get the timestamp of last cached data"""
     try:
-        if os.path.exists(LAST_UPDATE_FILE) and os.path.getsize(LAST_UPDATE_FILE) > 0:
-            with cache_lock:
-                with open(LAST_UPDATE_FILE) as f:
-                    data = json.load(f)
-                    # Try both old and new timestamp keys
-                    timestamp = data.get('timestamp') or data.get('last_data_point')
-                    if timestamp:
-                        # Parse as naive datetime (no timezone)
-                        dt = datetime.fromisoformat(timestamp.replace('+00:00', ''))
-                        if debug:
-                            print(f"Found cache timestamp (naive): {dt}")
-                        return dt
-                    else:
-                        print("WARNING: No timestamp found in last_update.json")
-                        return None
-        else:
-            if debug:
-                print("No last_update.json file or file is empty")
-            return None
+        dt = parse_last_update(store.read_manifest())
+        if debug:
+            print(f"Found cache timestamp (naive): {dt}" if dt else "No cached data yet")
+        return dt
     except Exception as e:
         print(f"Error reading last update time: {e}")
         return None
 
-def find_latest_timestamp(data):
-    """Find the latest timestamp in the chart data"""
-    try:
-        latest = None
-        
-        for calc_type, category_data in data.items():
-            # Skip empty calculation types
-            if not category_data:
-                continue
-                
-            for category, points in category_data.items():
-                # Skip empty categories
-                if not points:
-                    continue
-                    
-                for point in points:
-                    ts = datetime.fromisoformat(point['timestamp'].replace('Z', '+00:00'))
-                    if not latest or ts > latest:
-                        latest = ts
-        
-        return latest
-        
-    except Exception as e:
-        print(f"Error finding latest timestamp: {e}")
-        return None
-
 def load_categories():
     """Load categories from categories.json"""
     try:
@@ -153,264 +282,322 @@ def load_categories():
         return []
 
 def update_cache(new_data):
-    """Update cache with current chart data"""
-    ensure_cache_dir()
-    
-    # Generate unique temporary filenames
-    import uuid
-    temp_id = str(uuid.uuid4())
-    temp_chart_file = f"{CHART_DATA_FILE}.{temp_id}.tmp"
-    temp_update_file = f"{LAST_UPDATE_FILE}.{temp_id}.tmp"
-    
+    """Append new chart data to the segmented cache (older points are merged in)
+
+    Returns:
+        bool: True if the cache was updated
+    """
+    if replica:
+        print("Cache is a read-only replica of the shared backend, not updating it")
+        return False
+    # Hourly views are derived from the base series' hour marks
+    new_data = {calc_type: data for calc_type, data in new_data.items() if not calc_type.endswith('_1h')}
     try:
-        with cache_lock:  # Use lock for thread safety
-            # Load existing cache data
-            existing_data = {}
-            if os.path.exists(CHART_DATA_FILE):
-                try:
-                    with open(CHART_DATA_FILE, 'r') as f:
-                        existing_data = json.load(f)
-                except json.JSONDecodeError:
-                    print("Warning: Could not decode existing cache, starting fresh")
-                except Exception as e:
-                    print(f"Warning: Error reading cache file: {e}")
-            
-            # Create temporary merged data with deep merge
-            merged_data = {}
-            for calc_type in set(list(existing_data.keys()) + list(new_data.keys())):
-                merged_data[calc_type] = {}
-                
-                # Get all categories from both datasets
-                existing_categories = existing_data.get(calc_type, {})
-                new_categories = new_data.get(calc_type, {})
-                all_categories = set(list(existing_categories.keys()) + list(new_categories.keys()))
-                
-                for category in all_categories:
-                    # Get existing and new data points
-                    existing_points = existing_categories.get(category, [])
-                    new_points = new_categories.get(category, [])
-                    
-                    # Combine points and remove duplicates based on timestamp
-                    all_points = existing_points + new_points
-                    seen_timestamps = set()
-                    unique_points = []
-                    
-                    for point in all_points:
-                        ts = point['timestamp']
-                        if ts not in seen_timestamps:
-                            seen_timestamps.add(ts)
-                            unique_points.append(point)
-                    
-                    # Sort points by timestamp
-                    unique_points.sort(key=lambda x: x['timestamp'])
-                    merged_data[calc_type][category] = unique_points
-            
-            try:
-                # Write merged data to temporary file first
-                with open(temp_chart_file, 'w') as f:
-                    json.dump(merged_data, f)
-                
-                # Find the latest timestamp in new data only
-                latest_ts = find_latest_timestamp(new_data)
-                if not latest_ts:
-                    raise Exception("No valid timestamp found in new data")
-                
-                # Write timestamp to temporary file
-                with open(temp_update_file, 'w') as f:
-                    json.dump({
-                        'last_data_point': latest_ts.isoformat()
-                    }, f)
-                
-                # If everything succeeded, rename temp files to actual files
-                # Use different names to avoid conflicts
-                if os.path.exists(CHART_DATA_FILE):
-                    os.replace(CHART_DATA_FILE, f"{CHART_DATA_FILE}.old")
-                if os.path.exists(LAST_UPDATE_FILE):
-                    os.replace(LAST_UPDATE_FILE, f"{LAST_UPDATE_FILE}.old")
-                
-                os.replace(temp_chart_file, CHART_DATA_FILE)
-                os.replace(temp_update_file, LAST_UPDATE_FILE)
-                
-                # Clean up old files
-                if os.path.exists(f"{CHART_DATA_FILE}.old"):
-                    os.remove(f"{CHART_DATA_FILE}.old")
-                if os.path.exists(f"{LAST_UPDATE_FILE}.old"):
-                    os.remove(f"{LAST_UPDATE_FILE}.old")
-                
-                print(f"Cache updated with chart data up to: {latest_ts}")
-                
-            except Exception as e:
-                # Clean up temp files if they exist
-                for temp_file in [temp_chart_file, temp_update_file]:
-                    try:
-                        if os.path.exists(temp_file):
-                            os.remove(temp_file)
-                    except:
-                        pass
-                raise e
+        with cache_lock:
+            latest_ts = store.write(new_data)
+            if latest_ts is None:
+                raise Exception("No valid timestamp found in new data")
+        print(f"Cache updated with chart data up to: {format_timestamp(latest_ts)}")
+        publish_payloads()
+        return True
                 
     except Exception as e:
         print(f"Error updating cache: {e}")
         # Don't raise - cache errors shouldn't break the chart
+        return False
 
-def background_update_checker():
-    """Background thread to check for new SQL data and update cache"""
-    print("Starting background update checker...")
-    print("Monitoring SQL for new data...")
-    
+def announce_cache_update():
+    """Tell the web processes a new cache version is ready (they push it to open dashboards)"""
+    last_update = get_last_update_time()
+    if not last_update:
+        return
+    try:
+        with db_connection() as conn:
+            if not conn:
+                return
+            with conn.cursor() as cur:
+                publish_change(cur, CHART_CACHE, last_update)
+            conn.commit()
+    except Exception as e:
+        # Web processes still notice the new version on their fallback check
+        print(f"Error announcing cache update: {e}")
+
+def publish_payloads():
+    """Pre-render and compress the index page payloads from the current cache"""
+    if replica:
+        return
+    snapshot = chart_cache.get()
+    if snapshot is None or snapshot.charts[0] is None:
+        return
+    with cache_lock:
+        payload_store.publish(build_payloads(*snapshot.charts), cursor=snapshot.cursor)
+
+# Heartbeat and refresh metrics of the background thread, also written to WORKER_STATUS_FILE
+worker_status = {
+    'pid': os.getpid(),
+    'started_at': None,
+    'heartbeat': None,
+    'wake_reason': None,
+    'checks': 0,
+    'last_check': None,
+    'refreshes': 0,
+    'last_refresh': None,
+    'last_refresh_duration': None,
+    'failures': 0,
+    'last_error': None,
+    'last_data_point': None,
+    'last_compaction': None,
+    'cached_points': None
+}
+status_lock = threading.Lock()
+
+def update_worker_status(increment=None, **fields):
+    """Record status fields (and bump the `increment` counter), then write the status file atomically"""
+    with status_lock:
+        worker_status.update(fields, heartbeat=time.time())
+        if increment:
+            worker_status[increment] += 1
+        status = dict(worker_status)
+    try:
+        temp_path = f"{WORKER_STATUS_FILE}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(status, f, default=str)
+        os.replace(temp_path, WORKER_STATUS_FILE)
+        if backend is not None:
+            backend.put(cache_backend.WORKER_STATUS_KEY, json.dumps(status, default=str).encode('utf-8'))
+    except Exception as e:
+        print(f"Error writing worker status: {e}")
+
+def get_worker_status():
+    """This process's worker status"""
+    with status_lock:
+        return dict(worker_status)
+
+def read_worker_status():
+    """The worker's last written status (read from another process), or None"""
+    try:
+        if backend is not None:
+            raw = backend.get(cache_backend.WORKER_STATUS_KEY)
+            return json.loads(raw) if raw else None
+        with open(WORKER_STATUS_FILE) as f:
+            return json.load(f)
+    except Exception:
+        return None
+
+def next_scheduled_wake(now):
+    """Epoch seconds of the next expected CategoryStrength commit (aligned to the 10-minute cadence)"""
+    wake = now - now % REFRESH_CADENCE + REFRESH_DELAY
+    return wake if wake > now else wake + REFRESH_CADENCE
+
+def wait_for_wake(listener):
+    """Block until a CategoryStrength notification, the next scheduled batch or a stop request
+
+    Returns:
+        str: 'notification', 'schedule' or 'stop'
+    """
+    deadline = next_scheduled_wake(time.time())
+    last_heartbeat = time.time()
+    while not stop_event.is_set():
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return 'schedule'
+        if listener.wait(min(remaining, WAIT_SLICE)):
+            return 'notification'
+        if time.time() - last_heartbeat >= HEARTBEAT_INTERVAL:
+            update_worker_status()
+            last_heartbeat = time.time()
+    return 'stop'
+
+def refresh_cache_from_sql():
+    """Copy CategoryStrength rows newer than the cache into it
+
+    Returns:
+        bool: True if new data was cached
+    """
     # Import here to avoid circular imports
-    from dbhandler import get_all_strength_data, get_all_1h_strength_data
-    import json
+    from dbhandler import get_all_strength_data
+    
+    # Re-read the latest SQL timestamp (one index lookup per wake-up)
+    sql_time = refresh_latest_timestamp(debug=False)
+    if not sql_time:
+        return False
+    
+    # Get last cache update time
+    cache_time = get_last_update_time(debug=False)
+    if cache_time and sql_time <= cache_time:
+        return False
+    
+    print(f"\nNew data available in SQL")
+    print(f"SQL timestamp: {sql_time}")
+    print(f"Cache timestamp: {cache_time}")
     
     # Load categories
-    def load_categories():
+    categories = load_categories()
+    print(f"Loaded categories: {categories}")
+    
+    # Never fetch more than the retention window, even into an empty cache
+    since_time = sql_time - timedelta(hours=RETENTION_1H_HOURS)
+    if cache_time and cache_time > since_time:
+        since_time = cache_time
+    
+    # Get all 10-minute data in one query; the hourly views are derived from it
+    calc_types = ['top_5', 'top_10', 'top_15', 'top_20', 'top_100_mc', 'top_200_mc']
+    data_10min = get_all_strength_data(categories, calc_types, since_time)
+    if not data_10min:
+        raise Exception("Failed to get 10min data")
+    new_data = {calc_type: data_10min.get(calc_type, {}) for calc_type in calc_types}
+    
+    # Only update cache if ALL data was collected successfully
+    print("Updating cache with new data types:", list(new_data.keys()))
+    if not update_cache(new_data):
+        raise Exception("Failed to write the cache")
+    print("Cache updated successfully")
+    return True
+
+def publish_to_backend():
+    """Publish the current segments and payloads to the shared backend, if one is configured"""
+    if backend is None:
+        return
+    try:
+        manifest = store.read_manifest()
+        version = f"{manifest['generation']}-{manifest.get('last_data_point_ts')}"
+        size = cache_backend.publish_bundle(backend, CACHE_DIR, version)
+        print(f"Published cache version {version} to the shared backend ({size} bytes)")
+    except Exception as e:
+        print(f"Error publishing cache to the shared backend: {e}")
+
+def sync_replica(last_version=None):
+    """Install the backend's bundle if its version differs from last_version
+
+    Returns:
+        The installed (or unchanged) version
+    """
+    version = cache_backend.read_version(backend)
+    if version is None or version == last_version:
+        return last_version
+    if cache_backend.install_bundle(backend, CACHE_DIR):
+        print(f"Synced chart cache version {version} from the shared backend")
+        replica_updated.set()
+        return version
+    return last_version
+
+def replica_sync_loop(version):
+    """Background thread: follow the worker's published versions"""
+    listener = ChangeListener(lambda: psycopg2.connect(DB_CONNECTION), [CHART_CACHE])
+    while not stop_event.is_set():
+        listener.wait(REPLICA_SYNC_INTERVAL)
         try:
-            with open('static/data/categories.json') as f:
-                return json.load(f)['categories']
+            version = sync_replica(version)
         except Exception as e:
-            print(f"Error loading categories: {e}")
-            return []
+            print(f"Error syncing chart cache from the shared backend: {e}")
+    listener.close()
+
+def start_replica_sync():
+    """Mirror the shared backend into CACHE_DIR/replica for this web process
+
+    The first sync runs before returning so the process starts with data.
+    """
+    global replica
+    replica = True
+    set_cache_dir(os.path.join(CACHE_DIR, 'replica'))
+    ensure_cache_dir()
+    try:
+        version = sync_replica()
+    except Exception as e:
+        print(f"Error syncing chart cache from the shared backend: {e}")
+        version = None
+    threading.Thread(target=replica_sync_loop, args=(version,), name='cache-replica', daemon=True).start()
+
+def compact_cache():
+    """Apply the retention policy to the segment store
+
+    Returns:
+        dict: Compaction stats, or None if there is no cache
+    """
+    last_update = get_last_update_time()
+    if not last_update:
+        return None
+    full_since = to_epoch(last_update - timedelta(hours=RETENTION_10MIN_HOURS))
+    marks_since = to_epoch(last_update - timedelta(hours=RETENTION_1H_HOURS))
+    with cache_lock:
+        stats = store.compact(full_since, marks_since)
+    manifest = store.read_manifest()
+    stats['cached_points'] = sum(entry['count'] for entry in manifest['series'].values())
+    if stats['removed_points']:
+        print(f"Compacted chart cache: removed {stats['removed_points']} points, "
+              f"{stats['cached_points']} left in {len(manifest['series'])} series")
+    return stats
+
+def background_update_checker():
+    """Background thread: refresh the cache on each CategoryStrength notification,
+    or at the next 10-minute batch if a notification is missed"""
+    print("Starting background update checker...")
+    print("Monitoring SQL for new data...")
     
-    while should_continue:
+    # strength.py notifies as soon as a new CategoryStrength batch is committed
+    listener = ChangeListener(lambda: psycopg2.connect(DB_CONNECTION), [CATEGORY_STRENGTH])
+    update_worker_status(started_at=time.time(), wake_reason='startup')
+    publish_to_backend()
+    
+    wake_reason = 'startup'
+    last_compaction = 0
+    while not stop_event.is_set():
+        start_time = time.time()
         try:
-            # Get latest SQL timestamp
-            sql_time = get_latest_timestamp(debug=False)
-            if not sql_time:
-                time.sleep(CHECK_INTERVAL)
-                continue
-            
-            # Get last cache update time
-            cache_time = get_last_update_time(debug=False)
-            
-            # If we have new data, update the cache
-            if not cache_time or sql_time > cache_time:
-                print(f"\nNew data available in SQL")
-                print(f"SQL timestamp: {sql_time}")
-                print(f"Cache timestamp: {cache_time}")
-                
-                # Load categories
-                categories = load_categories()
-                print(f"Loaded categories: {categories}")
-                
-                # Collect ALL new data before any cache updates
-                new_data = {}
-                try:
-                    # Get data for all calculation types
-                    calc_types = ['top_5', 'top_10', 'top_15', 'top_20', 'top_100_mc', 'top_200_mc']
-                    
-                    # Get all 10-minute data in one query
-                    data_10min = get_all_strength_data(categories, calc_types, cache_time)
-                    if not data_10min:
-                        raise Exception("Failed to get 10min data")
-                        
-                    # Get all 1-hour data in one query
-                    data_1h = get_all_1h_strength_data(categories, calc_types, cache_time)
-                    if not data_1h:
-                        raise Exception("Failed to get 1h data")
-                    
-                    # Organize data into the expected format
-                    for calc_type in calc_types:
-                        new_data[calc_type] = data_10min.get(calc_type, {})
-                        new_data[f"{calc_type}_1h"] = data_1h.get(calc_type, {})
-                    
-                    # Only update cache if ALL data was collected successfully
-                    print("Updating cache with new data types:", list(new_data.keys()))
-                    update_cache(new_data)
-                    print("Cache updated successfully")
-                    
-                except Exception as e:
-                    print(f"Failed to collect all chart data: {e}")
-            
-            time.sleep(CHECK_INTERVAL)
-            
+            if refresh_cache_from_sql():
+                publish_to_backend()
+                announce_cache_update()
+                update_worker_status(
+                    increment='refreshes',
+                    last_refresh=time.time(),
+                    last_refresh_duration=round(time.time() - start_time, 3),
+                    last_data_point=get_last_update_time()
+                )
         except Exception as e:
-            print(f"Error checking SQL: {e}")
-            time.sleep(CHECK_INTERVAL)
+            print(f"Error refreshing chart cache: {e}")
+            update_worker_status(increment='failures', last_error=f"{type(e).__name__}: {e}")
+        
+        if time.time() - last_compaction >= COMPACT_INTERVAL:
+            try:
+                stats = compact_cache()
+                last_compaction = time.time()
+                if stats and (stats['removed_points'] or stats['dropped']):
+                    publish_to_backend()
+                if stats:
+                    update_worker_status(last_compaction=last_compaction, cached_points=stats['cached_points'])
+            except Exception as e:
+                print(f"Error compacting chart cache: {e}")
+        update_worker_status(increment='checks', last_check=time.time(), wake_reason=wake_reason)
+        
+        wake_reason = wait_for_wake(listener)
+    
+    listener.close()
+    print("Background update checker stopped")
 
 def start_background_checker():
-    """Start the background checking thread"""
-    global should_continue
-    should_continue = True
-    thread = threading.Thread(target=background_update_checker)
+    """Start the background checking thread
+
+    Returns:
+        threading.Thread: The started thread
+    """
+    stop_event.clear()
+    thread = threading.Thread(target=background_update_checker, name='cache-refresh')
     thread.daemon = True  # Thread will exit when main program exits
     thread.start()
+    return thread
 
 def stop_background_checker():
-    """Stop the background checking thread"""
-    global should_continue
-    should_continue = False
+    """Ask the background checking thread to stop; it exits within WAIT_SLICE seconds"""
+    stop_event.set()
 
 def get_cached_data_for_charts():
-    """Get both 24h and 48h data in a single cache read.
+    """Get both the 24h and 48h views from the resident cache.
     For 1h data, only includes points at the start of each hour.
     
     Returns:
         tuple: (data_10min, data_1h) filtered chart data or (None, None) if error
     """
-    try:
-        start_time = time.time()
-        
-        # Read cache only ONCE
-        read_start = time.time()
-        data = get_cached_data()
-        print(f"Reading cache took {time.time() - read_start:.2f}s")
-        
-        if not data:
-            return None, None
-            
-        # Get current time from last_update.json
-        time_start = time.time()
-        latest_time = get_last_update_time()
-        print(f"Getting last update time took {time.time() - time_start:.2f}s")
-        
-        if not latest_time:
-            return None, None
-            
-        # Calculate cutoff times
-        from datetime import timedelta
-        cutoff_24h = latest_time - timedelta(hours=24)
-        cutoff_48h = latest_time - timedelta(hours=48)
-        
-        # Filter data for both windows at once
-        filter_start = time.time()
-        data_10min = {}  # For 10-minute charts
-        data_1h = {}     # For 1-hour charts
-        
-        for calc_type, categories in data.items():
-            # Skip _1h types in 10min data
-            if not calc_type.endswith('_1h'):
-                data_10min[calc_type] = {}
-                for category, points in categories.items():
-                    points_24h = []
-                    for point in points:
-                        point_time = datetime.fromisoformat(point['timestamp'].replace('Z', '+00:00'))
-                        if point_time >= cutoff_24h:
-                            points_24h.append(point)
-                    if points_24h:
-                        data_10min[calc_type][category] = points_24h
-            
-            # Process 1h data separately
-            base_type = calc_type.replace('_1h', '')
-            if base_type in data:  # If we have the base type
-                data_1h[base_type] = {}
-                for category, points in data[base_type].items():
-                    points_48h = []
-                    for point in points:
-                        point_time = datetime.fromisoformat(point['timestamp'].replace('Z', '+00:00'))
-                        # Only include points at the start of each hour
-                        if point_time >= cutoff_48h and point_time.minute == 0:
-                            points_48h.append(point)
-                    if points_48h:
-                        data_1h[base_type][category] = points_48h
-        
-        print(f"Filtering both windows took {time.time() - filter_start:.2f}s")
-        print(f"Total cache operation took {time.time() - start_time:.2f}s")
-        print(f"Original data size: {len(str(data))} bytes")
-        print(f"10min data size: {len(str(data_10min))} bytes")
-        print(f"1h data size: {len(str(data_1h))} bytes")
-        
-        return data_10min, data_1h
-        
-    except Exception as e:
-        print(f"Error getting chart data: {e}")
-        return None, None
\ No newline at end of file
+    snapshot = chart_cache.get()
+    if snapshot is None:
+        return None, None
+    return snapshot.charts
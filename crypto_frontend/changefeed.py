@@ -0,0 +1,95 @@
+import select
+import time
+from datetime import datetime
+from psycopg2 import sql
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+# NOTIFY channels published by the crypto_dashboard writers (see its changefeed.py).
+# The payload is the ISO timestamp (or date) of the batch that was just committed.
+PRICES = 'prices_updated'
+TOKEN_FILTER = 'token_filter_updated'
+CATEGORY_STRENGTH = 'category_strength_updated'
+TOKEN_STRENGTH = 'token_strength_updated'
+DAILY_TOKEN_RANKS = 'daily_token_ranks_updated'
+CATEGORY_RANKS = 'category_ranks_updated'
+# Published by worker.py once a chart cache update is committed; the payload is
+# the timestamp of the newest cached point
+CHART_CACHE = 'chart_cache_updated'
+
+RECONNECT_DELAY = 5  # Seconds to back off after losing the LISTEN connection
+
+
+def publish_change(cur, channel, timestamp):
+    """Queue a NOTIFY on the current transaction; it is delivered on commit
+
+    Args:
+        cur: Cursor of the writing transaction
+        channel (str): One of the channel constants above
+        timestamp (datetime or date): Timestamp of the committed batch
+    """
+    cur.execute("SELECT pg_notify(%s, %s)", (channel, timestamp.isoformat()))
+
+
+def parse_payload(payload):
+    """Parse a notification payload back into a datetime, or None if it is not one"""
+    try:
+        return datetime.fromisoformat(payload)
+    except (TypeError, ValueError):
+        return None
+
+
+class ChangeListener:
+    """Dedicated LISTEN connection that consumers block on instead of polling
+
+    Args:
+        connect (callable): Returns a new psycopg2 connection
+        channels (list): Channel names to LISTEN on
+    """
+    def __init__(self, connect, channels):
+        self.connect = connect
+        self.channels = list(channels)
+        self.conn = None
+
+    def _ensure_connection(self):
+        if self.conn is not None and not self.conn.closed:
+            return
+        self.conn = self.connect()
+        self.conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+        cur = self.conn.cursor()
+        for channel in self.channels:
+            cur.execute(sql.SQL("LISTEN {}").format(sql.Identifier(channel)))
+        cur.close()
+        print(f"Listening for changes on: {', '.join(self.channels)}")
+
+    def wait(self, timeout):
+        """Block until a notification arrives or the timeout expires
+
+        Callers should re-check the database after every return, whether or not
+        anything was received - the timeout doubles as the slow fallback poll.
+
+        Returns:
+            list: (channel, payload) tuples, empty on timeout or connection error
+        """
+        try:
+            self._ensure_connection()
+            if not self.conn.notifies:
+                readable, _, _ = select.select([self.conn], [], [], timeout)
+                if not readable:
+                    return []
+            self.conn.poll()
+            events = [(n.channel, n.payload) for n in self.conn.notifies]
+            del self.conn.notifies[:]
+            return events
+        except Exception as e:
+            print(f"Change feed connection lost: {e}")
+            self.close()
+            time.sleep(min(timeout, RECONNECT_DELAY))
+            return []
+
+    def close(self):
+        if self.conn is not None:
+            try:
+                self.conn.close()
+            except Exception:
+                pass
+            self.conn = None
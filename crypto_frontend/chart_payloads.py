@@ -0,0 +1,139 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+
+try:
+    import brotli
+except ImportError:  # In requirements.txt; without it only gzip is published
+    brotli = None
+
+MANIFEST_FILE = 'manifest.json'
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 11
+
+
+class Payload:
+    """One pre-rendered response body in every published encoding"""
+    def __init__(self, etag, raw, encoded, cursor=None):
+        self.etag = etag
+        self.raw = raw            # JSON bytes
+        self.encoded = encoded    # {'gzip': bytes, 'br': bytes}
+        self.cursor = cursor      # Update cursor (epoch seconds) of the data it was built from
+
+
+def build_payloads(data_10min, data_1h):
+    """The chart payloads the index page uses, keyed by name
+
+    'index' is the whole preloaded data set (every calc type and its _1h view);
+    '<calc_type>' is its 24h of 10-minute points and '<calc_type>_1h' its 48h of
+    hourly points.
+    """
+    payloads = {}
+    for calc_type, categories in data_10min.items():
+        payloads[calc_type] = categories
+    for calc_type, categories in data_1h.items():
+        payloads[f"{calc_type}_1h"] = categories
+    payloads['index'] = dict(payloads)
+    return payloads
+
+
+class PayloadStore:
+    """Pre-rendered, pre-compressed chart payloads shared between the worker and the web app
+
+    The worker publishes each payload as content-addressed .json/.json.gz/.json.br
+    files and then atomically replaces manifest.json. The web app keeps the bytes
+    of the current manifest version in memory (one stat per request to notice a
+    new one), so serving a payload needs no serialization or compression.
+    """
+    def __init__(self, root):
+        self.root = root
+        self.snapshot = None  # (manifest version, {name: Payload})
+        self.load_lock = threading.Lock()
+
+    def manifest_path(self):
+        return os.path.join(self.root, MANIFEST_FILE)
+
+    def _write_file(self, filename, data):
+        path = os.path.join(self.root, filename)
+        if os.path.exists(path):  # Same content as an earlier publish
+            return
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+    def publish(self, payloads, cursor=None):
+        """Render, compress and publish {name: JSON-serializable data}"""
+        os.makedirs(self.root, exist_ok=True)
+        start_time = time.time()
+        manifest = {}
+        for name, data in payloads.items():
+            raw = json.dumps(data).encode('utf-8')
+            etag = hashlib.sha1(raw).hexdigest()[:20]
+            files = {'json': f"{name}.{etag}.json", 'gzip': f"{name}.{etag}.json.gz"}
+            self._write_file(files['json'], raw)
+            self._write_file(files['gzip'], gzip.compress(raw, compresslevel=GZIP_LEVEL, mtime=0))
+            if brotli is not None:
+                files['br'] = f"{name}.{etag}.json.br"
+                self._write_file(files['br'], brotli.compress(raw, quality=BROTLI_QUALITY))
+            manifest[name] = {'etag': etag, 'size': len(raw), 'files': files}
+
+        temp_path = f"{self.manifest_path()}.{os.getpid()}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump({'published_at': time.time(), 'cursor': cursor, 'payloads': manifest}, f)
+        os.replace(temp_path, self.manifest_path())
+
+        # Drop blobs the new manifest no longer references
+        current = {filename for entry in manifest.values() for filename in entry['files'].values()}
+        for filename in os.listdir(self.root):
+            if filename != MANIFEST_FILE and filename not in current and not filename.endswith('.tmp'):
+                try:
+                    os.remove(os.path.join(self.root, filename))
+                except OSError:
+                    pass
+        print(f"Published {len(manifest)} chart payloads in {time.time() - start_time:.2f}s")
+
+    def _manifest_version(self):
+        try:
+            st = os.stat(self.manifest_path())
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _load(self):
+        with open(self.manifest_path()) as f:
+            manifest = json.load(f)
+        payloads = {}
+        for name, entry in manifest['payloads'].items():
+            blobs = {}
+            for encoding, filename in entry['files'].items():
+                with open(os.path.join(self.root, filename), 'rb') as f:
+                    blobs[encoding] = f.read()
+            payloads[name] = Payload(entry['etag'], blobs.pop('json'), blobs, manifest.get('cursor'))
+        return payloads
+
+    def get(self, name):
+        """The current Payload called name, or None if nothing has been published"""
+        version = self._manifest_version()
+        snapshot = self.snapshot
+        if version is None:
+            return None
+        if snapshot is None or snapshot[0] != version:
+            if not self.load_lock.acquire(blocking=snapshot is None):
+                return snapshot[1].get(name)
+            try:
+                if self.snapshot is None or self.snapshot[0] != version:
+                    # Stat before reading: a publish in between only causes another reload
+                    self.snapshot = (version, self._load())
+                snapshot = self.snapshot
+            except (OSError, ValueError) as e:
+                # A publish replaced the files while we read them; retry on the next request
+                print(f"Error loading chart payloads: {e}")
+                if snapshot is None:
+                    return None
+            finally:
+                self.load_lock.release()
+        return snapshot[1].get(name)
@@ -1,8 +1,12 @@
 import psycopg2
 from psycopg2.extras import RealDictCursor
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
 from datetime import datetime, timedelta
 import pytz
 import os
+import threading
+import time
+from contextlib import contextmanager
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -14,14 +18,184 @@ DB_CONNECTION = os.environ.get('DATABASE_URL')
 if not DB_CONNECTION:
     raise Exception("DATABASE_URL environment variable is not set")
 
-def get_db_connection():
-    """Create a database connection"""
-    try:
-        conn = psycopg2.connect(DB_CONNECTION)
+# Connection pool settings
+POOL_MIN_SIZE = int(os.environ.get('DB_POOL_MIN_SIZE', 1))    # Connections opened by init_pool()
+POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', 10))   # Upper bound on open connections
+POOL_TIMEOUT = 10          # Seconds to wait for a free connection before giving up
+POOL_MAX_IDLE = 300        # Close connections that sat idle longer than this
+POOL_MAX_LIFETIME = 3600   # Recycle connections older than this
+POOL_PING_AFTER = 30       # Check a connection with SELECT 1 if it was idle longer than this
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of psycopg2 connections
+
+    Checked-in connections are reused most-recently-used first, so the rest age out
+    and get closed after POOL_MAX_IDLE. A connection that raised a connection-level
+    error is discarded instead of being returned to the pool.
+    """
+    def __init__(self, dsn, max_size=POOL_MAX_SIZE, timeout=POOL_TIMEOUT,
+                 max_idle=POOL_MAX_IDLE, max_lifetime=POOL_MAX_LIFETIME):
+        self.dsn = dsn
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.slots = threading.BoundedSemaphore(max_size)
+        self.lock = threading.Lock()
+        self.idle = []  # (conn, created_at, last_used), most recently used last
+        self.created = {}  # id(conn) -> created_at for checked-out connections
+        self.stats = {
+            'checkouts': 0, 'timeouts': 0, 'connects': 0, 'recycled': 0, 'discarded': 0,
+            'in_use': 0, 'wait_total': 0.0, 'wait_max': 0.0
+        }
+
+    def _close(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _connect(self):
+        conn = psycopg2.connect(self.dsn)
+        with self.lock:
+            self.stats['connects'] += 1
+        return conn, time.time()
+
+    def _usable(self, conn, created_at, last_used, now):
+        if conn.closed or now - created_at > self.max_lifetime or now - last_used > self.max_idle:
+            return False
+        if now - last_used > POOL_PING_AFTER:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1")
+                conn.rollback()
+            except Exception:
+                return False
+        return True
+
+    def acquire(self):
+        """Check out a connection, waiting up to `timeout` seconds for a free slot"""
+        wait_start = time.time()
+        if not self.slots.acquire(timeout=self.timeout):
+            with self.lock:
+                self.stats['timeouts'] += 1
+            raise TimeoutError(f"No database connection available after {self.timeout}s")
+        waited = time.time() - wait_start
+
+        try:
+            conn = None
+            while conn is None:
+                with self.lock:
+                    entry = self.idle.pop() if self.idle else None
+                if entry is None:
+                    conn, created_at = self._connect()
+                elif self._usable(*entry, time.time()):
+                    conn, created_at = entry[0], entry[1]
+                else:
+                    self._close(entry[0])
+                    with self.lock:
+                        self.stats['recycled'] += 1
+        except Exception:
+            self.slots.release()
+            raise
+
+        with self.lock:
+            self.created[id(conn)] = created_at
+            self.stats['checkouts'] += 1
+            self.stats['in_use'] += 1
+            self.stats['wait_total'] += waited
+            self.stats['wait_max'] = max(self.stats['wait_max'], waited)
         return conn
+
+    def release(self, conn, discard=False):
+        """Return a connection to the pool, or close it if it is broken"""
+        with self.lock:
+            created_at = self.created.pop(id(conn), time.time())
+            self.stats['in_use'] -= 1
+        try:
+            if not discard and not conn.closed:
+                if conn.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+                with self.lock:
+                    self.idle.append((conn, created_at, time.time()))
+            else:
+                self._close(conn)
+                with self.lock:
+                    self.stats['discarded'] += 1
+        except Exception:
+            self._close(conn)
+            with self.lock:
+                self.stats['discarded'] += 1
+        finally:
+            self.slots.release()
+
+    def prune(self):
+        """Close idle connections past their idle or lifetime limit"""
+        now = time.time()
+        with self.lock:
+            keep = [e for e in self.idle if now - e[2] <= self.max_idle and now - e[1] <= self.max_lifetime]
+            expired = [e for e in self.idle if e not in keep]
+            self.idle = keep
+            self.stats['recycled'] += len(expired)
+        for conn, _, _ in expired:
+            self._close(conn)
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats['idle'] = len(self.idle)
+        stats['max_size'] = self.max_size
+        stats['wait_avg'] = stats['wait_total'] / stats['checkouts'] if stats['checkouts'] else 0.0
+        return stats
+
+    def close_all(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for conn, _, _ in idle:
+            self._close(conn)
+
+pool = ConnectionPool(DB_CONNECTION)
+
+@contextmanager
+def db_connection():
+    """Check out a pooled connection for the duration of a with-block
+
+    Yields None if no connection could be opened, so callers keep their
+    `if not conn:` fallbacks. Uncommitted work is rolled back on check-in.
+    """
+    try:
+        conn = pool.acquire()
     except Exception as e:
         print(f"Error connecting to database: {e}")
-        return None
+        yield None
+        return
+
+    discard = False
+    try:
+        yield conn
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        discard = True
+        raise
+    finally:
+        pool.release(conn, discard=discard)
+
+def init_pool():
+    """Open POOL_MIN_SIZE connections up front so the first requests don't pay for them"""
+    conns = []
+    try:
+        for _ in range(POOL_MIN_SIZE):
+            conns.append(pool.acquire())
+        print(f"Database pool ready with {len(conns)} connection(s)")
+    except Exception as e:
+        print(f"Error connecting to database: {e}")
+    finally:
+        for conn in conns:
+            pool.release(conn)
+
+def get_pool_stats():
+    """Pool usage and wait metrics"""
+    pool.prune()
+    return pool.get_stats()
 
 def get_strength_data(categories, calculation_type, hours=24, since_time=None):
     """
@@ -37,57 +211,54 @@ def get_strength_data(categories, calculation_type, hours=24, since_time=None):
         dict: Dictionary with categories as keys and lists of (timestamp, strength) tuples as values
     """
     try:
-        conn = get_db_connection()
-        if not conn:
-            return None
-        
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        
-        # Build the base query
-        query = """
-            SELECT "TIMESTAMP", category, strength_ratio 
-            FROM public."CategoryStrength"
-            WHERE category = ANY(%s)
-            AND calculation_type = %s
-        """
-        
-        params = [categories, calculation_type]
-        
-        # Add time filtering based on parameters
-        if since_time is not None:
-            # Fetch data since the last update
-            query += ' AND "TIMESTAMP" > %s'
-            params.append(since_time)
-        elif hours is not None:
-            # Fetch last N hours of data
-            end_time = datetime.now(pytz.UTC)
-            start_time = end_time - timedelta(hours=hours)
-            query += ' AND "TIMESTAMP" BETWEEN %s AND %s'
-            params.extend([start_time, end_time])
-        # If both are None, fetch all historical data
-        
-        query += ' ORDER BY "TIMESTAMP" ASC'
-        
-        print(f"Executing query with params: {params}")
-        cur.execute(query, params)
-        rows = cur.fetchall()
-        
-        # Organize data by category
-        result = {category: [] for category in categories}
-        for row in rows:
-            result[row['category']].append({
-                'timestamp': row['TIMESTAMP'].isoformat(),
-                'strength': float(row['strength_ratio']) if row['strength_ratio'] is not None else None
-            })
+        with db_connection() as conn:
+            if not conn:
+                return None
+        
+            cur = conn.cursor(cursor_factory=RealDictCursor)
+        
+            # Build the base query
+            query = """
+                SELECT "TIMESTAMP", category, strength_ratio 
+                FROM public."CategoryStrength"
+                WHERE category = ANY(%s)
+                AND calculation_type = %s
+            """
+        
+            params = [categories, calculation_type]
+        
+            # Add time filtering based on parameters
+            if since_time is not None:
+                # Fetch data since the last update
+                query += ' AND "TIMESTAMP" > %s'
+                params.append(since_time)
+            elif hours is not None:
+                # Fetch last N hours of data
+                end_time = datetime.now(pytz.UTC)
+                start_time = end_time - timedelta(hours=hours)
+                query += ' AND "TIMESTAMP" BETWEEN %s AND %s'
+                params.extend([start_time, end_time])
+            # If both are None, fetch all historical data
+        
+            query += ' ORDER BY "TIMESTAMP" ASC'
+        
+            print(f"Executing query with params: {params}")
+            cur.execute(query, params)
+            rows = cur.fetchall()
+        
+            # Organize data by category
+            result = {category: [] for category in categories}
+            for row in rows:
+                result[row['category']].append({
+                    'timestamp': row['TIMESTAMP'].isoformat(),
+                    'strength': float(row['strength_ratio']) if row['strength_ratio'] is not None else None
+                })
             
-        cur.close()
-        conn.close()
-        return result
+            cur.close()
+            return result
         
     except Exception as e:
         print(f"Error fetching strength data: {e}")
-        if conn:
-            conn.close()
         return None
 
 def get_1h_strength_data(categories, calculation_type, hours=24, since_time=None):
@@ -104,68 +275,159 @@ def get_1h_strength_data(categories, calculation_type, hours=24, since_time=None
         dict: Dictionary with categories as keys and lists of (timestamp, strength) tuples as values
     """
     try:
-        conn = get_db_connection()
-        if not conn:
-            return None
-        
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        
-        # Build the base query with 1-hour interval filter
-        query = """
-            SELECT "TIMESTAMP", category, strength_ratio 
-            FROM public."CategoryStrength"
-            WHERE category = ANY(%s)
-            AND calculation_type = %s
-            AND EXTRACT(MINUTE FROM "TIMESTAMP") = 0  -- Only get data points at the start of each hour
-        """
-        
-        params = [categories, calculation_type]
-        
-        # Add time filtering based on parameters
-        if since_time is not None:
-            query += ' AND "TIMESTAMP" > %s'
-            params.append(since_time)
-        elif hours is not None:
-            end_time = datetime.now(pytz.UTC)
-            start_time = end_time - timedelta(hours=hours)
-            query += ' AND "TIMESTAMP" BETWEEN %s AND %s'
-            params.extend([start_time, end_time])
-        
-        query += ' ORDER BY "TIMESTAMP" ASC'
-        
-        print(f"Executing 1h query with params: {params}")
-        cur.execute(query, params)
-        rows = cur.fetchall()
-        
-        # Organize data by category
-        result = {category: [] for category in categories}
-        for row in rows:
-            result[row['category']].append({
-                'timestamp': row['TIMESTAMP'].isoformat(),
-                'strength': float(row['strength_ratio']) if row['strength_ratio'] is not None else None
-            })
+        hour_mark = get_hour_mark_predicate()
+        with db_connection() as conn:
+            if not conn:
+                return None
+        
+            cur = conn.cursor(cursor_factory=RealDictCursor)
+        
+            # Build the base query with 1-hour interval filter (only points at the start of each hour)
+            query = f"""
+                SELECT "TIMESTAMP", category, strength_ratio 
+                FROM public."CategoryStrength"
+                WHERE category = ANY(%s)
+                AND calculation_type = %s
+                AND {hour_mark}
+            """
+        
+            params = [categories, calculation_type]
+        
+            # Add time filtering based on parameters
+            if since_time is not None:
+                query += ' AND "TIMESTAMP" > %s'
+                params.append(since_time)
+            elif hours is not None:
+                end_time = datetime.now(pytz.UTC)
+                start_time = end_time - timedelta(hours=hours)
+                query += ' AND "TIMESTAMP" BETWEEN %s AND %s'
+                params.extend([start_time, end_time])
+        
+            query += ' ORDER BY "TIMESTAMP" ASC'
+        
+            print(f"Executing 1h query with params: {params}")
+            cur.execute(query, params)
+            rows = cur.fetchall()
+        
+            # Organize data by category
+            result = {category: [] for category in categories}
+            for row in rows:
+                result[row['category']].append({
+                    'timestamp': row['TIMESTAMP'].isoformat(),
+                    'strength': float(row['strength_ratio']) if row['strength_ratio'] is not None else None
+                })
             
-        cur.close()
-        conn.close()
-        return result
+            cur.close()
+            return result
         
     except Exception as e:
         print(f"Error fetching 1h strength data: {e}")
-        if conn:
-            conn.close()
         return None
 
-def get_latest_timestamp(debug=False):
-    """Get the most recent timestamp in the database"""
+# Hourly points are read through a stored is_hour_mark column and a partial index
+# on it; EXTRACT(MINUTE ...) in a WHERE clause can't use an ordinary index.
+HOUR_MARK_COLUMN = 'is_hour_mark'
+HOUR_MARK_INDEX = 'CategoryStrength_hour_mark_idx'
+HOUR_MARK_FALLBACK = 'EXTRACT(MINUTE FROM "TIMESTAMP") = 0'
+hour_mark_predicate_cache = None
+
+def ensure_hour_mark_index():
+    """Add the generated is_hour_mark column and its partial index if they are missing
+
+    Adding a STORED generated column rewrites the table once, so this is run at
+    worker startup rather than per request. For timestamptz the minute is taken in
+    UTC, which keeps the expression immutable (the minute is the same in SGT).
+
+    Returns:
+        bool: True if the column and index exist afterwards
+    """
+    global hour_mark_predicate_cache
     try:
-        conn = get_db_connection()
-        if not conn:
-            print("Failed to get database connection")
-            return None
+        with db_connection() as conn:
+            if not conn:
+                return False
+            cur = conn.cursor()
+            cur.execute("""
+                SELECT column_name, data_type
+                FROM information_schema.columns 
+                WHERE table_schema = 'public' 
+                AND table_name = 'CategoryStrength'
+                AND column_name IN ('TIMESTAMP', %s)
+            """, (HOUR_MARK_COLUMN,))
+            columns = dict(cur.fetchall())
+            if 'TIMESTAMP' not in columns:
+                print("ERROR: TIMESTAMP column not found in CategoryStrength table!")
+                return False
+            
+            if HOUR_MARK_COLUMN not in columns:
+                source = '"TIMESTAMP"'
+                if columns['TIMESTAMP'] == 'timestamp with time zone':
+                    source = '("TIMESTAMP" AT TIME ZONE \'UTC\')'
+                print(f"Adding {HOUR_MARK_COLUMN} column to CategoryStrength...")
+                cur.execute(f"""
+                    ALTER TABLE public."CategoryStrength"
+                    ADD COLUMN IF NOT EXISTS {HOUR_MARK_COLUMN} boolean
+                    GENERATED ALWAYS AS (EXTRACT(MINUTE FROM {source}) = 0) STORED
+                """)
             
-        cur = conn.cursor()
+            cur.execute(f"""
+                CREATE INDEX IF NOT EXISTS "{HOUR_MARK_INDEX}"
+                ON public."CategoryStrength" (calculation_type, category, "TIMESTAMP")
+                WHERE {HOUR_MARK_COLUMN}
+            """)
+            conn.commit()
+            cur.close()
+        
+        hour_mark_predicate_cache = HOUR_MARK_COLUMN
+        print("Hourly index ready")
+        return True
         
-        # First verify the column exists and its type
+    except Exception as e:
+        print(f"Error creating hourly index: {e}")
+        return False
+
+def get_hour_mark_predicate():
+    """SQL predicate selecting hourly points: the indexed column if it exists,
+    otherwise the original EXTRACT(MINUTE ...) filter"""
+    global hour_mark_predicate_cache
+    if hour_mark_predicate_cache is not None:
+        return hour_mark_predicate_cache
+    try:
+        with db_connection() as conn:
+            if not conn:
+                return HOUR_MARK_FALLBACK
+            cur = conn.cursor()
+            cur.execute("""
+                SELECT 1
+                FROM information_schema.columns 
+                WHERE table_schema = 'public' 
+                AND table_name = 'CategoryStrength'
+                AND column_name = %s
+            """, (HOUR_MARK_COLUMN,))
+            found = cur.fetchone() is not None
+            cur.close()
+        hour_mark_predicate_cache = HOUR_MARK_COLUMN if found else HOUR_MARK_FALLBACK
+        if not found:
+            print(f"{HOUR_MARK_COLUMN} column not found - using EXTRACT(MINUTE) filter")
+    except Exception as e:
+        print(f"Error checking for {HOUR_MARK_COLUMN} column: {e}")
+        return HOUR_MARK_FALLBACK
+    return hour_mark_predicate_cache
+
+class LatestTimestampTracker:
+    """In-process copy of the newest CategoryStrength timestamp
+
+    The TIMESTAMP column is checked in information_schema until it is found
+    once. After that a refresh is a single ORDER BY ... DESC LIMIT 1 lookup,
+    which Postgres answers from the index, and reads are just an attribute load.
+    Call refresh() when the change feed reports a new batch.
+    """
+    def __init__(self):
+        self.latest = None
+        self.schema_ok = False  # Set once the column has been found
+        self.lock = threading.Lock()
+
+    def _check_schema(self, cur, debug=False):
         cur.execute("""
             SELECT column_name, data_type, datetime_precision
             FROM information_schema.columns 
@@ -176,31 +438,68 @@ def get_latest_timestamp(debug=False):
         column_info = cur.fetchone()
         if not column_info:
             print("ERROR: TIMESTAMP column not found in CategoryStrength table!")
-            return None
+            return False
         if debug:
             print(f"Found TIMESTAMP column: type={column_info[1]}, precision={column_info[2]}")
-        
-        # Get the latest timestamp
-        query = 'SELECT MAX("TIMESTAMP") FROM public."CategoryStrength"'
-        if debug:
-            print(f"Executing query: {query}")
-        cur.execute(query)
-        latest = cur.fetchone()[0]
-        
-        if latest is None:
-            print("WARNING: No timestamps found in database!")
-        elif debug:
-            print(f"Latest SQL timestamp (naive): {latest}")
+        return True
+
+    def refresh(self, debug=False):
+        """Re-read the newest timestamp from the database
+
+        Returns:
+            datetime: The latest timestamp, or the last known one if the lookup failed
+        """
+        try:
+            with db_connection() as conn:
+                if not conn:
+                    print("Failed to get database connection")
+                    return self.latest
+                
+                cur = conn.cursor()
+                if not self.schema_ok:
+                    # Checked until it passes once, then never again
+                    self.schema_ok = self._check_schema(cur, debug)
+                if not self.schema_ok:
+                    cur.close()
+                    return None
+                
+                query = 'SELECT "TIMESTAMP" FROM public."CategoryStrength" ORDER BY "TIMESTAMP" DESC LIMIT 1'
+                if debug:
+                    print(f"Executing query: {query}")
+                cur.execute(query)
+                row = cur.fetchone()
+                cur.close()
             
-        cur.close()
-        conn.close()
-        return latest
-        
-    except Exception as e:
-        print(f"Error fetching latest timestamp: {e}")
-        if 'conn' in locals() and conn:
-            conn.close()
-        return None
+            latest = row[0] if row else None
+            if latest is None:
+                print("WARNING: No timestamps found in database!")
+            elif debug:
+                print(f"Latest SQL timestamp (naive): {latest}")
+            
+            with self.lock:
+                if latest is not None and (self.latest is None or latest > self.latest):
+                    self.latest = latest
+                return self.latest
+            
+        except Exception as e:
+            print(f"Error fetching latest timestamp: {e}")
+            return self.latest
+
+    def get(self, debug=False):
+        """Latest known timestamp; only hits the database before the first refresh"""
+        if self.latest is None:
+            return self.refresh(debug)
+        return self.latest
+
+latest_timestamp = LatestTimestampTracker()
+
+def get_latest_timestamp(debug=False):
+    """Get the most recent timestamp in the database (cached, see LatestTimestampTracker)"""
+    return latest_timestamp.get(debug)
+
+def refresh_latest_timestamp(debug=False):
+    """Re-read the most recent timestamp from the database"""
+    return latest_timestamp.refresh(debug)
 
 def get_category_tokens(date, category, calculation_type):
     """
@@ -218,125 +517,114 @@ def get_category_tokens(date, category, calculation_type):
             - error (str): Error message if any
     """
     try:
-        conn = get_db_connection()
-        if not conn:
-            return {"success": False, "error": "Database connection failed", "data": None}
-        
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        
-        # First get token info from CategoryStrength
-        query = """
-            WITH token_cmc_ids AS (
-                SELECT symbol, name, cmc_id 
-                FROM public."Token List"
-            ),
-            filtered_tokens AS (
-                SELECT cs."TIMESTAMP", cs.category, cs.calculation_type,
-                    jsonb_agg(t.token) as token_info
-                FROM public."CategoryStrength" cs,
-                    jsonb_array_elements(cs.token_info) AS t(token)
-                LEFT JOIN token_cmc_ids tci 
-                    ON tci.symbol = (t.token->>'symbol')::text 
-                    AND tci.name = (t.token->>'name')::text
-                WHERE DATE(cs."TIMESTAMP") = DATE(%s)
-                AND cs.category = %s
-                AND cs.calculation_type = %s
-                AND (tci.cmc_id IS NULL OR tci.cmc_id != 1)
-                GROUP BY cs."TIMESTAMP", cs.category, cs.calculation_type
-            )
-            SELECT token_info
-            FROM filtered_tokens
-            LIMIT 1
-        """
-        
-        cur.execute(query, (date, category, calculation_type))
-        result = cur.fetchone()
-        
-        if not result:
-            return {
-                "success": False,
-                "error": "No data found for the specified criteria",
-                "data": None
-            }
-        
-        # Parse the token_info JSON string
-        tokens = result['token_info']
-        
-        # For each token, get its CMC ID and ranks
-        for token in tokens:
-            # Get CMC ID from Token List
-            cur.execute("""
-                SELECT cmc_id 
-                FROM public."Token List" 
-                WHERE symbol = %s AND name = %s
-            """, (token['symbol'], token['name']))
-            
-            cmc_result = cur.fetchone()
-            if cmc_result:
-                cmc_id = cmc_result['cmc_id']
-                
-                # Get ranks from DailyTokenRanks
-                cur.execute("""
-                    SELECT market_cap_rank, market_cap
+        with db_connection() as conn:
+            if not conn:
+                return {"success": False, "error": "Database connection failed", "data": None}
+        
+            cur = conn.cursor(cursor_factory=RealDictCursor)
+        
+            # Pick the day's token list from CategoryStrength, then look up each token's
+            # CMC ID, daily rank and strength deltas in the same statement. Each LATERAL
+            # join is the per-token lookup that used to be its own round trip.
+            query = """
+                WITH token_cmc_ids AS (
+                    SELECT symbol, name, cmc_id 
+                    FROM public."Token List"
+                ),
+                filtered_tokens AS (
+                    SELECT cs."TIMESTAMP", cs.category, cs.calculation_type,
+                        jsonb_agg(t.token) as token_info
+                    FROM public."CategoryStrength" cs,
+                        jsonb_array_elements(cs.token_info) AS t(token)
+                    LEFT JOIN token_cmc_ids tci 
+                        ON tci.symbol = (t.token->>'symbol')::text 
+                        AND tci.name = (t.token->>'name')::text
+                    WHERE DATE(cs."TIMESTAMP") = DATE(%(date)s)
+                    AND cs.category = %(category)s
+                    AND cs.calculation_type = %(calculation_type)s
+                    AND (tci.cmc_id IS NULL OR tci.cmc_id != 1)
+                    GROUP BY cs."TIMESTAMP", cs.category, cs.calculation_type
+                ),
+                picked AS (
+                    SELECT token_info
+                    FROM filtered_tokens
+                    LIMIT 1
+                )
+                SELECT e.token, tl.cmc_id, dr.found_rank, dr.market_cap_rank, dr.market_cap,
+                    s.current_strength, s.strength_change_4h, s.strength_change_24h
+                FROM picked p
+                CROSS JOIN LATERAL jsonb_array_elements(p.token_info) WITH ORDINALITY AS e(token, ord)
+                LEFT JOIN LATERAL (
+                    SELECT cmc_id
+                    FROM public."Token List"
+                    WHERE symbol = e.token->>'symbol' AND name = e.token->>'name'
+                    LIMIT 1
+                ) tl ON true
+                LEFT JOIN LATERAL (
+                    SELECT true AS found_rank, market_cap_rank, market_cap
                     FROM public."DailyTokenRanks"
-                    WHERE date = %s AND cmc_id = %s
-                """, (date, cmc_id))
-                
-                rank_result = cur.fetchone()
-                if rank_result:
-                    token['overall_rank'] = rank_result['market_cap_rank']
-                    token['market_cap'] = float(rank_result['market_cap'])
-                    token['cmc_id'] = cmc_id
-                    
-                    # Get current strength and historical strengths for 4h and 24h changes
-                    cur.execute("""
-                        WITH current_strength AS (
-                            SELECT strength
-                            FROM public."tokenstrength"
-                            WHERE cmc_id = %s
-                            ORDER BY timestamp DESC
-                            LIMIT 1
-                        ),
-                        four_hours_ago AS (
-                            SELECT strength
-                            FROM public."tokenstrength"
-                            WHERE cmc_id = %s
-                            AND timestamp <= (NOW() - INTERVAL '4 hours')
-                            ORDER BY timestamp DESC
-                            LIMIT 1
-                        ),
-                        twenty_four_hours_ago AS (
-                            SELECT strength
-                            FROM public."tokenstrength"
-                            WHERE cmc_id = %s
-                            AND timestamp <= (NOW() - INTERVAL '24 hours')
-                            ORDER BY timestamp DESC
-                            LIMIT 1
-                        )
-                        SELECT 
-                            c.strength as current_strength,
-                            CASE 
-                                WHEN f.strength IS NOT NULL THEN c.strength - f.strength
-                                ELSE NULL
-                            END as strength_change_4h,
-                            CASE 
-                                WHEN t.strength IS NOT NULL THEN c.strength - t.strength
-                                ELSE NULL
-                            END as strength_change_24h
-                        FROM current_strength c
-                        LEFT JOIN four_hours_ago f ON true
-                        LEFT JOIN twenty_four_hours_ago t ON true
-                    """, (cmc_id, cmc_id, cmc_id))
-                    
-                    strength_result = cur.fetchone()
-                    if strength_result:
-                        token['current_strength'] = strength_result['current_strength']
-                        token['strength_change_4h'] = strength_result['strength_change_4h']
-                        token['strength_change_24h'] = strength_result['strength_change_24h']
-                    else:
-                        token['current_strength'] = None
-                        token['strength_change_4h'] = None
-                        token['strength_change_24h'] = None
+                    WHERE date = %(date)s AND cmc_id = tl.cmc_id
+                    LIMIT 1
+                ) dr ON true
+                LEFT JOIN LATERAL (
+                    SELECT 
+                        c.strength as current_strength,
+                        CASE 
+                            WHEN f.strength IS NOT NULL THEN c.strength - f.strength
+                            ELSE NULL
+                        END as strength_change_4h,
+                        CASE 
+                            WHEN t.strength IS NOT NULL THEN c.strength - t.strength
+                            ELSE NULL
+                        END as strength_change_24h
+                    FROM (
+                        SELECT strength
+                        FROM public."tokenstrength"
+                        WHERE cmc_id = tl.cmc_id
+                        ORDER BY timestamp DESC
+                        LIMIT 1
+                    ) c
+                    LEFT JOIN LATERAL (
+                        SELECT strength
+                        FROM public."tokenstrength"
+                        WHERE cmc_id = tl.cmc_id
+                        AND timestamp <= (NOW() - INTERVAL '4 hours')
+                        ORDER BY timestamp DESC
+                        LIMIT 1
+                    ) f ON true
+                    LEFT JOIN LATERAL (
+                        SELECT strength
+                        FROM public."tokenstrength"
+                        WHERE cmc_id = tl.cmc_id
+                        AND timestamp <= (NOW() - INTERVAL '24 hours')
+                        ORDER BY timestamp DESC
+                        LIMIT 1
+                    ) t ON true
+                    WHERE dr.found_rank
+                ) s ON true
+                ORDER BY e.ord
+            """
+        
+            cur.execute(query, {'date': date, 'category': category, 'calculation_type': calculation_type})
+            rows = cur.fetchall()
+        
+            if not rows:
+                return {
+                    "success": False,
+                    "error": "No data found for the specified criteria",
+                    "data": None
+                }
+        
+            tokens = []
+            for row in rows:
+                token = row['token']
+                if row['found_rank']:
+                    token['overall_rank'] = row['market_cap_rank']
+                    token['market_cap'] = float(row['market_cap'])
+                    token['cmc_id'] = row['cmc_id']
+                    token['current_strength'] = row['current_strength']
+                    token['strength_change_4h'] = row['strength_change_4h']
+                    token['strength_change_24h'] = row['strength_change_24h']
                 else:
                     token['overall_rank'] = '-'
                     token['market_cap'] = None
@@ -344,40 +632,31 @@ def get_category_tokens(date, category, calculation_type):
                     token['current_strength'] = None
                     token['strength_change_4h'] = None
                     token['strength_change_24h'] = None
-            else:
-                token['overall_rank'] = '-'
-                token['market_cap'] = None
-                token['cmc_id'] = None
-                token['current_strength'] = None
-                token['strength_change_4h'] = None
-                token['strength_change_24h'] = None
+                tokens.append(token)
         
-        # Calculate category ranks based on market_cap, excluding BTC (CMC ID = 1)
-        valid_tokens = [t for t in tokens if t['market_cap'] is not None and t.get('cmc_id') != 1]
-        valid_tokens.sort(key=lambda x: x['market_cap'], reverse=True)
+            # Calculate category ranks based on market_cap, excluding BTC (CMC ID = 1)
+            valid_tokens = [t for t in tokens if t['market_cap'] is not None and t.get('cmc_id') != 1]
+            valid_tokens.sort(key=lambda x: x['market_cap'], reverse=True)
         
-        # Create rank mapping
-        rank_map = {token['symbol']: idx + 1 for idx, token in enumerate(valid_tokens)}
+            # Create rank mapping
+            rank_map = {token['symbol']: idx + 1 for idx, token in enumerate(valid_tokens)}
         
-        # Assign category ranks
-        for token in tokens:
-            token['category_rank'] = rank_map.get(token['symbol'], '-')
+            # Assign category ranks
+            for token in tokens:
+                token['category_rank'] = rank_map.get(token['symbol'], '-')
         
-        cur.close()
-        conn.close()
+            cur.close()
         
-        return {
-            "success": True,
-            "data": tokens,
-            "error": None
-        }
+            return {
+                "success": True,
+                "data": tokens,
+                "error": None
+            }
         
     except Exception as e:
         print(f"Error fetching category tokens: {e}")
         if 'cur' in locals():
             cur.close()
-        if 'conn' in locals():
-            conn.close()
         return {
             "success": False,
             "error": str(e),
@@ -395,34 +674,33 @@ def get_all_tokens():
             - error (str): Error message if any
     """
     try:
-        conn = get_db_connection()
-        if not conn:
-            return {
-                "success": False,
-                "error": "Database connection failed",
-                "data": None
-            }
-        
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        
-        query = """
-            SELECT symbol, name, 
-                   ARRAY_TO_STRING(category, ', ') as category
-            FROM public."Token List"
-            ORDER BY symbol
-        """
+        with db_connection() as conn:
+            if not conn:
+                return {
+                    "success": False,
+                    "error": "Database connection failed",
+                    "data": None
+                }
+        
+            cur = conn.cursor(cursor_factory=RealDictCursor)
+        
+            query = """
+                SELECT symbol, name, 
+                       ARRAY_TO_STRING(category, ', ') as category
+                FROM public."Token List"
+                ORDER BY symbol
+            """
         
-        cur.execute(query)
-        tokens = cur.fetchall()
+            cur.execute(query)
+            tokens = cur.fetchall()
         
-        cur.close()
-        conn.close()
+            cur.close()
         
-        return {
-            "success": True,
-            "data": tokens,
-            "error": None
-        }
+            return {
+                "success": True,
+                "data": tokens,
+                "error": None
+            }
         
     except Exception as e:
         print(f"Error getting all tokens: {e}")
@@ -446,51 +724,48 @@ def get_tokens_by_category(category):
             - error (str): Error message if any
     """
     try:
-        conn = get_db_connection()
-        if not conn:
-            return {
-                'success': False,
-                'data': [],
-                'error': 'Failed to connect to database'
-            }
+        with db_connection() as conn:
+            if not conn:
+                return {
+                    'success': False,
+                    'data': [],
+                    'error': 'Failed to connect to database'
+                }
             
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        
-        # Query tokens where the category array contains our target category
-        query = """
-            SELECT symbol, name, category 
-            FROM public."Token List"
-            WHERE %s = ANY(category)
-            ORDER BY symbol ASC
-        """
+            cur = conn.cursor(cursor_factory=RealDictCursor)
         
-        cur.execute(query, (category,))
-        rows = cur.fetchall()
-        
-        # Process results
-        tokens = []
-        for row in rows:
-            # Get all categories except the current one
-            other_categories = [cat for cat in row['category'] if cat != category]
-            tokens.append({
-                'symbol': row['symbol'],
-                'name': row['name'],
-                'other_categories': other_categories
-            })
+            # Query tokens where the category array contains our target category
+            query = """
+                SELECT symbol, name, category 
+                FROM public."Token List"
+                WHERE %s = ANY(category)
+                ORDER BY symbol ASC
+            """
+        
+            cur.execute(query, (category,))
+            rows = cur.fetchall()
+        
+            # Process results
+            tokens = []
+            for row in rows:
+                # Get all categories except the current one
+                other_categories = [cat for cat in row['category'] if cat != category]
+                tokens.append({
+                    'symbol': row['symbol'],
+                    'name': row['name'],
+                    'other_categories': other_categories
+                })
             
-        cur.close()
-        conn.close()
+            cur.close()
         
-        return {
-            'success': True,
-            'data': tokens,
-            'error': None
-        }
+            return {
+                'success': True,
+                'data': tokens,
+                'error': None
+            }
         
     except Exception as e:
         print(f"Error fetching tokens by category: {e}")
-        if conn:
-            conn.close()
         return {
             'success': False,
             'data': [],
@@ -511,57 +786,54 @@ def get_all_strength_data(categories, calculation_types, since_time=None):
         dict: Nested dictionary with calculation_type and categories as keys
     """
     try:
-        conn = get_db_connection()
-        if not conn:
-            return None
-        
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        
-        # Build the base query with calculation_type filter
-        query = """
-            SELECT "TIMESTAMP", category, calculation_type, strength_ratio 
-            FROM public."CategoryStrength"
-            WHERE category = ANY(%s)
-            AND calculation_type = ANY(%s)
-        """
-        
-        params = [categories, calculation_types]
-        
-        # Only add timestamp filter if since_time is provided
-        if since_time is not None:
-            query += ' AND "TIMESTAMP" > %s'
-            params.append(since_time)
-            print(f"Fetching data since: {since_time}")
-        else:
-            print("Fetching all historical data")
-        
-        query += ' ORDER BY "TIMESTAMP" ASC'
-        
-        print(f"Executing consolidated query with params: {params}")
-        cur.execute(query, params)
-        rows = cur.fetchall()
-        
-        # Initialize result structure
-        result = {calc_type: {category: [] for category in categories} 
-                 for calc_type in calculation_types}
-        
-        # Organize data by calculation_type and category
-        for row in rows:
-            calc_type = row['calculation_type']
-            category = row['category']
-            result[calc_type][category].append({
-                'timestamp': row['TIMESTAMP'].isoformat(),
-                'strength': float(row['strength_ratio']) if row['strength_ratio'] is not None else None
-            })
+        with db_connection() as conn:
+            if not conn:
+                return None
+        
+            cur = conn.cursor(cursor_factory=RealDictCursor)
+        
+            # Build the base query with calculation_type filter
+            query = """
+                SELECT "TIMESTAMP", category, calculation_type, strength_ratio 
+                FROM public."CategoryStrength"
+                WHERE category = ANY(%s)
+                AND calculation_type = ANY(%s)
+            """
+        
+            params = [categories, calculation_types]
+        
+            # Only add timestamp filter if since_time is provided
+            if since_time is not None:
+                query += ' AND "TIMESTAMP" > %s'
+                params.append(since_time)
+                print(f"Fetching data since: {since_time}")
+            else:
+                print("Fetching all historical data")
+        
+            query += ' ORDER BY "TIMESTAMP" ASC'
+        
+            print(f"Executing consolidated query with params: {params}")
+            cur.execute(query, params)
+            rows = cur.fetchall()
+        
+            # Initialize result structure
+            result = {calc_type: {category: [] for category in categories} 
+                     for calc_type in calculation_types}
+        
+            # Organize data by calculation_type and category
+            for row in rows:
+                calc_type = row['calculation_type']
+                category = row['category']
+                result[calc_type][category].append({
+                    'timestamp': row['TIMESTAMP'].isoformat(),
+                    'strength': float(row['strength_ratio']) if row['strength_ratio'] is not None else None
+                })
             
-        cur.close()
-        conn.close()
-        return result
+            cur.close()
+            return result
         
     except Exception as e:
         print(f"Error fetching consolidated strength data: {e}")
-        if conn:
-            conn.close()
         return None
 
 def get_all_1h_strength_data(categories, calculation_types, since_time=None):
@@ -578,56 +850,55 @@ def get_all_1h_strength_data(categories, calculation_types, since_time=None):
         dict: Nested dictionary with calculation_type and categories as keys
     """
     try:
-        conn = get_db_connection()
-        if not conn:
-            return None
-        
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        
-        # Build the base query with calculation_type filter and hourly data
-        query = """
-            SELECT "TIMESTAMP", category, calculation_type, strength_ratio 
-            FROM public."CategoryStrength"
-            WHERE category = ANY(%s)
-            AND calculation_type = ANY(%s)
-            AND EXTRACT(MINUTE FROM "TIMESTAMP") = 0  -- Only get data points at the start of each hour
-        """
-        
-        params = [categories, calculation_types]
-        
-        # Only add timestamp filter if since_time is provided
-        if since_time is not None:
-            query += ' AND "TIMESTAMP" > %s'
-            params.append(since_time)
-            print(f"Fetching hourly data since: {since_time}")
-        else:
-            print("Fetching all historical hourly data")
-        
-        query += ' ORDER BY "TIMESTAMP" ASC'
-        
-        print(f"Executing consolidated 1h query with params: {params}")
-        cur.execute(query, params)
-        rows = cur.fetchall()
-        
-        # Initialize result structure
-        result = {calc_type: {category: [] for category in categories} 
-                 for calc_type in calculation_types}
-        
-        # Organize data by calculation_type and category
-        for row in rows:
-            calc_type = row['calculation_type']
-            category = row['category']
-            result[calc_type][category].append({
-                'timestamp': row['TIMESTAMP'].isoformat(),
-                'strength': float(row['strength_ratio']) if row['strength_ratio'] is not None else None
-            })
+        hour_mark = get_hour_mark_predicate()
+        with db_connection() as conn:
+            if not conn:
+                return None
+        
+            cur = conn.cursor(cursor_factory=RealDictCursor)
+        
+            # Build the base query with calculation_type filter and hourly data
+            # (only points at the start of each hour)
+            query = f"""
+                SELECT "TIMESTAMP", category, calculation_type, strength_ratio 
+                FROM public."CategoryStrength"
+                WHERE category = ANY(%s)
+                AND calculation_type = ANY(%s)
+                AND {hour_mark}
+            """
+        
+            params = [categories, calculation_types]
+        
+            # Only add timestamp filter if since_time is provided
+            if since_time is not None:
+                query += ' AND "TIMESTAMP" > %s'
+                params.append(since_time)
+                print(f"Fetching hourly data since: {since_time}")
+            else:
+                print("Fetching all historical hourly data")
+        
+            query += ' ORDER BY "TIMESTAMP" ASC'
+        
+            print(f"Executing consolidated 1h query with params: {params}")
+            cur.execute(query, params)
+            rows = cur.fetchall()
+        
+            # Initialize result structure
+            result = {calc_type: {category: [] for category in categories} 
+                     for calc_type in calculation_types}
+        
+            # Organize data by calculation_type and category
+            for row in rows:
+                calc_type = row['calculation_type']
+                category = row['category']
+                result[calc_type][category].append({
+                    'timestamp': row['TIMESTAMP'].isoformat(),
+                    'strength': float(row['strength_ratio']) if row['strength_ratio'] is not None else None
+                })
             
-        cur.close()
-        conn.close()
-        return result
+            cur.close()
+            return result
         
     except Exception as e:
         print(f"Error fetching consolidated 1h strength data: {e}")
-        if conn:
-            conn.close()
         return None
\ No newline at end of file
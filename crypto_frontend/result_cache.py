@@ -0,0 +1,116 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+import psycopg2
+from dbhandler import DB_CONNECTION
+from changefeed import ChangeListener, CATEGORY_STRENGTH, TOKEN_STRENGTH, DAILY_TOKEN_RANKS, CATEGORY_RANKS
+
+MAX_ENTRIES = 500                      # Cached results kept at most
+MAX_BYTES = 64 * 1024 * 1024           # Approximate memory cap (JSON size of cached results)
+MAX_AGE = 600                          # Seconds; bounds staleness for tables without notifications (Token List)
+VERSION_CHANNELS = [CATEGORY_STRENGTH, TOKEN_STRENGTH, DAILY_TOKEN_RANKS, CATEGORY_RANKS]
+FALLBACK_POLL_INTERVAL = 60
+
+class ResultCache:
+    """LRU cache of query results keyed by (endpoint, params, data_version)
+
+    data_version is bumped whenever a writer announces a new CategoryStrength,
+    tokenstrength or daily rank batch on the change feed, so results from before
+    the batch are never served again and age out of the LRU.
+    """
+    def __init__(self, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES, max_age=MAX_AGE):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.entries = OrderedDict()  # key -> (value, size, stored_at)
+        self.total_bytes = 0
+        self.data_version = 0
+        self.lock = threading.Lock()
+        self.listener_thread = None
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expired': 0, 'invalidations': 0}
+
+    def start(self):
+        """Start the change-feed listener that bumps data_version (once per process)"""
+        with self.lock:
+            if self.listener_thread is not None:
+                return
+            self.listener_thread = threading.Thread(target=self._listen, daemon=True)
+            self.listener_thread.start()
+
+    def _listen(self):
+        listener = ChangeListener(lambda: psycopg2.connect(DB_CONNECTION), VERSION_CHANNELS)
+        while True:
+            events = listener.wait(FALLBACK_POLL_INTERVAL)
+            if events:
+                channels = sorted({channel for channel, _ in events})
+                self.invalidate()
+                print(f"Result cache invalidated by: {', '.join(channels)}")
+
+    def invalidate(self):
+        """Move to a new data version and drop everything cached under older ones"""
+        with self.lock:
+            self.data_version += 1
+            self.entries.clear()
+            self.total_bytes = 0
+            self.stats['invalidations'] += 1
+
+    def _evict(self):
+        while self.entries and (len(self.entries) > self.max_entries or self.total_bytes > self.max_bytes):
+            _, (_, size, _) = self.entries.popitem(last=False)
+            self.total_bytes -= size
+            self.stats['evictions'] += 1
+
+    def get_or_compute(self, endpoint, params, compute, cacheable=None):
+        """Return the cached result for (endpoint, params) or compute and cache it
+
+        Args:
+            endpoint (str): Route name
+            params (tuple): Hashable request parameters
+            compute (callable): Produces the result on a miss
+            cacheable (callable, optional): Returns False for results that must not be
+                cached, e.g. error responses
+        """
+        self.start()
+        with self.lock:
+            version = self.data_version
+            key = (endpoint, params, version)
+            entry = self.entries.get(key)
+            if entry is not None and time.time() - entry[2] > self.max_age:
+                self.entries.pop(key)
+                self.total_bytes -= entry[1]
+                self.stats['expired'] += 1
+                entry = None
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.stats['hits'] += 1
+                return entry[0]
+            self.stats['misses'] += 1
+
+        value = compute()
+        if cacheable is not None and not cacheable(value):
+            return value
+
+        size = len(json.dumps(value, default=str))
+        with self.lock:
+            # Skip if the data changed while we were computing
+            if version == self.data_version and size <= self.max_bytes:
+                old = self.entries.pop(key, None)
+                if old is not None:
+                    self.total_bytes -= old[1]
+                self.entries[key] = (value, size, time.time())
+                self.total_bytes += size
+                self._evict()
+        return value
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats['entries'] = len(self.entries)
+            stats['bytes'] = self.total_bytes
+            stats['data_version'] = self.data_version
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+result_cache = ResultCache()
@@ -0,0 +1,336 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import fcntl
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+import numpy as np
+
+MANIFEST_FILE = 'manifest.json'
+LOCK_FILE = 'write.lock'
+FORMAT_VERSION = 2  # 1: .npy segments rewritten on every update, 2: append-only raw segments
+
+# One record per chart point: epoch seconds (UTC for naive timestamps) and strength (NaN for None)
+POINT_DTYPE = np.dtype([('ts', '<i8'), ('val', '<f8')])
+EMPTY_SERIES = np.empty(0, dtype=POINT_DTYPE)
+
+def parse_timestamp(value):
+    """Parse an ISO timestamp into (epoch seconds, utc offset seconds or None if naive)"""
+    dt = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if dt.tzinfo is None:
+        return int(dt.replace(tzinfo=timezone.utc).timestamp()), None
+    return int(dt.timestamp()), int(dt.utcoffset().total_seconds())
+
+def format_timestamp(ts, utc_offset=None):
+    """Format epoch seconds back into the ISO string the chart points used"""
+    if utc_offset is None:
+        return datetime.fromtimestamp(int(ts), timezone.utc).replace(tzinfo=None).isoformat()
+    return datetime.fromtimestamp(int(ts), timezone(timedelta(seconds=utc_offset))).isoformat()
+
+def points_to_array(points):
+    """Convert [{'timestamp', 'strength'}] into a sorted, de-duplicated record array
+
+    Returns:
+        tuple: (array, utc offset of the timestamps or None if naive)
+    """
+    arr = np.empty(len(points), dtype=POINT_DTYPE)
+    utc_offset = None
+    for i, point in enumerate(points):
+        arr[i]['ts'], utc_offset = parse_timestamp(point['timestamp'])
+        arr[i]['val'] = np.nan if point['strength'] is None else point['strength']
+    return merge_arrays(EMPTY_SERIES, arr), utc_offset
+
+def merge_arrays(existing, new):
+    """Merge two record arrays by timestamp; existing points win on duplicates"""
+    if len(new) == 0:
+        return existing
+    combined = np.concatenate([existing, new])
+    # np.unique keeps the first occurrence of each timestamp after a stable sort
+    order = np.argsort(combined['ts'], kind='stable')
+    combined = combined[order]
+    _, first = np.unique(combined['ts'], return_index=True)
+    return combined[first]
+
+def array_to_points(arr, utc_offset=None):
+    """Convert a record array back into chart points"""
+    return [{
+        'timestamp': format_timestamp(ts, utc_offset),
+        'strength': None if np.isnan(val) else float(val)
+    } for ts, val in zip(arr['ts'].tolist(), arr['val'].tolist())]
+
+def window_bounds(ts, start=None, end=None):
+    """Index range [lo, hi) of a sorted timestamp array with start <= ts <= end"""
+    lo = 0 if start is None else int(np.searchsorted(ts, start, side='left'))
+    hi = len(ts) if end is None else int(np.searchsorted(ts, end, side='right'))
+    return lo, hi
+
+def hour_marks(arr, utc_offset=None):
+    """Sorted positions of the points in the first minute of a (local) hour"""
+    return np.flatnonzero((arr['ts'] + (utc_offset or 0)) % 3600 < 60)
+
+def series_filename(calc_type, category, generation):
+    """Filesystem-safe, unique file name for a series at a generation"""
+    key = f"{calc_type}/{category}"
+    slug = re.sub(r'[^A-Za-z0-9_-]+', '-', key)[:60]
+    digest = hashlib.sha1(key.encode('utf-8')).hexdigest()[:10]
+    return f"{slug}-{digest}.{generation}.bin"
+
+class SegmentStore:
+    """Chart cache stored as one append-only segment of packed records per (calc_type, category)
+
+    manifest.json lists, for every series, its segment file, the number of committed
+    records and the first/last timestamps, and records the latest data point. A
+    segment file may hold bytes past the committed count (an interrupted append);
+    readers only ever map `count` records and writers truncate to it before
+    appending, so replacing the manifest is the single commit point.
+
+    New points past a series' tail are appended. Points already stored are dropped
+    (existing points win, as before). A genuinely missing older point rewrites
+    the series from that point on into a new generation-numbered file; the
+    untouched head is copied as raw bytes.
+    """
+    def __init__(self, root):
+        self.root = root
+        self.lock = threading.Lock()
+
+    def manifest_path(self):
+        return os.path.join(self.root, MANIFEST_FILE)
+
+    def exists(self):
+        return os.path.exists(self.manifest_path())
+
+    def read_manifest(self):
+        """Load the manifest, or an empty one if the store has not been written yet"""
+        try:
+            with open(self.manifest_path()) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {'format': FORMAT_VERSION, 'generation': 0, 'last_data_point': None, 'series': {}}
+
+    def write_manifest(self, manifest):
+        temp_path = f"{self.manifest_path()}.{os.getpid()}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.manifest_path())
+
+    @contextmanager
+    def writer_lock(self):
+        """Serialize writers across processes (web app cold start and the worker)"""
+        with open(os.path.join(self.root, LOCK_FILE), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def list_series(self, manifest=None):
+        """(calc_type, category) pairs in the store"""
+        manifest = manifest or self.read_manifest()
+        return [tuple(key.split('/', 1)) for key in manifest['series']]
+
+    def load_series(self, entry):
+        """Memory-map the committed records of a segment described by a manifest entry"""
+        path = os.path.join(self.root, entry['file'])
+        if entry['file'].endswith('.npy'):  # Format 1 segment, converted on its next write
+            return np.load(path, mmap_mode='r')
+        if entry['count'] == 0:
+            if not os.path.exists(path):
+                raise FileNotFoundError(path)
+            return EMPTY_SERIES
+        return np.memmap(path, dtype=POINT_DTYPE, mode='r', shape=(entry['count'],))
+
+    def read_series(self, calc_type, category, start=None, end=None, manifest=None):
+        """Read one series, optionally limited to start <= ts <= end (epoch seconds)
+
+        Returns:
+            tuple: (record array, utc offset or None)
+        """
+        for attempt in range(2):
+            current = manifest or self.read_manifest()
+            entry = current['series'].get(f"{calc_type}/{category}")
+            if entry is None:
+                return EMPTY_SERIES, None
+            try:
+                arr = self.load_series(entry)
+                break
+            except FileNotFoundError:
+                # A writer replaced the segment after we read the manifest; re-read it
+                if attempt or manifest is not None:
+                    raise
+        lo, hi = window_bounds(arr['ts'], start, end)
+        return np.array(arr[lo:hi]), entry.get('utc_offset')
+
+    def _write_file(self, filename, arr, head_from=None, head_count=0):
+        """Create a segment: optionally the first head_count records of another file, then arr"""
+        path = os.path.join(self.root, filename)
+        with open(path, 'wb') as out:
+            if head_from is not None and head_count:
+                with open(os.path.join(self.root, head_from), 'rb') as src:
+                    remaining = head_count * POINT_DTYPE.itemsize
+                    while remaining:
+                        chunk = src.read(min(remaining, 1 << 20))
+                        if not chunk:
+                            raise IOError(f"Segment {head_from} is shorter than its committed count")
+                        out.write(chunk)
+                        remaining -= len(chunk)
+            out.write(np.ascontiguousarray(arr, dtype=POINT_DTYPE).tobytes())
+            out.flush()
+            os.fsync(out.fileno())
+
+    def _append(self, entry, arr):
+        """Append records after the committed count of an existing segment"""
+        path = os.path.join(self.root, entry['file'])
+        with open(path, 'r+b') as f:
+            f.truncate(entry['count'] * POINT_DTYPE.itemsize)  # Drop an interrupted append
+            f.seek(0, os.SEEK_END)
+            f.write(np.ascontiguousarray(arr, dtype=POINT_DTYPE).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _merge_series(self, key, entry, new_arr, generation, replaced):
+        """Fold new points into one series; returns the updated manifest entry or None if unchanged"""
+        calc_type, category = key.split('/', 1)
+        existing = self.load_series(entry)
+        count = len(existing)
+        newer = new_arr[new_arr['ts'] > entry['last']] if count else new_arr
+        older = new_arr[new_arr['ts'] <= entry['last']] if count else new_arr[:0]
+
+        # Drop older points that are already stored; whatever is left is a real gap
+        if len(older):
+            pos = np.searchsorted(existing['ts'], older['ts'])
+            stored = existing['ts'][np.minimum(pos, count - 1)] == older['ts']
+            older = older[~stored]
+
+        if len(older) or entry['file'].endswith('.npy'):
+            start = int(np.searchsorted(existing['ts'], older['ts'][0])) if len(older) else count
+            tail = merge_arrays(np.array(existing[start:]), np.concatenate([older, newer]))
+            filename = series_filename(calc_type, category, generation)
+            if entry['file'].endswith('.npy'):
+                self._write_file(filename, merge_arrays(np.array(existing[:start]), tail))
+            else:
+                self._write_file(filename, tail, head_from=entry['file'], head_count=start)
+            replaced.append(entry['file'])
+            count = start + len(tail)
+            first = int(existing['ts'][0]) if start else int(tail['ts'][0])
+            return dict(entry, file=filename, count=count, first=first, last=int(tail['ts'][-1]))
+
+        if not len(newer):
+            return None
+        self._append(entry, newer)
+        return dict(entry, count=count + len(newer), last=int(newer['ts'][-1]))
+
+    def write(self, new_data):
+        """Merge {calc_type: {category: [points]}} into the store
+
+        Returns:
+            int: epoch seconds of the latest point in new_data, or None if it had none
+        """
+        with self.lock:
+            os.makedirs(self.root, exist_ok=True)
+            with self.writer_lock():
+                manifest = self.read_manifest()
+                generation = manifest['generation'] + 1
+                replaced = []
+                latest = None
+
+                for calc_type, categories in new_data.items():
+                    for category, points in categories.items():
+                        if not points:
+                            continue
+                        new_arr, utc_offset = points_to_array(points)
+                        latest = max(latest, int(new_arr['ts'][-1])) if latest is not None else int(new_arr['ts'][-1])
+
+                        key = f"{calc_type}/{category}"
+                        entry = manifest['series'].get(key)
+                        if entry is None:
+                            filename = series_filename(calc_type, category, generation)
+                            self._write_file(filename, new_arr)
+                            manifest['series'][key] = {
+                                'file': filename,
+                                'count': int(len(new_arr)),
+                                'first': int(new_arr['ts'][0]),
+                                'last': int(new_arr['ts'][-1]),
+                                'utc_offset': utc_offset
+                            }
+                        else:
+                            updated = self._merge_series(key, entry, new_arr, generation, replaced)
+                            if updated is not None:
+                                manifest['series'][key] = updated
+
+                if latest is None:
+                    return None
+
+                manifest['format'] = FORMAT_VERSION
+                manifest['generation'] = generation
+                previous = manifest.get('last_data_point_ts')
+                if previous is None or latest > previous:
+                    manifest['last_data_point_ts'] = latest
+                    manifest['last_data_point'] = format_timestamp(latest)
+                self.write_manifest(manifest)
+
+                # Readers that already mapped an old segment keep it open; new readers use the manifest
+                for filename in replaced:
+                    try:
+                        os.remove(os.path.join(self.root, filename))
+                    except OSError:
+                        pass
+                return latest
+
+    def compact(self, full_since, marks_since, drop_suffix='_1h'):
+        """Bound the store: keep every point from full_since on, only hour marks from
+        marks_since to full_since, and nothing older (all epoch seconds). Series whose
+        calc_type ends with drop_suffix are removed.
+
+        Returns:
+            dict: Points removed, series rewritten and series dropped
+        """
+        stats = {'removed_points': 0, 'rewritten': 0, 'dropped': 0}
+        with self.lock:
+            if not self.exists():
+                return stats
+            with self.writer_lock():
+                manifest = self.read_manifest()
+                generation = manifest['generation'] + 1
+                replaced = []
+
+                for key, entry in list(manifest['series'].items()):
+                    calc_type, category = key.split('/', 1)
+                    arr = np.array(self.load_series(entry))
+                    if drop_suffix and calc_type.endswith(drop_suffix):
+                        kept = EMPTY_SERIES
+                    elif not len(arr) or arr['ts'][0] >= full_since:
+                        continue
+                    else:
+                        lo, hi = window_bounds(arr['ts'], marks_since, full_since - 1)
+                        thinned = arr[lo:hi][hour_marks(arr[lo:hi], entry.get('utc_offset'))]
+                        kept = np.concatenate([thinned, arr[hi:]])
+                        if len(kept) == len(arr):
+                            continue
+
+                    stats['removed_points'] += len(arr) - len(kept)
+                    replaced.append(entry['file'])
+                    if not len(kept):
+                        del manifest['series'][key]
+                        stats['dropped'] += 1
+                        continue
+                    filename = series_filename(calc_type, category, generation)
+                    self._write_file(filename, kept)
+                    manifest['series'][key] = dict(entry, file=filename, count=int(len(kept)),
+                                                   first=int(kept['ts'][0]), last=int(kept['ts'][-1]))
+                    stats['rewritten'] += 1
+
+                if not replaced:
+                    return stats
+                manifest['format'] = FORMAT_VERSION
+                manifest['generation'] = generation
+                self.write_manifest(manifest)
+                for filename in replaced:
+                    try:
+                        os.remove(os.path.join(self.root, filename))
+                    except OSError:
+                        pass
+                return stats
@@ -134,33 +134,109 @@ document.addEventListener('DOMContentLoaded', function() {
             });
         });
 
-        // Check for updates every 5 seconds
+        // Cursor of the newest data we hold; the server only sends points after it
+        let updateCursor = window.dataCursor ?? null;
+        let updateEtag = null;
+
+        // Append points newer than the last one we already have in each series
+        function mergeDelta(calcType, category, points) {
+            const existing = window.preloadedData[calcType][category];
+            if (!existing || existing.length === 0) {
+                window.preloadedData[calcType][category] = points;
+                return;
+            }
+            const lastTime = new Date(existing[existing.length - 1].timestamp).getTime();
+            points.forEach(point => {
+                if (new Date(point.timestamp).getTime() > lastTime) {
+                    existing.push(point);
+                }
+            });
+        }
+
+        // Store new data (full or delta) without updating the chart
+        function applyUpdate(result, etag = null) {
+            if (result.cursor !== undefined) {
+                updateCursor = result.cursor;
+                updateEtag = etag;
+            }
+            if (!result.has_updates || !result.data) {
+                return;
+            }
+            console.log(`dashboard.js: New data available (${result.delta ? 'delta' : 'full'}), storing in preloadedData`);
+            Object.entries(result.data).forEach(([calcType, calcData]) => {
+                if (!window.preloadedData[calcType]) {
+                    window.preloadedData[calcType] = {};
+                }
+                Object.entries(calcData).forEach(([category, points]) => {
+                    if (result.delta) {
+                        mergeDelta(calcType, category, points);
+                    } else {
+                        window.preloadedData[calcType][category] = points;
+                    }
+                });
+            });
+        }
+
+        // Fallback: poll for updates every 5 seconds while the update stream is unavailable
         async function checkForUpdates() {
             try {
                 const serverInterval = window.chartState.currentInterval.toLowerCase();
-                const response = await fetch(`/api/check_updates?interval=${serverInterval}`);
-                const result = await response.json();
-                
-                if (result.has_updates && result.data) {
-                    console.log('dashboard.js: New data available, storing in preloadedData');
-                    
-                    // Just store the new data without updating chart
-                    Object.entries(result.data).forEach(([calcType, calcData]) => {
-                        if (!window.preloadedData[calcType]) {
-                            window.preloadedData[calcType] = {};
-                        }
-                        Object.entries(calcData).forEach(([category, points]) => {
-                            window.preloadedData[calcType][category] = points;
-                        });
-                    });
+                const params = new URLSearchParams({ interval: serverInterval });
+                if (updateCursor !== null) {
+                    params.set('since', updateCursor);
+                }
+                const response = await fetch(`/api/check_updates?${params}`, {
+                    headers: updateEtag ? { 'If-None-Match': updateEtag } : {}
+                });
+                if (response.status === 304) {
+                    return;
+                }
+                applyUpdate(await response.json(), response.headers.get('ETag'));
+                if (!updateSource && updateCursor !== null && Date.now() >= streamRetryAt) {
+                    connectUpdateStream();
                 }
             } catch (error) {
                 console.error('dashboard.js: Error checking for updates:', error);
             }
         }
-        
-        // Check for updates every 5 seconds (5000 milliseconds)
-        setInterval(checkForUpdates, 5000);
+
+        let pollTimer = null;
+        function startPolling() {
+            if (!pollTimer) {
+                pollTimer = setInterval(checkForUpdates, 5000);
+            }
+        }
+        function stopPolling() {
+            if (pollTimer) {
+                clearInterval(pollTimer);
+                pollTimer = null;
+            }
+        }
+
+        // Server-pushed updates; the server sends one message per new cache version
+        let updateSource = null;
+        let streamRetryAt = 0;
+        function connectUpdateStream() {
+            if (!window.EventSource || updateCursor === null) {
+                startPolling();
+                return;
+            }
+            updateSource = new EventSource(`/api/updates/stream?since=${updateCursor}`);
+            updateSource.addEventListener('open', stopPolling);
+            updateSource.addEventListener('update', event => {
+                applyUpdate(JSON.parse(event.data));
+            });
+            updateSource.addEventListener('error', () => {
+                // Poll while the browser reconnects; if the server refused the stream,
+                // polling reopens it after a minute
+                startPolling();
+                if (updateSource.readyState === EventSource.CLOSED) {
+                    updateSource = null;
+                    streamRetryAt = Date.now() + 60000;
+                }
+            });
+        }
+        connectUpdateStream();
 
     } catch (error) {
         console.error('dashboard.js: Error in DOMContentLoaded:', error);
@@ -0,0 +1,174 @@
+import os
+import threading
+import time
+from datetime import timedelta
+from psycopg2.extras import RealDictCursor, execute_values
+from dbhandler import db_connection
+from result_cache import result_cache
+
+SNAPSHOT_MAX_AGE = 600  # Seconds before a snapshot is rebuilt even without a notification
+# Also write each snapshot to public.latest_token_strength for other readers
+PERSIST_SNAPSHOT = os.environ.get('PERSIST_STRENGTH_SNAPSHOT') == '1'
+
+class StrengthSnapshot:
+    """Immutable view of every token's latest strength and category membership
+
+    rows holds one entry per distinct (cmc_id, symbol, name) row of Token List,
+    category_index maps each category to the set of row positions that list it.
+    """
+    def __init__(self, rows, category_index, latest_time, data_version):
+        self.rows = rows
+        self.category_index = category_index
+        self.latest_time = latest_time
+        self.data_version = data_version
+        self.built_at = time.time()
+
+    def search(self, categories):
+        """Tokens belonging to every given category, as multi_category_search_results lists them"""
+        matches = None
+        for category in categories:
+            positions = self.category_index.get(category, frozenset())
+            matches = positions if matches is None else matches & positions
+            if not matches:
+                return []
+
+        tokens = []
+        seen = set()
+        for pos in sorted(matches):  # Token List order; rows may have NULL columns
+            row = self.rows[pos]
+            key = (row['cmc_id'], row['symbol'], row['name'])
+            if key in seen:
+                continue
+            seen.add(key)
+            tokens.append({
+                'symbol': row['symbol'],
+                'name': row['name'],
+                'current_strength': row['current_strength'],
+                'strength_4h': row['strength_4h'],
+                'strength_24h': row['strength_24h']
+            })
+        return tokens
+
+def build_snapshot(data_version):
+    """Load Token List and the current, 4h-ago and 24h-ago strengths in one pass"""
+    with db_connection() as conn:
+        if not conn:
+            return None
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("""
+                SELECT cmc_id, symbol, name, category
+                FROM public."Token List"
+            """)
+            token_rows = cur.fetchall()
+
+            cur.execute("""
+                SELECT timestamp AS latest_time
+                FROM public.tokenstrength
+                ORDER BY timestamp DESC
+                LIMIT 1
+            """)
+            row = cur.fetchone()
+            latest_time = row['latest_time'] if row else None
+
+            strengths = {}
+            if latest_time is not None:
+                cur.execute("""
+                    SELECT timestamp, cmc_id, strength
+                    FROM public.tokenstrength
+                    WHERE timestamp = ANY(%s)
+                """, ([latest_time, latest_time - timedelta(hours=4), latest_time - timedelta(hours=24)],))
+                for r in cur.fetchall():
+                    strengths.setdefault(r['timestamp'], {})[r['cmc_id']] = r['strength']
+
+    current_strengths = strengths.get(latest_time, {})
+    strengths_4h = strengths.get(latest_time - timedelta(hours=4), {}) if latest_time else {}
+    strengths_24h = strengths.get(latest_time - timedelta(hours=24), {}) if latest_time else {}
+
+    rows = []
+    category_index = {}
+    for token in token_rows:
+        cmc_id = token['cmc_id']
+        current_str = current_strengths.get(cmc_id)
+        rows.append({
+            'cmc_id': cmc_id,
+            'symbol': token['symbol'],
+            'name': token['name'],
+            'current_strength': current_str,
+            'strength_4h': current_str - strengths_4h.get(cmc_id, 0) if current_str and cmc_id in strengths_4h else None,
+            'strength_24h': current_str - strengths_24h.get(cmc_id, 0) if current_str and cmc_id in strengths_24h else None
+        })
+        for category in token['category'] or []:
+            category_index.setdefault(category, set()).add(len(rows) - 1)
+
+    category_index = {category: frozenset(positions) for category, positions in category_index.items()}
+    return StrengthSnapshot(rows, category_index, latest_time, data_version)
+
+def persist_snapshot(snapshot):
+    """Replace the contents of public.latest_token_strength with the snapshot"""
+    with db_connection() as conn:
+        if not conn:
+            return
+        with conn.cursor() as cur:
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS public.latest_token_strength (
+                    cmc_id integer,
+                    symbol text,
+                    name text,
+                    timestamp timestamp,
+                    current_strength numeric,
+                    strength_4h numeric,
+                    strength_24h numeric
+                )
+            """)
+            cur.execute("DELETE FROM public.latest_token_strength")
+            execute_values(cur, """
+                INSERT INTO public.latest_token_strength
+                (cmc_id, symbol, name, timestamp, current_strength, strength_4h, strength_24h)
+                VALUES %s
+            """, [(r['cmc_id'], r['symbol'], r['name'], snapshot.latest_time, r['current_strength'],
+                   r['strength_4h'], r['strength_24h']) for r in snapshot.rows])
+        conn.commit()
+
+class SnapshotHolder:
+    """Holds the current StrengthSnapshot and rebuilds it once per strength cycle
+
+    Readers take a reference to the current snapshot and never see a partly built
+    one; while a rebuild is running they keep getting the previous snapshot.
+    """
+    def __init__(self):
+        self.snapshot = None
+        self.build_lock = threading.Lock()
+
+    def _is_stale(self, snapshot):
+        return (snapshot is None or snapshot.data_version != result_cache.data_version
+                or time.time() - snapshot.built_at > SNAPSHOT_MAX_AGE)
+
+    def get(self):
+        snapshot = self.snapshot
+        if not self._is_stale(snapshot):
+            return snapshot
+
+        # Only one thread rebuilds; the others serve the previous snapshot if there is one
+        if not self.build_lock.acquire(blocking=snapshot is None):
+            return snapshot
+        try:
+            if not self._is_stale(self.snapshot):
+                return self.snapshot
+            result_cache.start()
+            start = time.time()
+            new_snapshot = build_snapshot(result_cache.data_version)
+            if new_snapshot is None:
+                return snapshot
+            self.snapshot = new_snapshot
+            print(f"Built strength snapshot: {len(new_snapshot.rows)} tokens at "
+                  f"{new_snapshot.latest_time} in {time.time() - start:.2f}s")
+            if PERSIST_SNAPSHOT:
+                try:
+                    persist_snapshot(new_snapshot)
+                except Exception as e:
+                    print(f"Error persisting strength snapshot: {e}")
+            return new_snapshot
+        finally:
+            self.build_lock.release()
+
+strength_snapshot = SnapshotHolder()
@@ -0,0 +1,144 @@
+import json
+import threading
+import time
+import psycopg2
+import cache_manager
+from dbhandler import DB_CONNECTION
+from changefeed import ChangeListener, CHART_CACHE
+
+FALLBACK_CHECK_INTERVAL = 15  # Seconds between cache version checks without a notification
+HEARTBEAT_INTERVAL = 20       # Comment line sent on idle streams to keep proxies from closing them
+MAX_STREAM_AGE = 600          # Streams end after this long; EventSource reconnects with Last-Event-ID
+MAX_STREAMS = 48              # Per process; keep below the gunicorn thread count and the Fly hard_limit
+RETRY_MS = 5000               # Client reconnect delay
+
+
+def format_event(event, data, event_id=None):
+    """One Server-Sent Events message"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {data}")
+    return '\n'.join(lines) + '\n\n'
+
+
+def update_event(snapshot, since):
+    """'update' message carrying the points newer than `since` and the new cursor"""
+    return format_event('update', json.dumps({
+        'has_updates': True,
+        'delta': True,
+        'data': snapshot.delta(since),
+        'cursor': snapshot.cursor,
+        'timestamp': snapshot.last_update.isoformat()
+    }), snapshot.cursor)
+
+
+class UpdateBroadcaster:
+    """Pushes each new chart cache version to every open dashboard
+
+    One thread per process waits for the worker's chart_cache_updated
+    notification - on a replica, for the sync thread to install the new version -
+    (or checks the cache version every FALLBACK_CHECK_INTERVAL),
+    renders the update message once and wakes all streams. A stream whose
+    client is further behind gets its own delta.
+    """
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.current = None   # (previous cursor, snapshot, rendered message)
+        self.streams = 0
+        self.thread = None
+
+    def start(self):
+        """Start the watcher thread (once per process)"""
+        if self.thread is not None:
+            return
+        snapshot = cache_manager.chart_cache.get()
+        with self.condition:
+            if self.thread is not None:
+                return
+            if snapshot is not None and snapshot.cursor is not None:
+                self.current = (None, snapshot, None)
+            self.thread = threading.Thread(target=self._watch, daemon=True)
+            self.thread.start()
+
+    def _wait_for_replica(self, timeout):
+        if cache_manager.replica_updated.wait(timeout):
+            cache_manager.replica_updated.clear()
+
+    def _watch(self):
+        if cache_manager.replica:
+            # The notification arrives before the new bundle is installed locally
+            wait = self._wait_for_replica
+        else:
+            wait = ChangeListener(lambda: psycopg2.connect(DB_CONNECTION), [CHART_CACHE]).wait
+        while True:
+            wait(FALLBACK_CHECK_INTERVAL)
+            try:
+                snapshot = cache_manager.chart_cache.get()
+                if snapshot is None or snapshot.cursor is None:
+                    continue
+                with self.condition:
+                    previous = self.current[1].cursor if self.current else None
+                    if previous is not None and snapshot.cursor <= previous:
+                        continue
+                message = update_event(snapshot, previous) if previous is not None else None
+                with self.condition:
+                    self.current = (previous, snapshot, message)
+                    self.condition.notify_all()
+                print(f"Pushed chart update {snapshot.last_update} to {self.streams} stream(s)")
+            except Exception as e:
+                print(f"Error broadcasting chart update: {e}")
+
+    def acquire_stream(self):
+        """Reserve a stream slot; False when the process is at MAX_STREAMS"""
+        with self.condition:
+            if self.streams >= MAX_STREAMS:
+                return False
+            self.streams += 1
+            return True
+
+    def _pending(self, cursor):
+        """The current version if a client at `cursor` has not seen it yet"""
+        current = self.current
+        if current is None or current[1].cursor <= cursor:
+            return None
+        return current
+
+    def release_stream(self):
+        with self.condition:
+            self.streams -= 1
+
+    def stream(self, since):
+        """Generator of SSE messages for one client holding data up to `since` (epoch seconds)
+
+        Catches the client up first if it is behind the current version. The caller
+        reserves a slot with acquire_stream() and releases it when the response closes.
+        """
+        yield f"retry: {RETRY_MS}\n\n"
+        started = time.time()
+        cursor = since
+        while time.time() - started < MAX_STREAM_AGE:
+            with self.condition:
+                current = self._pending(cursor)
+                if current is None:
+                    self.condition.wait(HEARTBEAT_INTERVAL)
+                    current = self._pending(cursor)
+            if current is None:
+                yield ": ping\n\n"
+                continue
+
+            previous, snapshot, message = current
+            yield message if message is not None and previous == cursor else update_event(snapshot, cursor)
+            cursor = snapshot.cursor
+
+    def get_stats(self):
+        with self.condition:
+            return {
+                'streams': self.streams,
+                'max_streams': MAX_STREAMS,
+                'cursor': self.current[1].cursor if self.current else None
+            }
+
+
+update_broadcaster = UpdateBroadcaster()
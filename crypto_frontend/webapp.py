@@ -1,10 +1,13 @@
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, render_template, jsonify, request, Response
 from datetime import datetime, timedelta
 import json
 from dbhandler import (get_strength_data, get_1h_strength_data, get_category_tokens, 
-                      get_all_tokens, get_tokens_by_category, get_db_connection, 
+                      get_all_tokens, get_tokens_by_category, db_connection, get_pool_stats, 
                       RealDictCursor, get_all_strength_data, get_all_1h_strength_data)
 import cache_manager
+from result_cache import result_cache
+from strength_snapshot import strength_snapshot
+from update_stream import update_broadcaster
 import pytz
 import os
 import random
@@ -13,6 +16,17 @@ import time
 
 app = Flask(__name__)
 
+# Use environment variable for cache directory if provided
+if os.environ.get('CACHE_DIR'):
+    cache_manager.set_cache_dir(os.environ.get('CACHE_DIR'))
+
+# With a shared cache backend this process mirrors the worker's published cache
+if cache_manager.backend is not None:
+    cache_manager.start_replica_sync()
+
+CALCULATION_TYPES = ['top_5', 'top_10', 'top_15', 'top_20', 'top_100_mc', 'top_200_mc']
+HISTORY_MAX_HOURS = 24 * 90  # Longest range /api/history reads from the database
+
 def load_categories():
     """Load categories from categories.json"""
     try:
@@ -62,12 +76,19 @@ def index():
     
     # Initialize data dict
     all_data = {}
+    serialized_data = None
     
-    # Try to load from cache first with time windows
+    # Pre-rendered by the worker after each cache update; no serialization needed
     cache_start = time.time()
-    data_10min, data_1h = cache_manager.get_cached_data_for_charts()
+    payload = cache_manager.payload_store.get('index')
+    data_10min, data_1h = (None, None) if payload else cache_manager.get_cached_data_for_charts()
     
-    if data_10min is not None and data_1h is not None:
+    data_cursor = None
+    if payload:
+        serialized_data = payload.raw.decode('utf-8')
+        data_cursor = payload.cursor
+        print(f"Using pre-rendered chart payload {payload.etag} (took {time.time() - cache_start:.2f}s)")
+    elif data_10min is not None and data_1h is not None:
         print(f"Using cached data (took {time.time() - cache_start:.2f}s)")
         
         # Add 10min chart data
@@ -118,10 +139,11 @@ def index():
     template_data_start = time.time()
     
     # Time the JSON serialization specifically
-    json_start = time.time()
-    serialized_data = json.dumps(all_data)
-    json_time = time.time() - json_start
-    print(f"JSON serialization took {json_time:.2f}s for {len(serialized_data)} bytes")
+    if serialized_data is None:
+        json_start = time.time()
+        serialized_data = json.dumps(all_data)
+        json_time = time.time() - json_start
+        print(f"JSON serialization took {json_time:.2f}s for {len(serialized_data)} bytes")
     
     # Time the template data dictionary creation
     dict_start = time.time()
@@ -130,6 +152,7 @@ def index():
         'categories': categories,
         'category_colors': category_colors,
         'calculation_types': calc_types,  # Keep original calc_types for dropdown
+        'data_cursor': data_cursor,  # /api/check_updates cursor matching preloaded_data
     }
     dict_time = time.time() - dict_start
     print(f"Dictionary creation took {dict_time:.2f}s")
@@ -173,28 +196,139 @@ def get_stats(category):
 
 @app.route('/api/check_updates')
 def check_updates():
+    """Chart points newer than the client's `since` cursor
+
+    Without `since` the whole cache is returned. Responses carry the new cursor and
+    an ETag for it; a client that is already current gets 304 (If-None-Match) or
+    has_updates: false.
+    """
     try:
-        # Get cached data
-        cached_data = cache_manager.get_cached_data()
-        if not cached_data:
+        # One resident snapshot, so the data and cursor always belong together
+        snapshot = cache_manager.chart_cache.get()
+        if not snapshot or not snapshot.data or snapshot.cursor is None:
             return jsonify({'has_updates': False})
         
-        # Get last update time
-        last_update = cache_manager.get_last_update_time()
-        if not last_update:
-            return jsonify({'has_updates': False})
-            
-        # Return cached data
-        return jsonify({
-            'has_updates': True,
-            'data': cached_data,
-            'timestamp': last_update.isoformat()
-        })
+        etag = f'"{snapshot.cursor}"'
+        if etag in request.headers.get('If-None-Match', ''):
+            return Response(status=304, headers={'ETag': etag})
+        
+        since = request.args.get('since', type=int)
+        if since is not None and since >= snapshot.cursor:
+            response = jsonify({'has_updates': False, 'cursor': snapshot.cursor})
+        elif since is not None:
+            response = jsonify({
+                'has_updates': True,
+                'delta': True,
+                'data': snapshot.delta(since),
+                'cursor': snapshot.cursor,
+                'timestamp': snapshot.last_update.isoformat()
+            })
+        else:
+            response = jsonify({
+                'has_updates': True,
+                'delta': False,
+                'data': snapshot.data,
+                'cursor': snapshot.cursor,
+                'timestamp': snapshot.last_update.isoformat()
+            })
+        response.headers['ETag'] = etag
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
         
     except Exception as e:
         print(f"Error checking for updates: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/updates/stream')
+def updates_stream():
+    """Server-Sent Events stream of chart updates for a client at the `since` cursor
+
+    Browsers resend the last event id (the cursor) when they reconnect. Clients
+    fall back to polling /api/check_updates when this answers 503.
+    """
+    since = request.headers.get('Last-Event-ID', type=int) or request.args.get('since', type=int)
+    if since is None:
+        return jsonify({'error': 'since is required'}), 400
+    
+    update_broadcaster.start()
+    if not update_broadcaster.acquire_stream():
+        return jsonify({'error': 'Too many update streams, poll instead'}), 503
+    response = Response(update_broadcaster.stream(since), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    response.call_on_close(update_broadcaster.release_stream)
+    return response
+
+@app.route('/api/update_stream_stats')
+def update_stream_stats():
+    """Open update streams and the cursor last pushed"""
+    return jsonify(update_broadcaster.get_stats())
+
+@app.route('/api/history/<calc_type>')
+def history(calc_type):
+    """Chart points older than the cache keeps, read from the database
+
+    Query args: hours (default 168, 1 to HISTORY_MAX_HOURS) and interval ('1h' or '10min').
+    """
+    if calc_type not in CALCULATION_TYPES:
+        return jsonify({'error': f'Unknown calculation type {calc_type}'}), 400
+    interval = request.args.get('interval', '1h')
+    if interval not in ('1h', '10min'):
+        return jsonify({'error': "interval must be '1h' or '10min'"}), 400
+    try:
+        hours = int(request.args.get('hours', 168))
+    except ValueError:
+        hours = None
+    if hours is None or not 1 <= hours <= HISTORY_MAX_HOURS:
+        return jsonify({'error': f'hours must be an integer from 1 to {HISTORY_MAX_HOURS}'}), 400
+    fetch = get_1h_strength_data if interval == '1h' else get_strength_data
+    
+    data = result_cache.get_or_compute(
+        'history', (calc_type, hours, interval),
+        lambda: fetch(load_categories(), calc_type, hours),
+        cacheable=lambda value: value is not None
+    )
+    if data is None:
+        return jsonify({'error': 'Failed to load history'}), 500
+    return jsonify(data)
+
+@app.route('/api/chart_data/<name>')
+def chart_data(name):
+    """Serve a pre-rendered chart payload ('index', '<calc_type>' or '<calc_type>_1h')"""
+    payload = cache_manager.payload_store.get(name)
+    if payload is None:
+        return jsonify({'error': f'No chart data for {name}'}), 404
+    
+    etag = f'"{payload.etag}"'
+    headers = {'ETag': etag, 'Cache-Control': 'no-cache', 'Vary': 'Accept-Encoding'}
+    if etag in request.headers.get('If-None-Match', ''):
+        return Response(status=304, headers=headers)
+    
+    accepted = request.headers.get('Accept-Encoding', '')
+    for encoding in ('br', 'gzip'):
+        if encoding in payload.encoded and encoding in accepted:
+            headers['Content-Encoding'] = encoding
+            return Response(payload.encoded[encoding], mimetype='application/json', headers=headers)
+    return Response(payload.raw, mimetype='application/json', headers=headers)
+
+@app.route('/api/result_cache_stats')
+def result_cache_stats():
+    """Result cache hit/miss counters and size"""
+    return jsonify(result_cache.get_stats())
+
+@app.route('/api/worker_status')
+def worker_status():
+    """Heartbeat and last refresh of the cache worker (from its status file)"""
+    status = cache_manager.read_worker_status()
+    if status is None:
+        return jsonify({'error': 'No worker status'}), 404
+    status['heartbeat_age'] = time.time() - status['heartbeat'] if status.get('heartbeat') else None
+    return jsonify(status)
+
+@app.route('/api/db_pool_stats')
+def db_pool_stats():
+    """Database connection pool usage and wait times"""
+    return jsonify(get_pool_stats())
+
 @app.route('/search', methods=['GET'])
 def search():
     print("\n=== Starting search route ===")
@@ -210,8 +344,12 @@ def search():
         return render_template('search_results.html', 
                              error="Missing required search parameters")
     
-    # Get token data using dbhandler
-    result = get_category_tokens(date_str, category, calc_type)
+    # Get token data using dbhandler (cached until the next data batch)
+    result = result_cache.get_or_compute(
+        'search', (date_str, category, calc_type),
+        lambda: get_category_tokens(date_str, category, calc_type),
+        cacheable=lambda r: r["success"]
+    )
     
     if not result["success"]:
         return render_template('search_results.html', 
@@ -229,8 +367,9 @@ def token_list():
     """Display the complete list of cryptocurrencies"""
     print("\n=== Starting token list route ===")
     
-    # Get all tokens using dbhandler
-    result = get_all_tokens()
+    # Get all tokens using dbhandler (cached until the next data batch)
+    result = result_cache.get_or_compute('token_list', (), get_all_tokens,
+                                         cacheable=lambda r: r["success"])
     
     if not result["success"]:
         return render_template('token_list.html', 
@@ -241,62 +380,67 @@ def token_list():
     return render_template('token_list.html',
                          tokens=result["data"])
 
-@app.route('/category-explorer')
-def category_explorer():
-    """Render the category explorer page"""
-    categories = load_categories()
-    
+def load_category_explorer_tokens():
+    """Get every token grouped by category, or None if the query failed"""
     # Get all tokens in a single query instead of querying per category
     try:
-        conn = get_db_connection()
-        if not conn:
-            return render_template('category_explorer.html', 
-                                categories=categories,
-                                all_tokens={})
+        with db_connection() as conn:
+            if not conn:
+                return None
             
-        cur = conn.cursor(cursor_factory=RealDictCursor)
+            cur = conn.cursor(cursor_factory=RealDictCursor)
         
-        # Get all tokens and their categories in one query
-        query = """
-            SELECT symbol, name, category 
-            FROM public."Token List"
-            ORDER BY symbol ASC
-        """
+            # Get all tokens and their categories in one query
+            query = """
+                SELECT symbol, name, category 
+                FROM public."Token List"
+                ORDER BY symbol ASC
+            """
         
-        cur.execute(query)
-        rows = cur.fetchall()
+            cur.execute(query)
+            rows = cur.fetchall()
         
-        # Organize tokens by category
-        all_tokens = {}
-        for row in rows:
-            for category in row['category']:
-                if category not in all_tokens:
-                    all_tokens[category] = []
+            # Organize tokens by category
+            all_tokens = {}
+            for row in rows:
+                for category in row['category']:
+                    if category not in all_tokens:
+                        all_tokens[category] = []
                     
-                # Get all categories except the current one
-                other_categories = [cat for cat in row['category'] if cat != category]
+                    # Get all categories except the current one
+                    other_categories = [cat for cat in row['category'] if cat != category]
                 
-                all_tokens[category].append({
-                    'symbol': row['symbol'],
-                    'name': row['name'],
-                    'other_categories': other_categories
-                })
+                    all_tokens[category].append({
+                        'symbol': row['symbol'],
+                        'name': row['name'],
+                        'other_categories': other_categories
+                    })
         
-        cur.close()
-        conn.close()
+            cur.close()
+            return all_tokens
         
     except Exception as e:
         print(f"Error loading category explorer: {e}")
-        all_tokens = {}
-        
+        return None
+
+@app.route('/category-explorer')
+def category_explorer():
+    """Render the category explorer page"""
+    categories = load_categories()
+    
+    all_tokens = result_cache.get_or_compute('category_explorer', (), load_category_explorer_tokens,
+                                             cacheable=lambda r: r is not None)
+    
     return render_template('category_explorer.html', 
                          categories=categories,
-                         all_tokens=all_tokens)
+                         all_tokens=all_tokens or {})
 
 @app.route('/api/tokens-by-category/<category>')
 def tokens_by_category(category):
     """API endpoint to get tokens for a specific category"""
-    result = get_tokens_by_category(category)
+    result = result_cache.get_or_compute('tokens_by_category', (category,),
+                                         lambda: get_tokens_by_category(category),
+                                         cacheable=lambda r: r['success'])
     return jsonify(result)
 
 @app.route('/multi-category-search-results')
@@ -310,83 +454,27 @@ def multi_category_search_results():
         return render_template('multi_category_search.html', error="No categories specified")
 
     try:
-        with get_db_connection() as conn:
-            with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                # First get matching tokens from Token List
-                token_search_start = time.time()
-                categories_array = "{" + ",".join(f'"{cat}"' for cat in categories) + "}"
-                cur.execute("""
-                    SELECT DISTINCT cmc_id, symbol, name 
-                    FROM public."Token List" 
-                    WHERE category @> %s::text[]
-                """, (categories_array,))
-                matching_tokens = cur.fetchall()
-                print(f"Token search took: {time.time() - token_search_start:.2f}s")
-                print(f"Found {len(matching_tokens)} matching tokens")
-
-                if not matching_tokens:
-                    return render_template('multi_category_search.html', 
-                                        error=f"No tokens found matching all categories: {', '.join(categories)}")
-
-                # Get the latest timestamp from tokenstrength
-                timestamp_start = time.time()
-                cur.execute("""
-                    SELECT MAX(timestamp) as latest_time 
-                    FROM public.tokenstrength
-                """)
-                latest_time = cur.fetchone()['latest_time']
-                print(f"Getting latest timestamp took: {time.time() - timestamp_start:.2f}s")
-
-                # Get current strength, 4h and 24h changes for each token
-                strength_start = time.time()
-                token_data = []
-                
-                # Batch query for current strengths
-                cur.execute("""
-                    SELECT cmc_id, strength 
-                    FROM public.tokenstrength 
-                    WHERE cmc_id = ANY(%s) AND timestamp = %s
-                """, ([t['cmc_id'] for t in matching_tokens], latest_time))
-                current_strengths = {row['cmc_id']: row['strength'] for row in cur.fetchall()}
-
-                # Batch query for 4h ago strengths
-                cur.execute("""
-                    SELECT cmc_id, strength 
-                    FROM public.tokenstrength 
-                    WHERE cmc_id = ANY(%s) AND timestamp = %s
-                """, ([t['cmc_id'] for t in matching_tokens], latest_time - timedelta(hours=4)))
-                strengths_4h = {row['cmc_id']: row['strength'] for row in cur.fetchall()}
-
-                # Batch query for 24h ago strengths
-                cur.execute("""
-                    SELECT cmc_id, strength 
-                    FROM public.tokenstrength 
-                    WHERE cmc_id = ANY(%s) AND timestamp = %s
-                """, ([t['cmc_id'] for t in matching_tokens], latest_time - timedelta(hours=24)))
-                strengths_24h = {row['cmc_id']: row['strength'] for row in cur.fetchall()}
-
-                # Process all tokens
-                for token in matching_tokens:
-                    cmc_id = token['cmc_id']
-                    current_str = current_strengths.get(cmc_id)
-                    str_4h = current_str - strengths_4h.get(cmc_id, 0) if current_str and cmc_id in strengths_4h else None
-                    str_24h = current_str - strengths_24h.get(cmc_id, 0) if current_str and cmc_id in strengths_24h else None
-
-                    token_data.append({
-                        'symbol': token['symbol'],
-                        'name': token['name'],
-                        'current_strength': current_str,
-                        'strength_4h': str_4h,
-                        'strength_24h': str_24h
-                    })
-                
-                print(f"Getting and processing strengths took: {time.time() - strength_start:.2f}s")
-                print(f"Total search time: {time.time() - start_time:.2f}s")
-                print("=== End multi-category search ===\n")
+        # Tokens, category sets and strength deltas are precomputed once per strength cycle
+        snapshot = strength_snapshot.get()
+        if snapshot is None:
+            return render_template('multi_category_search.html', 
+                                error="An error occurred while processing your search")
+        
+        search_start = time.time()
+        token_data = snapshot.search(categories)
+        print(f"Snapshot search took: {(time.time() - search_start) * 1e6:.0f}us")
+        print(f"Found {len(token_data)} matching tokens")
+
+        if not token_data:
+            return render_template('multi_category_search.html', 
+                                error=f"No tokens found matching all categories: {', '.join(categories)}")
 
-                return render_template('multi_category_search.html',
-                                    tokens=token_data,
-                                    categories=categories)
+        print(f"Total search time: {time.time() - start_time:.2f}s")
+        print("=== End multi-category search ===\n")
+
+        return render_template('multi_category_search.html',
+                            tokens=token_data,
+                            categories=categories)
 
     except Exception as e:
         print(f"Error in multi-category search: {e}")
@@ -405,13 +493,6 @@ def multi_category_search():
     return jsonify({'redirect': f'/multi-category-search-results?categories={",".join(categories)}'})
 
 if __name__ == '__main__':
-    # Use environment variable for cache directory if provided
-    if os.environ.get('CACHE_DIR'):
-        cache_manager.CACHE_DIR = os.environ.get('CACHE_DIR')
-        # Update the file paths based on new cache directory
-        cache_manager.CHART_DATA_FILE = os.path.join(cache_manager.CACHE_DIR, 'chart_data.json')
-        cache_manager.LAST_UPDATE_FILE = os.path.join(cache_manager.CACHE_DIR, 'last_update.json')
-    
     # Ensure cache directory exists
     cache_manager.ensure_cache_dir()
     
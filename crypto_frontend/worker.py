@@ -1,30 +1,86 @@
+import json
 import os
+import signal
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 import cache_manager
-from dbhandler import get_db_connection
+from dbhandler import init_pool, ensure_hour_mark_index
+
+SUPERVISE_INTERVAL = 30       # Seconds between checks that the refresh thread is alive
+SHUTDOWN_TIMEOUT = 15         # Seconds to wait for the refresh thread on shutdown
+# /health fails when the heartbeat is older than this (a refresh is hung)
+STALE_HEARTBEAT = 3 * cache_manager.REFRESH_CADENCE
 
 # Use environment variable for cache directory if provided
 if os.environ.get('CACHE_DIR'):
-    cache_manager.CACHE_DIR = os.environ.get('CACHE_DIR')
-    # Update the file paths based on new cache directory
-    cache_manager.CHART_DATA_FILE = os.path.join(cache_manager.CACHE_DIR, 'chart_data.json')
-    cache_manager.LAST_UPDATE_FILE = os.path.join(cache_manager.CACHE_DIR, 'last_update.json')
+    cache_manager.set_cache_dir(os.environ.get('CACHE_DIR'))
+
+# Set by SIGTERM/SIGINT; the main thread blocks on it
+shutdown_event = threading.Event()
+
+def request_shutdown(signum, frame):
+    print(f"Received {signal.Signals(signum).name}, shutting down...")
+    shutdown_event.set()
+
+class StatusHandler(BaseHTTPRequestHandler):
+    """GET /health (200 or 503) and GET /metrics (worker status JSON)"""
+    def do_GET(self):
+        status = cache_manager.get_worker_status()
+        healthy = status['heartbeat'] is not None and time.time() - status['heartbeat'] < STALE_HEARTBEAT
+        if self.path == '/health':
+            code, body = (200 if healthy else 503), {'healthy': healthy, 'heartbeat': status['heartbeat']}
+        elif self.path == '/metrics':
+            code, body = 200, status
+        else:
+            code, body = 404, {'error': 'Not found'}
+        data = json.dumps(body, default=str).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass  # Health checks would flood the log
+
+def start_status_server(port):
+    """Serve /health and /metrics on a daemon thread"""
+    server = ThreadingHTTPServer(('0.0.0.0', port), StatusHandler)
+    threading.Thread(target=server.serve_forever, name='status-server', daemon=True).start()
+    print(f"Worker status on port {port}")
+    return server
 
 if __name__ == '__main__':
+    signal.signal(signal.SIGTERM, request_shutdown)
+    signal.signal(signal.SIGINT, request_shutdown)
+
     # Ensure cache directory exists
     cache_manager.ensure_cache_dir()
-    
-    # Initialize database connection
-    print("Initializing database connection...")
-    get_db_connection()
-    
+
+    # Open the database connection pool
+    print("Initializing database connection pool...")
+    init_pool()
+
+    # Make sure hourly chart points can be read through the partial index
+    ensure_hour_mark_index()
+
+    # Expose health and refresh metrics where the platform provides a port (Fly.io)
+    status_server = start_status_server(int(os.environ['PORT'])) if os.environ.get('PORT') else None
+
     # Start the background checker
     print("Starting background worker...")
-    cache_manager.start_background_checker()
-    
-    try:
-        # Keep the worker running
-        while True:
-            pass
-    except KeyboardInterrupt:
-        print("Stopping background worker...")
-        cache_manager.stop_background_checker()
\ No newline at end of file
+    thread = cache_manager.start_background_checker()
+
+    # Sleep until asked to stop, restarting the refresh thread if it ever dies
+    while not shutdown_event.wait(SUPERVISE_INTERVAL):
+        if not thread.is_alive():
+            print("Background checker died, restarting it...")
+            thread = cache_manager.start_background_checker()
+
+    print("Stopping background worker...")
+    cache_manager.stop_background_checker()
+    thread.join(SHUTDOWN_TIMEOUT)
+    if status_server:
+        status_server.shutdown()
+    print("Worker stopped")